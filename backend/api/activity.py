@@ -0,0 +1,80 @@
+"""
+Organization activity feed. Whatever the feed shows (contacts created, notes
+added, members joining, tasks assigned) appends an ActivityEvent when it
+happens, in the same transaction, with its summary already rendered. Serving
+the feed is then a read of the newest events of one organization, a range
+scan of the (organization, created) index, rather than a union of the
+contacts, notes, members and tasks tables.
+
+Events are never updated; they go when their organization does.
+"""
+from django.utils import timezone
+
+import api.models as models
+
+# kinds of events
+CONTACT_CREATED = 'contact_created'
+CONTACTS_IMPORTED = 'contacts_imported'
+NOTE_ADDED = 'note_added'
+MEMBER_JOINED = 'member_joined'
+TASK_ASSIGNED = 'task_assigned'
+
+
+def name(user):
+    if user is None:
+        return 'Someone'
+    return f'{user.first_name} {user.last_name}'
+
+
+def names(users):
+    """The names of users as a list in a sentence, at most three long."""
+    parts = [name(user) for user in users[:3]]
+    if len(users) > 3:
+        parts = parts[:2] + [f'{len(users) - 2} others']
+    if len(parts) > 1:
+        parts = [', '.join(parts[:-1]) + ' and ' + parts[-1]]
+    return parts[0]
+
+
+def record(org, actor, kind, events):
+    """
+    Append events of one kind to an organization's feed, given as
+    (subject uuid, summary) pairs.
+    """
+    now = timezone.now()
+    models.ActivityEvent.objects.bulk_create(
+        models.ActivityEvent(organization=org,
+                             created=now,
+                             actor=actor,
+                             kind=kind,
+                             subject=subject,
+                             summary=summary)
+        for subject, summary in events
+    )
+
+
+def contact_created(contact, user):
+    record(contact.organization, user, CONTACT_CREATED,
+           [(contact.uuid, f'{name(user)} added {contact}.')])
+
+
+def contacts_imported(org, user, created):
+    record(org, user, CONTACTS_IMPORTED,
+           [(None, f'{name(user)} imported {created} contacts.')])
+
+
+def note_added(note, user):
+    record(note.contact.organization, user, NOTE_ADDED,
+           [(note.uuid, f'{name(user)} added a note on {note.contact}.')])
+
+
+def members_joined(org, users, actor=None):
+    record(org, actor, MEMBER_JOINED,
+           [(user.uuid, f'{name(user)} joined {org.organization_name}.')
+            for user in users])
+
+
+def task_assigned(task, users):
+    record(task.organization, task.assigner, TASK_ASSIGNED,
+           [(task.uuid, f'{name(task.assigner)} assigned {task.title} to '
+                        f'{names(users)}.')])
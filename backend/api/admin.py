@@ -6,10 +6,20 @@ admin.site.register(models.Contact)
 admin.site.register(models.ContactRank)
 admin.site.register(models.ContactMethod)
 admin.site.register(models.ContactNote)
+admin.site.register(models.ContactSearchDocument)
 admin.site.register(models.Tag)
 admin.site.register(models.User)
 admin.site.register(models.Notification)
+admin.site.register(models.NotificationCounter)
 admin.site.register(models.Organization)
 admin.site.register(models.MembershipRequest)
 admin.site.register(models.Task)
+admin.site.register(models.TaskReminder)
 admin.site.register(models.OrganizationImage)
+admin.site.register(models.ImageBlob)
+admin.site.register(models.ImageThumbnail)
+admin.site.register(models.ImageUpload)
+admin.site.register(models.OutgoingEmail)
+admin.site.register(models.NotificationFanout)
+admin.site.register(models.ActivityEvent)
+admin.site.register(models.CollectionVersion)
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.models.signals import post_migrate
+        from api.search import setup_search_index
+        from backend.db import check_connections
+        import api.signals  # noqa: F401
+
+        post_migrate.connect(setup_search_index, sender=self)
+        request_started.connect(check_connections)
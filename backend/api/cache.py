@@ -0,0 +1,72 @@
+"""
+Server-side cache of rendered list responses for collections that are read
+far more often than written (an organization's ranks and members). Entries
+hold the rendered JSON and are keyed on the collection's version (see
+api.versions), so the signal receivers bumping a version on writes
+invalidate every cached page of the collection at once.
+
+Uses Django's default cache; hits and misses are counted and served by
+CacheStatsView.
+"""
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+HITS = 'response_cache:hits'
+MISSES = 'response_cache:misses'
+
+
+def timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def _key(request, version):
+    # pages link to the next and previous ones with absolute urls, so they
+    # depend on the scheme and host too
+    path = sha1(request.build_absolute_uri().encode()).hexdigest()
+    return f'response:{version.collection}:{version.owner}:' \
+           f'{version.version}:{path}'
+
+
+def _count(key):
+    # add() is a no-op if the counter exists, and incr() is atomic on
+    # backends that support it
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted in between
+        cache.set(key, 1, None)
+
+
+def cached_response(request, version, build):
+    """
+    Get the response for a version of a collection, calling build() for the
+    response data and caching the rendered result on a miss.
+    """
+    if request.accepted_renderer.format != 'json':
+        # e.g. the browsable API
+        return Response(build())
+
+    key = _key(request, version)
+    body = cache.get(key)
+    if body is None:
+        _count(MISSES)
+        body = JSONRenderer().render(build())
+        cache.set(key, body, timeout())
+    else:
+        _count(HITS)
+
+    return HttpResponse(body, content_type='application/json')
+
+
+def stats():
+    counts = cache.get_many([HITS, MISSES])
+    return {
+        'hits': counts.get(HITS, 0),
+        'misses': counts.get(MISSES, 0)
+    }
@@ -0,0 +1,164 @@
+"""
+Streamed export of an organization's contact book. Contacts are read with
+QuerySet.iterator() and their contact methods and notes are fetched one
+chunk of contacts at a time, so memory use doesn't depend on the size of the
+organization.
+
+Exports come in two flavours: JSONL, one complete contact (with contact
+methods, rank and notes) per line, and CSV, whose first five columns can be
+imported again through the bulk import endpoint (see api.imports).
+"""
+from collections import defaultdict
+from itertools import islice
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+import api.models as models
+
+CHUNK_SIZE = 1000
+CSV_COLUMNS = [
+    'first_name',
+    'last_name',
+    'rank_uuid',
+    'medium',
+    'value',
+    'uuid',
+    'rank',
+    'created_by',
+    'contact_methods',
+    'notes'
+]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def contact_records(org, chunk_size=CHUNK_SIZE):
+    """
+    Yield (contact, contact methods, notes) for every contact of an
+    organization, issuing a constant number of queries per chunk.
+    """
+    contacts = models.Contact.objects \
+                     .filter(organization=org) \
+                     .select_related('rank', 'created_by') \
+                     .order_by('pk') \
+                     .iterator(chunk_size=chunk_size)
+
+    for chunk in _chunks(contacts, chunk_size):
+        pks = [c.pk for c in chunk]
+
+        methods = defaultdict(list)
+        for cm in models.ContactMethod.objects \
+                        .filter(contact_id__in=pks) \
+                        .order_by('pk'):
+            methods[cm.contact_id].append(cm)
+
+        notes = defaultdict(list)
+        for note in models.ContactNote.objects \
+                          .filter(contact_id__in=pks) \
+                          .select_related('created_by') \
+                          .prefetch_related('tags') \
+                          .order_by('pk'):
+            notes[note.contact_id].append(note)
+
+        for contact in chunk:
+            yield contact, methods[contact.pk], notes[contact.pk]
+
+
+def _method(cm):
+    return {
+        'uuid': cm.uuid,
+        'medium': cm.medium,
+        'value': cm.value
+    }
+
+
+def _note(note):
+    return {
+        'uuid': note.uuid,
+        'created_by': note.created_by.uuid if note.created_by else None,
+        'created': note.created,
+        'body': note.body,
+        'tags': [tag.name for tag in note.tags.all()]
+    }
+
+
+def contact_document(contact, methods, notes):
+    """The complete JSON representation of a contact."""
+    rank = None
+    if contact.rank is not None:
+        rank = {
+            'uuid': contact.rank.uuid,
+            'name': contact.rank.name,
+            'description': contact.rank.description
+        }
+
+    primary = None
+    for cm in methods:
+        if cm.pk == contact.primary_contact_method_id:
+            primary = cm.uuid
+
+    return {
+        'uuid': contact.uuid,
+        'first_name': contact.first_name,
+        'last_name': contact.last_name,
+        'created_by': contact.created_by.uuid if contact.created_by else None,
+        'rank': rank,
+        'primary_contact_method': primary,
+        'contact_methods': [_method(cm) for cm in methods],
+        'notes': [_note(note) for note in notes]
+    }
+
+
+def export_jsonl(org):
+    """Yield the lines of a JSONL export."""
+    for contact, methods, notes in contact_records(org):
+        document = contact_document(contact, methods, notes)
+        yield json.dumps(document, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object handing back what's written, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+def export_csv(org):
+    """Yield the lines of a CSV export."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+
+    for contact, methods, notes in contact_records(org):
+        document = contact_document(contact, methods, notes)
+
+        primary = None
+        for cm in methods:
+            if cm.pk == contact.primary_contact_method_id:
+                primary = cm
+
+        yield writer.writerow([
+            contact.first_name,
+            contact.last_name,
+            contact.rank.uuid if contact.rank else '',
+            primary.medium if primary else '',
+            primary.value if primary else '',
+            contact.uuid,
+            contact.rank.name if contact.rank else '',
+            document['created_by'] or '',
+            json.dumps(document['contact_methods'], cls=DjangoJSONEncoder),
+            json.dumps(document['notes'], cls=DjangoJSONEncoder)
+        ])
+
+
+EXPORTS = {
+    'csv': (export_csv, 'text/csv'),
+    'jsonl': (export_jsonl, 'application/jsonl')
+}
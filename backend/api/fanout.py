@@ -0,0 +1,76 @@
+"""
+Notifications for every member of an organization (a membership approved, a
+task created, an image posted). Views queue them with queue_fanout(), which
+only inserts a NotificationFanout row; the fan_out_notifications management
+command writes the notifications in batches of bulk inserts. Chapters with
+thousands of members thus don't hold up the request that triggered the
+notification.
+
+Each batch is committed together with the job's progress, so a worker that
+dies halfway resumes where it left off instead of notifying members twice.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+import api.models as models
+from api.inbox import create_notifications
+
+
+def default_batch_size():
+    return getattr(settings, 'NOTIFICATION_FANOUT_BATCH_SIZE', 1000)
+
+
+def queue_fanout(org, body, exclude=None):
+    """
+    Queue a notification for all members of an organization, except
+    optionally the user that caused it.
+    """
+    return models.NotificationFanout.objects.create(
+        organization=org,
+        body=body[:1023],
+        exclude=exclude
+    )
+
+
+def fan_out(batch_size=None):
+    """
+    Notify the next batch of members of the oldest pending fan-out. Returns
+    the number of notifications written, or None if nothing is pending.
+    """
+    if batch_size is None:
+        batch_size = default_batch_size()
+
+    with transaction.atomic():
+        # skip_locked lets several workers fan out at once
+        job = models.NotificationFanout.objects \
+                    .select_for_update(skip_locked=True) \
+                    .filter(done__isnull=True) \
+                    .order_by('pk').first()
+        if job is None:
+            return None
+
+        # one more than the batch tells whether this is the last one
+        members = models.User.objects \
+                        .filter(member_of=job.organization_id,
+                                pk__gt=job.last_user_id) \
+                        .only('pk', 'uuid') \
+                        .order_by('pk')[:batch_size + 1]
+        members = list(members)
+        last = len(members) <= batch_size
+        members = members[:batch_size]
+
+        now = timezone.now()
+        notifications = [
+            models.Notification(user=user, created=now, body=job.body)
+            for user in members if user.pk != job.exclude_id
+        ]
+        create_notifications(notifications)
+
+        if members:
+            job.last_user_id = members[-1].pk
+        if last:
+            job.done = now
+        job.save(update_fields=['last_user_id', 'done'])
+
+    return len(notifications)
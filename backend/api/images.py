@@ -0,0 +1,390 @@
+"""
+Organization images. Photos are uploaded in chunks: a client creates an
+ImageUpload giving the file's name and size, then PUTs the bytes in as many
+Content-Range chunks as it likes, resuming from the upload's received count
+after a dropped connection. Chunks are copied from the request to a file on
+disk a block at a time, so no upload is ever held in memory as a whole, and
+outside any transaction, so a slow client holds no locks. The last chunk
+turns the upload into an OrganizationImage.
+
+Image files are stored once per content, as ImageBlobs keyed by the SHA-256
+of their bytes: the same event photo uploaded by ten members takes the disk
+space (and thumbnails) of one. A completed upload is hashed first, and if the
+hash is known the new image just takes a reference to the existing blob,
+skipping the checks and copying of new content. Blobs count their
+references, and a blob's files are deleted along with its last image.
+
+Thumbnails (WebP and JPEG, fitted in each of IMAGE_THUMBNAIL_SIZES) are made
+by the process_images management command rather than during the upload, as
+decoding a large photo takes a while. Workers claim a blob for a while
+instead of locking it as they work on it. Galleries link to the thumbnails, which
+like the originals never change and are served with long-lived cache headers.
+"""
+from datetime import timedelta
+import hashlib
+from io import BytesIO
+import logging
+import mimetypes
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from PIL import Image, ImageOps
+
+import api.models as models
+
+logger = logging.getLogger(__name__)
+
+MAX_SIZE = getattr(settings, 'IMAGE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024)
+UPLOAD_EXPIRY = timedelta(
+    hours=getattr(settings, 'IMAGE_UPLOAD_EXPIRY_HOURS', 24)
+)
+THUMBNAIL_SIZES = sorted(getattr(settings, 'IMAGE_THUMBNAIL_SIZES',
+                                 [320, 1280]), reverse=True)
+THUMBNAIL_FORMATS = getattr(settings, 'IMAGE_THUMBNAIL_FORMATS',
+                            ['webp', 'jpeg'])
+THUMBNAIL_QUALITY = getattr(settings, 'IMAGE_THUMBNAIL_QUALITY', 80)
+
+FORMATS = {
+    # format: (Pillow format, content type, extension)
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg')
+}
+# formats accepted for upload, and their extensions
+UPLOAD_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp'
+}
+BLOCK_SIZE = 64 * 1024
+CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class WrongOffset(Exception):
+    """A chunk doesn't continue the upload where it left off."""
+
+
+class InvalidImage(Exception):
+    """A completed upload isn't an image in one of the UPLOAD_FORMATS."""
+
+
+def part_path(upload):
+    """Where the received part of an upload is kept."""
+    directory = getattr(settings, 'FILE_UPLOAD_TEMP_DIR', None) or \
+        tempfile.gettempdir()
+    return os.path.join(directory, f'greekgeeks-upload-{upload.uuid}')
+
+
+def _remove_part(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def start_upload(org, user, filename, size):
+    """Start uploading an image of a size in bytes."""
+    return models.ImageUpload.objects.create(
+        organization=org,
+        created_by=user,
+        # only the name, whatever directories the client sent
+        filename=os.path.basename(filename.replace('\\', '/')) or 'image',
+        size=size
+    )
+
+
+def _received(upload):
+    return models.ImageUpload.objects.values_list('received', flat=True) \
+                 .get(pk=upload.pk)
+
+
+def write_chunk(upload, start, length, stream):
+    """
+    Append up to length bytes read from stream, which should start at byte
+    start of the file, to an upload, updating its received count. Returns
+    the new OrganizationImage once the upload is complete, or None. Raises
+    WrongOffset if the chunk doesn't continue the upload, InvalidImage
+    (discarding the upload) if the complete file isn't an image, and
+    ImageUpload.DoesNotExist if the upload was cancelled, expired or
+    completed in the meantime.
+    """
+    upload.received = _received(upload)
+    if start != upload.received or start + length > upload.size:
+        raise WrongOffset()
+
+    # Written in place without truncating: bytes past the received count
+    # are overwritten by the chunks that follow, and a concurrent retry of
+    # this chunk writes the same bytes of the same file.
+    fd = os.open(part_path(upload), os.O_RDWR | os.O_CREAT, 0o600)
+    with open(fd, 'r+b') as f:
+        f.seek(start)
+        remaining = length
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                # the client went away, it can resume from here
+                break
+            f.write(block)
+            remaining -= len(block)
+
+    try:
+        with transaction.atomic():
+            # only the first of concurrent chunks at this offset counts
+            locked = models.ImageUpload.objects.select_for_update() \
+                           .get(pk=upload.pk)
+            if locked.received != start:
+                upload.received = locked.received
+                raise WrongOffset()
+            upload.received = start + length - remaining
+            upload.save(update_fields=['received'])
+    except models.ImageUpload.DoesNotExist:
+        # the part file was removed before this chunk recreated it
+        _remove_part(upload)
+        raise
+
+    if upload.received < upload.size:
+        return None
+    return _complete(upload)
+
+
+def _image_format(path):
+    """The format of an image file, or None if it isn't an image."""
+    try:
+        with Image.open(path) as im:
+            im.verify()
+            return im.format
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        return None
+
+
+def _hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def acquire_blob(path):
+    """
+    Take a reference to the blob with the content of a file, storing the
+    file if the content is new. Returns the blob and whether it was stored,
+    like get_or_create(). Raises InvalidImage if it isn't an image in one of
+    the UPLOAD_FORMATS.
+    """
+    sha256 = _hash(path)
+
+    with transaction.atomic():
+        blobs = models.ImageBlob.objects.filter(sha256=sha256)
+        if blobs.update(refcount=F('refcount') + 1):
+            # known content was checked when it was first stored
+            return blobs.get(), False
+
+        image_format = _image_format(path)
+        if image_format not in UPLOAD_FORMATS:
+            raise InvalidImage()
+
+        blob = models.ImageBlob(sha256=sha256,
+                                size=os.path.getsize(path),
+                                refcount=1)
+        with open(path, 'rb') as f:
+            # copies the file to storage in chunks
+            blob.file.save(f'{sha256}.{UPLOAD_FORMATS[image_format]}',
+                           File(f), save=False)
+        try:
+            with transaction.atomic():
+                blob.save()
+        except IntegrityError:
+            # stored by a concurrent upload in the meantime
+            blob.file.delete(save=False)
+            blobs.update(refcount=F('refcount') + 1)
+            return blobs.get(), False
+
+    return blob, True
+
+
+def release_blob(blob_id):
+    """
+    Drop a reference to a blob, deleting the blob (and, once committed, its
+    files) if it was the last.
+    """
+    with transaction.atomic():
+        models.ImageBlob.objects.filter(pk=blob_id) \
+              .update(refcount=F('refcount') - 1)
+        # locked so a concurrent upload can't take a reference meanwhile
+        for blob in models.ImageBlob.objects.select_for_update() \
+                          .filter(pk=blob_id, refcount=0):
+            blob.delete()
+
+
+def _complete(upload):
+    stored = None
+    # a complete upload is used up either way
+    try:
+        with transaction.atomic():
+            blob, created = acquire_blob(part_path(upload))
+            if created:
+                stored = blob.file
+            image = models.OrganizationImage.objects.create(
+                organization=upload.organization,
+                created=timezone.now(),
+                created_by=upload.created_by,
+                blob=blob,
+                filename=upload.filename
+            )
+    except Exception:
+        # the new blob's row was rolled back, so nothing refers to its file
+        if stored is not None:
+            stored.delete(save=False)
+        raise
+    finally:
+        cancel_upload(upload)
+    return image
+
+
+def cancel_upload(upload):
+    upload.delete()
+    _remove_part(upload)
+
+
+def expire_uploads():
+    """Discard uploads left incomplete for too long. Returns how many."""
+    expired = list(models.ImageUpload.objects.filter(
+        created__lt=timezone.now() - UPLOAD_EXPIRY
+    ))
+    for upload in expired:
+        cancel_upload(upload)
+    return len(expired)
+
+
+def delete_file_on_commit(file):
+    """Delete a stored file once the deletion of its row is committed."""
+    if file:
+        storage, name = file.storage, file.name
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def serve(file, content_type=None, filename=None):
+    """
+    Stream a stored image. Images never change once stored, so clients may
+    keep them as long as they like.
+    """
+    if content_type is None:
+        content_type = mimetypes.guess_type(file.name)[0] or \
+            'application/octet-stream'
+    response = FileResponse(file.open('rb'), content_type=content_type,
+                            filename=filename)
+    patch_cache_control(response, private=True, max_age=CACHE_MAX_AGE,
+                        immutable=True)
+    return response
+
+
+def _open(blob):
+    """Decode an image, at a reduced size if the format allows."""
+    with blob.file.open('rb') as f:
+        im = Image.open(f)
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, which is much
+        # faster and smaller than decoding all of a phone photo
+        im.draft('RGB', (THUMBNAIL_SIZES[0], THUMBNAIL_SIZES[0]))
+        im = ImageOps.exif_transpose(im)
+        im.load()
+
+    if im.mode not in ('RGB', 'RGBA'):
+        transparent = 'A' in im.getbands() or 'transparency' in im.info
+        im = im.convert('RGBA' if transparent else 'RGB')
+    return im
+
+
+def _thumbnails(blob):
+    """
+    Store the thumbnail files of a blob. Returns the thumbnails, unsaved.
+    """
+    try:
+        im = _open(blob)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        logger.warning('Making thumbnails of blob %s failed: %s',
+                       blob.pk, e)
+        return []
+
+    thumbnails = []
+    try:
+        # largest first, each resized from the previous one
+        for size in THUMBNAIL_SIZES:
+            im.thumbnail((size, size), Image.LANCZOS)
+            for fmt in THUMBNAIL_FORMATS:
+                pil_format, _, extension = FORMATS[fmt]
+                out = im if fmt == 'webp' else im.convert('RGB')
+                buffer = BytesIO()
+                out.save(buffer, pil_format, quality=THUMBNAIL_QUALITY)
+
+                thumbnail = models.ImageThumbnail(blob=blob, size=size,
+                                                  format=fmt)
+                thumbnail.file.save(f'{blob.sha256}_{size}.{extension}',
+                                    ContentFile(buffer.getvalue()),
+                                    save=False)
+                thumbnails.append(thumbnail)
+    except Exception:
+        _delete_files(thumbnails)
+        raise
+    return thumbnails
+
+
+def _delete_files(thumbnails):
+    for thumbnail in thumbnails:
+        thumbnail.file.delete(save=False)
+
+
+def claim_timeout():
+    """How long a worker has to make the thumbnails of the blob it claimed."""
+    return timedelta(
+        seconds=getattr(settings, 'IMAGE_THUMBNAIL_CLAIM_TIMEOUT', 600)
+    )
+
+
+def make_thumbnails():
+    """
+    Make the thumbnails of the oldest blob without them. Returns the number
+    made, or None if every blob has its thumbnails.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers claim blobs at once
+        blob = models.ImageBlob.objects \
+                     .select_for_update(skip_locked=True) \
+                     .filter(Q(thumbnailing_until__isnull=True) |
+                             Q(thumbnailing_until__lt=now),
+                             thumbnailed__isnull=True) \
+                     .order_by('pk').first()
+        if blob is None:
+            return None
+
+        # claimed rather than kept locked while decoding, which is slow; if
+        # this worker dies the blob is claimed again after the timeout
+        blob.thumbnailing_until = now + claim_timeout()
+        blob.save(update_fields=['thumbnailing_until'])
+
+    thumbnails = _thumbnails(blob)
+
+    with transaction.atomic():
+        # deleted along with its last image, or done by a worker that
+        # claimed it after this one took too long
+        claimed = models.ImageBlob.objects.select_for_update() \
+                        .filter(pk=blob.pk, thumbnailed__isnull=True) \
+                        .first() is not None
+        if claimed:
+            models.ImageThumbnail.objects.bulk_create(thumbnails)
+            models.ImageBlob.objects.filter(pk=blob.pk) \
+                  .update(thumbnailed=timezone.now())
+
+    if not claimed:
+        _delete_files(thumbnails)
+        return 0
+    return len(thumbnails)
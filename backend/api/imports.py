@@ -0,0 +1,219 @@
+"""
+Bulk import of contacts from CSV or JSONL uploads. Rows are read one at a
+time from the uploaded file (which Django spools to disk when large) and
+written in chunks with bulk_create, so memory use doesn't depend on the size
+of the upload. The import's activity event is recorded in the transaction of
+its last chunk.
+
+CSV files have a header row with the columns first_name, last_name, and
+optionally rank_uuid, medium and value (the primary contact method). JSONL
+files have one ContactAddition object per line, without organization_uuid.
+"""
+import codecs
+import csv
+import json
+import uuid
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from rest_framework.exceptions import ValidationError
+
+import api.activity as activity
+import api.models as models
+import api.serializers as serializers
+from api.search import index_contacts
+import api.versions as versions
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+JSONL_CONTENT_TYPES = ['application/jsonl', 'application/x-ndjson',
+                       'application/x-jsonlines']
+
+
+class UnreadableFile(Exception):
+    """
+    An upload stopped being valid UTF-8 (or CSV) part way through. The rows
+    before it were imported; created, error_count and errors are as
+    import_contacts() would have returned for them.
+    """
+    def __init__(self, message, created, error_count, errors):
+        super().__init__(message)
+        self.created = created
+        self.error_count = error_count
+        self.errors = errors
+
+
+def is_jsonl(upload):
+    name = (upload.name or '').lower()
+    return upload.content_type in JSONL_CONTENT_TYPES or \
+        name.endswith('.jsonl') or name.endswith('.ndjson')
+
+
+def read_csv(lines):
+    for row in csv.DictReader(lines):
+        data = {
+            'first_name': row.get('first_name'),
+            'last_name': row.get('last_name')
+        }
+        if row.get('rank_uuid'):
+            data['rank_uuid'] = row['rank_uuid']
+        if row.get('medium') or row.get('value'):
+            data['primary_contact_method'] = {
+                'medium': row.get('medium'),
+                'value': row.get('value')
+            }
+        yield data
+
+
+def read_jsonl(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield {'_error': f'Invalid JSON: {e}'}
+            continue
+        if not isinstance(row, dict):
+            yield {'_error': 'Expected a JSON object.'}
+            continue
+        yield row
+
+
+def read_rows(upload):
+    """Yield the rows of an uploaded file as dictionaries."""
+    lines = codecs.iterdecode(upload, 'utf-8-sig')
+    if is_jsonl(upload):
+        return read_jsonl(lines)
+    return read_csv(lines)
+
+
+def _assign_pks(objs):
+    """
+    Set primary keys of objects created with bulk_create on databases that
+    don't return them, looking them up by (client generated) uuid.
+    """
+    if not objs or objs[0].pk is not None:
+        return
+    model = type(objs[0])
+    pks = dict(model.objects.filter(uuid__in=[o.uuid for o in objs])
+                            .values_list('uuid', 'pk'))
+    for o in objs:
+        o.pk = pks[o.uuid]
+
+
+def _write_chunk(contacts):
+    """Create a chunk of (contact, contact method) pairs in a transaction."""
+    with transaction.atomic():
+        models.Contact.objects.bulk_create([c for c, _ in contacts])
+        _assign_pks([c for c, _ in contacts])
+
+        methods = []
+        for contact, method in contacts:
+            if method is not None:
+                method.contact = contact
+                methods.append(method)
+        if methods:
+            models.ContactMethod.objects.bulk_create(methods)
+            _assign_pks(methods)
+
+            # point each new contact at its (only) contact method in one
+            # UPDATE, rather than one CASE branch per contact
+            primary = models.ContactMethod.objects \
+                            .filter(contact=OuterRef('pk')) \
+                            .values('pk')[:1]
+            models.Contact.objects \
+                  .filter(pk__in=[m.contact.pk for m in methods]) \
+                  .update(primary_contact_method=Subquery(primary))
+            for method in methods:
+                method.contact.primary_contact_method = method
+
+        # bulk_create doesn't send signals
+        index_contacts([c.pk for c, _ in contacts])
+
+
+def import_contacts(org, user, rows):
+    """
+    Validate and create contacts for an organization. Returns the number of
+    contacts created, the number of invalid rows and the errors of (at most
+    MAX_REPORTED_ERRORS) invalid rows. Raises UnreadableFile if the rows
+    can't be read to the end.
+    """
+    # an organization has a handful of ranks, so resolve them all up front
+    ranks = {r.uuid: r for r in org.contactrank_set.all()}
+
+    # bound once and reused, building a serializer per row dominates
+    # the cost of an import otherwise
+    serializer = serializers.ContactImportSerializer()
+
+    created = error_count = 0
+    errors = []
+    chunk = []
+    read_error = None
+
+    def error(row, detail):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'row': row, 'errors': detail})
+
+    try:
+        for i, row in enumerate(rows, start=1):
+            if '_error' in row:
+                error(i, {'non_field_errors': [row['_error']]})
+                continue
+
+            try:
+                data = serializer.run_validation(row)
+            except ValidationError as e:
+                error(i, e.detail)
+                continue
+
+            rank = None
+            if 'rank_uuid' in data:
+                rank = ranks.get(data['rank_uuid'])
+                if rank is None:
+                    error(i, {'rank_uuid': ['Unknown rank.']})
+                    continue
+
+            # a full chunk is only written once there's another row, so the
+            # last chunk is never empty
+            if len(chunk) >= CHUNK_SIZE:
+                _write_chunk(chunk)
+                created += len(chunk)
+                chunk = []
+
+            contact = models.Contact(
+                uuid=uuid.uuid4(),
+                organization=org,
+                created_by=user,
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+                rank=rank
+            )
+            method = None
+            if 'primary_contact_method' in data:
+                cm = data['primary_contact_method']
+                method = models.ContactMethod(
+                    uuid=uuid.uuid4(),
+                    medium=cm['medium'],
+                    value=cm['value']
+                )
+            chunk.append((contact, method))
+    except (UnicodeDecodeError, csv.Error) as e:
+        # keep the rows read so far, like the chunks already written
+        read_error = e
+
+    if chunk:
+        with transaction.atomic():
+            _write_chunk(chunk)
+            created += len(chunk)
+
+            # bulk_create doesn't send signals
+            versions.bump(versions.CONTACTS, [org.uuid])
+            activity.contacts_imported(org, user, created)
+
+    if read_error is not None:
+        raise UnreadableFile(str(read_error), created, error_count, errors)
+
+    return created, error_count, errors
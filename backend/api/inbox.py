@@ -0,0 +1,96 @@
+"""
+Read state of notifications. Every user has a NotificationCounter holding
+their number of unread notifications, so the count served to the front-end
+badge is a primary key lookup rather than a scan of the user's notifications.
+
+Counters are created along with users. They are adjusted in the same
+transaction as the notifications themselves: by signal receivers for single
+notifications created or deleted (see api.signals), by create_notifications()
+for bulk inserts and by mark_read(). Adjustments are relative updates, so
+concurrent ones don't overwrite each other.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+import api.models as models
+from api.push import publish_notifications
+import api.versions as versions
+
+
+def _recount(user_pks):
+    """Create missing counters by counting the notifications."""
+    counts = dict.fromkeys(user_pks, 0)
+    counts.update(models.Notification.objects
+                        .filter(user_id__in=user_pks, read=False)
+                        .values('user_id')
+                        .annotate(unread=Count('pk'))
+                        .values_list('user_id', 'unread'))
+    models.NotificationCounter.objects.bulk_create(
+        [models.NotificationCounter(user_id=pk, unread=unread)
+         for pk, unread in counts.items()],
+        ignore_conflicts=True
+    )
+
+
+def adjust_unread(deltas):
+    """
+    Add to the unread counts of users, given as a dict of user pk to delta.
+    Must run in the transaction that changed the notifications.
+    """
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(pk)
+
+    # users without a counter (e.g. created with bulk_create) are skipped,
+    # theirs is counted when first read
+    for delta, pks in by_delta.items():
+        models.NotificationCounter.objects \
+              .filter(user_id__in=pks) \
+              .update(unread=F('unread') + delta)
+
+
+def create_notifications(notifications):
+    """
+    Insert notifications in bulk, with their users loaded. bulk_create skips
+    the signal receivers, so this does their work for the whole batch. Must
+    run in a transaction.
+    """
+    models.Notification.objects.bulk_create(notifications)
+    adjust_unread({n.user_id: 1 for n in notifications})
+    versions.bump(versions.NOTIFICATIONS,
+                  [n.user.uuid for n in notifications])
+    publish_notifications(notifications)
+
+
+def unread_count(user):
+    """Get the number of unread notifications of a user."""
+    try:
+        return models.NotificationCounter.objects \
+                     .values_list('unread', flat=True).get(user=user)
+    except models.NotificationCounter.DoesNotExist:
+        _recount([user.pk])
+        return unread_count(user)
+
+
+def mark_read(user, uuids=None):
+    """
+    Mark a user's notifications with the given uuids (by default all of
+    them) read. Returns how many were unread.
+    """
+    with transaction.atomic():
+        notifications = models.Notification.objects \
+                              .filter(user=user, read=False)
+        if uuids is not None:
+            notifications = notifications.filter(uuid__in=uuids)
+
+        # only counts rows this update changed, even if a concurrent one
+        # marks some of the same notifications
+        marked = notifications.update(read=True)
+        if marked:
+            adjust_unread({user.pk: -marked})
+            versions.bump(versions.NOTIFICATIONS, [user.uuid])
+
+    return marked
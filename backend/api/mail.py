@@ -0,0 +1,135 @@
+"""
+Outbound email queue. Views queue mail with queue_mail(), which only inserts
+a row; the send_queued_mail management command delivers queued mail in
+batches over a single SMTP connection, retrying failures with exponential
+backoff. This keeps SMTP latency (and outages) off the request path.
+"""
+from datetime import timedelta
+import logging
+import smtplib
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+import api.models as models
+
+logger = logging.getLogger(__name__)
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """Queue an email for delivery, same arguments as send_mail()."""
+    return models.OutgoingEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email,
+        recipients=','.join(recipient_list),
+        next_attempt=timezone.now()
+    )
+
+
+def queue_mass_mail(datatuple):
+    """
+    Queue many emails with one insert, given as (subject, message,
+    from_email, recipient_list) tuples like send_mass_mail().
+    """
+    now = timezone.now()
+    return models.OutgoingEmail.objects.bulk_create(
+        models.OutgoingEmail(subject=subject,
+                             body=message,
+                             from_email=from_email,
+                             recipients=','.join(recipient_list),
+                             next_attempt=now)
+        for subject, message, from_email, recipient_list in datatuple
+    )
+
+
+def max_attempts():
+    return getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+
+
+def claim_timeout():
+    """How long a worker has to send the emails it claimed."""
+    return timedelta(
+        seconds=getattr(settings, 'EMAIL_QUEUE_CLAIM_TIMEOUT', 600)
+    )
+
+
+def backoff(attempts):
+    """Delay before retrying an email that has failed `attempts` times."""
+    delay = timedelta(seconds=getattr(settings, 'EMAIL_QUEUE_BACKOFF', 30))
+    return delay * (2 ** (attempts - 1))
+
+
+def _mark_failed(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)[:1023]
+    email.next_attempt = now + backoff(email.attempts)
+    logger.warning('Sending email %s failed (attempt %d): %s',
+                   email.pk, email.attempts, error)
+
+
+def send_queued_mail(batch_size=100):
+    """
+    Send one batch of due emails over a single connection. Returns a
+    (sent, failed) tuple of counts.
+    """
+    now = timezone.now()
+    sent = failed = 0
+
+    with transaction.atomic():
+        # skip_locked lets several workers drain the queue at once
+        batch = list(
+            models.OutgoingEmail.objects
+                  .select_for_update(skip_locked=True)
+                  .filter(sent__isnull=True,
+                          attempts__lt=max_attempts(),
+                          next_attempt__lte=now)
+                  .order_by('next_attempt')[:batch_size]
+        )
+        if not batch:
+            return sent, failed
+
+        # claim the batch, so the rows aren't locked while SMTP is slow; if
+        # this worker dies the emails are due again after the timeout
+        claimed_until = now + claim_timeout()
+        for email in batch:
+            email.next_attempt = claimed_until
+        models.OutgoingEmail.objects.bulk_update(batch, ['next_attempt'])
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except (smtplib.SMTPException, OSError) as e:
+        for email in batch:
+            _mark_failed(email, e, now)
+        failed = len(batch)
+    else:
+        try:
+            for email in batch:
+                message = EmailMessage(
+                    email.subject,
+                    email.body,
+                    email.from_email,
+                    email.recipients.split(','),
+                    connection=connection
+                )
+                try:
+                    message.send()
+                except (smtplib.SMTPException, OSError) as e:
+                    _mark_failed(email, e, now)
+                    failed += 1
+                else:
+                    email.attempts += 1
+                    email.sent = timezone.now()
+                    sent += 1
+        finally:
+            connection.close()
+
+    models.OutgoingEmail.objects.bulk_update(
+        batch,
+        ['attempts', 'last_error', 'next_attempt', 'sent']
+    )
+
+    return sent, failed
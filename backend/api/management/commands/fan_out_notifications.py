@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.fanout import default_batch_size, fan_out
+
+
+class Command(BaseCommand):
+    help = ('Write queued organization-wide notifications to every member, '
+            'in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=default_batch_size(),
+                            help='Notifications inserted per transaction.')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when nothing is queued.')
+        parser.add_argument('--once', action='store_true',
+                            help='Work through the queue once and exit.')
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            written = fan_out(options['batch_size'])
+            if written is not None:
+                total += written
+                continue
+
+            if total:
+                self.stdout.write(f'Wrote {total} notifications.')
+                total = 0
+            if options['once']:
+                return
+            time.sleep(options['interval'])
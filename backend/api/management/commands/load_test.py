@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+import api.models as models
+
+
+class Command(BaseCommand):
+    help = ('Measure concurrent write throughput of the contact and note '
+            'endpoints against the configured database. Creates (and '
+            'afterwards deletes) a throwaway organization and user.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Concurrent workers, each with its own '
+                                 'database connection.')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Contacts each worker creates; every '
+                                 'contact also gets a note.')
+
+    def post(self, client, url, data, errors):
+        try:
+            response = client.post(url, data, format='json')
+        except DatabaseError as e:
+            errors.append(str(e))
+            return None
+        if response.status_code != 201:
+            errors.append(response.status_code)
+            return None
+        return response
+
+    def worker(self, org, user, n, errors):
+        client = APIClient()
+        client.force_authenticate(user)
+        try:
+            for i in range(n):
+                response = self.post(
+                    client,
+                    f'/api/organizations/{org.uuid}/contacts/',
+                    {
+                        'first_name': f'Load {i}',
+                        'last_name': 'Test',
+                        'organization_uuid': str(org.uuid)
+                    },
+                    errors
+                )
+                if response is None:
+                    continue
+
+                contact = response.data['uuid']
+                self.post(
+                    client,
+                    f'/api/organizations/{org.uuid}/contacts/{contact}/'
+                    'notes/',
+                    {'body': f'Load test note {i}', 'tags': []},
+                    errors
+                )
+        finally:
+            # connections are per thread
+            connection.close()
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        n = options['requests']
+
+        user = models.User.objects.create_user(
+            f'load-test-{uuid.uuid4()}@example.com',
+            str(uuid.uuid4())
+        )
+        user.is_active = True
+        user.save()
+        org = models.Organization.objects.create(
+            institution='Load Test',
+            organization_name='Load Test',
+            chapter_name='Load Test'
+        )
+        org.users.add(user)
+
+        errors = []
+        self.stdout.write(f'{workers} workers, {2 * n} writes each...')
+        start = time.perf_counter()
+        try:
+            # APIClient requests are for the host 'testserver'
+            hosts = settings.ALLOWED_HOSTS + ['testserver']
+            with override_settings(ALLOWED_HOSTS=hosts), \
+                    ThreadPoolExecutor(workers) as pool:
+                futures = [pool.submit(self.worker, org, user, n, errors)
+                           for _ in range(workers)]
+                for future in futures:
+                    future.result()
+            elapsed = time.perf_counter() - start
+        finally:
+            org.delete()
+            user.delete()
+
+        writes = 2 * n * workers
+        self.stdout.write(
+            f'{writes} writes in {elapsed:.2f}s: '
+            f'{writes / elapsed:.0f} writes/s, {len(errors)} failed'
+        )
+        if errors:
+            self.stdout.write(f'First failure: {errors[0]}')
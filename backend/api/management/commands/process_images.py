@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.images import expire_uploads, make_thumbnails
+
+
+class Command(BaseCommand):
+    help = ('Make thumbnails of uploaded organization images and discard '
+            'abandoned uploads.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when nothing is queued.')
+        parser.add_argument('--once', action='store_true',
+                            help='Work through the queue once and exit.')
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            made = make_thumbnails()
+            if made is not None:
+                total += made
+                continue
+
+            expired = expire_uploads()
+            if total or expired:
+                self.stdout.write(f'Made {total} thumbnails, discarded '
+                                  f'{expired} abandoned uploads.')
+                total = 0
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,90 @@
+from datetime import timedelta
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+import api.models as models
+from api.retention import (
+    default_chunk_size,
+    delete_chunk,
+    expired,
+    retention_days
+)
+
+
+class Command(BaseCommand):
+    help = ('Delete notifications older than a number of days, in chunks, '
+            'optionally archiving them to a file first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=retention_days(),
+                            help='Age in days from which notifications are '
+                                 'deleted.')
+        parser.add_argument('--user',
+                            help='Only delete the notifications of the user '
+                                 'with this uuid.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=default_chunk_size(),
+                            help='Notifications deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between chunks, leaving '
+                                 'the database to other writers.')
+        parser.add_argument('--archive',
+                            help='Append deleted notifications to this file '
+                                 'as JSON lines.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        user = None
+        if options['user']:
+            try:
+                user = models.User.objects.get(uuid=options['user'])
+            except (models.User.DoesNotExist, ValueError):
+                raise CommandError(f"No user {options['user']}")
+
+        notifications = expired(cutoff, user)
+
+        if options['dry_run']:
+            count = notifications.count()
+            users = notifications.values('user').distinct().count()
+            self.stdout.write(
+                f'Would delete {count} notifications of {users} users, '
+                f'created before {cutoff:%Y-%m-%d %H:%M}.'
+            )
+            return
+
+        archive = None
+        if options['archive']:
+            archive = open(options['archive'], 'a')
+
+        deleted = chunks = 0
+        users = set()
+        start = time.perf_counter()
+        try:
+            while True:
+                n, chunk_users = delete_chunk(notifications,
+                                              options['chunk_size'],
+                                              archive)
+                if not n:
+                    break
+                deleted += n
+                chunks += 1
+                users |= chunk_users
+
+                if n < options['chunk_size']:
+                    break
+                time.sleep(options['pause'])
+        finally:
+            if archive is not None:
+                archive.close()
+
+        elapsed = time.perf_counter() - start
+        rate = deleted / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Deleted {deleted} notifications of {len(users)} users in '
+            f'{chunks} chunks ({elapsed:.2f}s, {rate:.0f} rows/s).'
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.search import index_all_contacts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search documents of every contact, in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Contacts indexed per transaction.')
+
+    def handle(self, *args, **options):
+        indexed = index_all_contacts(options['chunk_size'])
+        self.stdout.write(f'Indexed {indexed} contacts.')
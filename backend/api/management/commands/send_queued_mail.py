@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = 'Send queued emails, retrying failed ones with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Emails sent per SMTP connection.')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        while True:
+            sent, failed = send_queued_mail(batch_size)
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} emails, {failed} failed.')
+
+            if sent + failed < batch_size:
+                # queue is drained
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
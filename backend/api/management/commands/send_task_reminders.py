@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.reminders import default_batch_size, send_reminders
+
+
+class Command(BaseCommand):
+    help = ('Remind task assignees of upcoming due dates with notifications '
+            'and emails.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=default_batch_size(),
+                            help='Reminders sent per transaction.')
+        parser.add_argument('--interval', type=float, default=60.0,
+                            help='Seconds to sleep between runs.')
+        parser.add_argument('--once', action='store_true',
+                            help='Send the reminders due now and exit, e.g. '
+                                 'from cron.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = send_reminders(options['batch_size'])
+            if sent:
+                self.stdout.write(f'Sent {sent} reminders.')
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,144 @@
+"""
+Organization membership changes. Approving membership requests locks the
+requests' rows, so concurrent approvals (two admins, a double click) add each
+member once. Approved requests are kept and marked approved rather than
+deleted, so retrying an approval succeeds without doing anything twice.
+
+Batches of membership changes (a new pledge class, graduations) are applied
+with one bulk insert and delete per relation, in a transaction holding the
+organization's row lock.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+import api.activity as activity
+import api.models as models
+from api.fanout import queue_fanout
+
+# results of approving a request
+APPROVED = 'approved'
+ALREADY_APPROVED = 'already approved'
+NOT_FOUND = 'not found'
+
+# membership changes and their results
+ADD = 'add'
+REMOVE = 'remove'
+PROMOTE = 'promote'
+DEMOTE = 'demote'
+ACTIONS = [ADD, REMOVE, PROMOTE, DEMOTE]
+
+ADDED = 'added'
+REMOVED = 'removed'
+PROMOTED = 'promoted'
+DEMOTED = 'demoted'
+UNCHANGED = 'unchanged'
+NOT_A_MEMBER = 'not a member'
+USER_NOT_FOUND = 'user not found'
+
+
+class NoAdminsLeft(Exception):
+    """Changes would leave an organization without admins."""
+
+
+def _joined(org, users):
+    return f'{activity.names(users)} joined {org.organization_name}.'
+
+
+def approve_requests(org, uuids, by=None):
+    """
+    Approve an organization's membership requests with the given uuids in
+    one transaction (by the given admin, for the activity feed), and notify
+    the members. Returns a dict of the result of each uuid.
+    """
+    uuids = set(uuids)
+
+    with transaction.atomic():
+        requests = list(models.MembershipRequest.objects
+                              .select_for_update()
+                              .filter(organization=org, uuid__in=uuids))
+        pending = [r for r in requests if r.approved is None]
+
+        if pending:
+            user_pks = {r.user_id for r in pending}
+            org.users.add(*user_pks)
+            models.MembershipRequest.objects \
+                  .filter(pk__in=[r.pk for r in pending]) \
+                  .update(approved=timezone.now())
+
+            users = list(models.User.objects.filter(pk__in=user_pks)
+                               .only('uuid', 'first_name', 'last_name')
+                               .order_by('pk'))
+            queue_fanout(org, _joined(org, users))
+            activity.members_joined(org, users, by)
+
+    results = dict.fromkeys(uuids, NOT_FOUND)
+    results.update((r.uuid, ALREADY_APPROVED) for r in requests)
+    results.update((r.uuid, APPROVED) for r in pending)
+    return results
+
+
+def _apply(action, member, admin):
+    """Apply an action to a user's roles, giving the result and new roles."""
+    if action == ADD:
+        return (UNCHANGED if member else ADDED), True, admin
+    if action == REMOVE:
+        # leaving also ends being an admin
+        return (REMOVED if member or admin else NOT_A_MEMBER), False, False
+    if action == DEMOTE:
+        return (DEMOTED if admin else UNCHANGED), member, False
+    if not member:
+        return NOT_A_MEMBER, member, admin
+    return (UNCHANGED if admin else PROMOTED), member, True
+
+
+def change_members(org, operations, by=None):
+    """
+    Apply (action, user uuid) operations, in order, to an organization's
+    members and admins in one transaction (by the given admin, for the
+    activity feed). Returns the result of each. Raises NoAdminsLeft,
+    changing nothing, if no admin would be left.
+    """
+    with transaction.atomic():
+        # serializes batches for the organization, which are worked out
+        # from its current members below
+        org = models.Organization.objects.select_for_update().get(pk=org.pk)
+
+        pks = dict(models.User.objects
+                         .filter(uuid__in={uuid for _, uuid in operations})
+                         .values_list('uuid', 'pk'))
+        members = set(org.users.filter(pk__in=pks.values())
+                         .values_list('pk', flat=True))
+        admins = set(org.admin_users.values_list('pk', flat=True))
+
+        results = []
+        new_members, new_admins = set(members), set(admins)
+        for action, uuid in operations:
+            if uuid not in pks:
+                results.append(USER_NOT_FOUND)
+                continue
+
+            pk = pks[uuid]
+            result, member, admin = _apply(action, pk in new_members,
+                                           pk in new_admins)
+            results.append(result)
+            (new_members.add if member else new_members.discard)(pk)
+            (new_admins.add if admin else new_admins.discard)(pk)
+
+        if admins and not new_admins:
+            raise NoAdminsLeft()
+
+        # a bulk insert or delete per relation, sending m2m_changed for the
+        # role cache and member list versions
+        org.users.add(*(new_members - members))
+        org.users.remove(*(members - new_members))
+        org.admin_users.add(*(new_admins - admins))
+        org.admin_users.remove(*(admins - new_admins))
+
+        added = new_members - members
+        if added:
+            users = models.User.objects.filter(pk__in=added) \
+                          .only('uuid', 'first_name', 'last_name') \
+                          .order_by('pk')
+            activity.members_joined(org, users, by)
+
+    return results
@@ -1,11 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser
 from django.contrib.auth.models import BaseUserManager, PermissionsMixin
 import uuid
 
 
 class Contact(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     organization = models.ForeignKey('Organization', models.CASCADE)
     created_by = models.ForeignKey('User',
                                    models.SET_NULL,
@@ -20,47 +20,99 @@ class Contact(models.Model):
                              models.SET_NULL,
                              null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'uuid'])
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
 
 class ContactRank(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     organization = models.ForeignKey('Organization', models.CASCADE)
     name = models.CharField(max_length=4)
     description = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'uuid'])
+        ]
+
     def __str__(self):
         return self.name
 
 
 class ContactMethod(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     contact = models.ForeignKey(Contact, models.DO_NOTHING)
     medium = models.CharField(max_length=100)
     value = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['contact', 'uuid'])
+        ]
+
     def __str__(self):
         return self.value
 
 
 class ContactNote(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     contact = models.ForeignKey(Contact, models.CASCADE)
     created_by = models.ForeignKey('User', 
                                    models.SET_NULL,
                                    null=True)
     created = models.DateTimeField()
     body = models.CharField(max_length=1023)
-    tags = models.ManyToManyField('Tag')
+    tags = models.ManyToManyField('Tag', through='ContactNoteTag')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['contact', 'uuid'])
+        ]
 
     def __str__(self):
         return f"{self.contact}/{self.created_by}"
 
 
+class ContactNoteTag(models.Model):
+    """A tag on a note (the table Django would create for the relation)."""
+    contactnote = models.ForeignKey(ContactNote, models.CASCADE)
+    tag = models.ForeignKey('Tag', models.CASCADE)
+
+    class Meta:
+        db_table = 'api_contactnote_tags'
+        unique_together = [['contactnote', 'tag']]
+        indexes = [
+            # finding the notes with a tag, see ContactNotesView
+            models.Index(fields=['tag', 'contactnote'])
+        ]
+
+    def __str__(self):
+        return f"{self.contactnote}/{self.tag}"
+
+
+class ContactSearchDocument(models.Model):
+    """The searchable text of a contact, maintained by api.search."""
+    contact = models.OneToOneField(Contact,
+                                   models.CASCADE,
+                                   related_name='search_document')
+    organization = models.ForeignKey('Organization', models.CASCADE)
+    name = models.CharField(max_length=201)
+    methods = models.TextField(blank=True)
+    notes = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.contact}"
+
+
 class Tag(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
-    name = models.CharField(max_length=127)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
+    # lower case, see api.notes.get_or_create_tags
+    name = models.CharField(max_length=127, unique=True)
 
     def __str__(self):
         return self.name
@@ -100,7 +152,7 @@ class UserManager(BaseUserManager):
 class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
 
     first_name = models.CharField('First Name', max_length=100, blank=True)
     last_name = models.CharField('Last Name', max_length=100, blank=True)
@@ -119,17 +171,50 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 
 class Notification(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
+    """
+    A notification for a user. Mark notifications read with
+    api.inbox.mark_read(), which keeps the user's unread count current.
+    """
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     user = models.ForeignKey(User, models.CASCADE)
     created = models.DateTimeField('Created At')
     body = models.CharField('Notification Body', max_length=1023)
+    read = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'uuid']),
+            # finding expired notifications, see api/retention.py
+            models.Index(fields=['created'])
+        ]
+
+    def save(self, *args, **kwargs):
+        # the unread count is updated by a post_save receiver, which has to
+        # succeed or fail along with the notification
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user}/{self.created}"
 
 
+class NotificationCounter(models.Model):
+    """
+    Number of unread notifications of a user, maintained alongside the
+    notifications so it can be read without counting them. See api/inbox.py.
+    """
+    user = models.OneToOneField(User,
+                                models.CASCADE,
+                                primary_key=True,
+                                related_name='notification_counter')
+    unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user}/{self.unread}"
+
+
 class Organization(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     institution = models.CharField(max_length=100)
     organization_name = models.CharField(max_length=100)
     chapter_name = models.CharField(max_length=100)
@@ -143,16 +228,23 @@ class Organization(models.Model):
 
 
 class MembershipRequest(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     organization = models.ForeignKey(Organization, models.CASCADE)
     user = models.ForeignKey(User, models.CASCADE)
+    # approved requests are kept, so that retried approvals can tell
+    approved = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'uuid'])
+        ]
 
     def __str__(self):
         return f"{self.user}/{self.organization}"
 
 
 class Task(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     organization = models.ForeignKey(Organization,
                                      models.CASCADE,
                                      verbose_name='Task Organization')
@@ -162,27 +254,228 @@ class Task(models.Model):
                                  verbose_name='Task Assigner',
                                  related_name='has_assigned')
     assignees = models.ManyToManyField(User,
+                                       through='TaskAssignee',
                                        verbose_name='Task Assignees')
     title = models.CharField('Task Title', max_length=100)
     body = models.CharField('Task Body', max_length=1023)
     due_date = models.DateTimeField(verbose_name='Due Date')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'uuid']),
+            # an organization's tasks by due date, see TasksView
+            models.Index(fields=['organization', 'due_date']),
+            # tasks coming due in any organization, see api/reminders.py
+            models.Index(fields=['due_date'])
+        ]
+
     def __str__(self):
         return f"{self.organization}/{self.title}"
 
 
-def organization_image_path(instance, filename):
-    return f'images/organization_{instance.organization.uuid}/{filename}'
+class TaskAssignee(models.Model):
+    """A user assigned a task (the table Django would create for it)."""
+    task = models.ForeignKey(Task, models.CASCADE)
+    user = models.ForeignKey(User, models.CASCADE)
+
+    class Meta:
+        db_table = 'api_task_assignees'
+        unique_together = [['task', 'user']]
+        indexes = [
+            # a user's tasks, see api.tasks.due_tasks
+            models.Index(fields=['user', 'task'])
+        ]
+
+    def __str__(self):
+        return f"{self.task}/{self.user}"
+
+
+class TaskReminder(models.Model):
+    """
+    A due date reminder sent (or skipped as superseded) to an assignee,
+    kept so the reminder isn't sent again. See api/reminders.py.
+    """
+    task = models.ForeignKey(Task, models.CASCADE)
+    user = models.ForeignKey(User, models.CASCADE)
+    # hours before the due date
+    threshold = models.PositiveIntegerField()
+    sent = models.DateTimeField()
+
+    class Meta:
+        unique_together = [['task', 'user', 'threshold']]
+
+    def __str__(self):
+        return f"{self.task}/{self.user}/{self.threshold}"
+
+
+def image_blob_path(instance, filename):
+    # spread over directories, which get slow with many files
+    return f'images/blobs/{instance.sha256[:2]}/{filename}'
+
+
+class ImageBlob(models.Model):
+    """
+    Stored image content, shared by all OrganizationImages with the same
+    bytes and deleted along with the last of them. See api/images.py.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.ImageField(upload_to=image_blob_path,
+                             max_length=255,
+                             width_field='width',
+                             height_field='height')
+    width = models.PositiveIntegerField(null=True)
+    height = models.PositiveIntegerField(null=True)
+    size = models.PositiveIntegerField()
+    # the number of OrganizationImages using it
+    refcount = models.PositiveIntegerField(default=0)
+    # when thumbnails were made
+    thumbnailed = models.DateTimeField(null=True, db_index=True)
+    # until when a worker has claimed making them
+    thumbnailing_until = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.file}/{self.refcount}"
 
 
 class OrganizationImage(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
     organization = models.ForeignKey(Organization, models.CASCADE)
     created = models.DateTimeField()
     created_by = models.ForeignKey(User,
                                    models.SET_NULL,
                                    null=True)
-    image = models.ImageField(upload_to=organization_image_path)
+    # blobs are released by a signal receiver, see api.images.release_blob
+    blob = models.ForeignKey(ImageBlob, models.PROTECT, related_name='images')
+    filename = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'uuid'])
+        ]
+
+    def __str__(self):
+        return f"{self.organization}/{self.filename}"
+
+
+def image_thumbnail_path(instance, filename):
+    return f'images/blobs/{instance.blob.sha256[:2]}/{filename}'
+
+
+class ImageThumbnail(models.Model):
+    """A resized copy of an ImageBlob, made by api.images."""
+    blob = models.ForeignKey(ImageBlob,
+                             models.CASCADE,
+                             related_name='thumbnails')
+    # the longest side the image was fitted in
+    size = models.PositiveIntegerField()
+    format = models.CharField(max_length=8)
+    file = models.ImageField(upload_to=image_thumbnail_path,
+                             max_length=255,
+                             width_field='width',
+                             height_field='height')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [['blob', 'size', 'format']]
+
+    def __str__(self):
+        return f"{self.file}"
+
+
+class ImageUpload(models.Model):
+    """
+    An image being uploaded in chunks, kept until it's complete. See
+    api/images.py.
+    """
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
+    organization = models.ForeignKey(Organization, models.CASCADE)
+    created_by = models.ForeignKey(User, models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    received = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename}/{self.received}/{self.size}"
+
+
+class ActivityEvent(models.Model):
+    """
+    Something that happened in an organization, as shown in its activity
+    feed. Events are only ever appended, see api/activity.py.
+    """
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
+    organization = models.ForeignKey(Organization, models.CASCADE)
+    created = models.DateTimeField()
+    actor = models.ForeignKey(User,
+                              models.SET_NULL,
+                              null=True,
+                              related_name='+')
+    kind = models.CharField(max_length=32)
+    # the contact, note, member or task the event is about
+    subject = models.UUIDField(null=True)
+    # rendered when the event happens, so the feed needs no other tables
+    summary = models.CharField(max_length=1023)
+
+    class Meta:
+        indexes = [
+            # reading the feed newest first, see ActivityView
+            models.Index(fields=['organization', 'created'])
+        ]
+
+    def __str__(self):
+        return f"{self.organization}/{self.kind}/{self.created}"
+
+
+class NotificationFanout(models.Model):
+    """
+    A notification waiting to be written for every member of an
+    organization by the fan_out_notifications command. See api/fanout.py.
+    """
+    organization = models.ForeignKey(Organization, models.CASCADE)
+    body = models.CharField('Notification Body', max_length=1023)
+    exclude = models.ForeignKey(User,
+                                models.SET_NULL,
+                                null=True,
+                                verbose_name='Member Not Notified')
+    created = models.DateTimeField(auto_now_add=True)
+    # members are notified in pk order, up to and including this one so far
+    last_user_id = models.IntegerField(default=0)
+    done = models.DateTimeField(null=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.organization}/{self.body}"
+
+
+class OutgoingEmail(models.Model):
+    """An email waiting to be sent by the send_queued_mail command."""
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.TextField('Recipients (comma separated)')
+    created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=1023, blank=True)
+    sent = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.recipients}/{self.subject}"
+
+
+class CollectionVersion(models.Model):
+    """
+    Version of a collection served by the API (e.g. an organization's
+    contacts), bumped whenever it changes. See api/versions.py.
+    """
+    collection = models.CharField(max_length=32)
+    owner = models.UUIDField()
+    version = models.PositiveIntegerField(default=1)
+    modified = models.DateTimeField()
+
+    class Meta:
+        unique_together = [['collection', 'owner']]
 
     def __str__(self):
-        return f"{self.image}"
+        return f"{self.collection}/{self.owner}/{self.version}"
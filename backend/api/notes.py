@@ -0,0 +1,41 @@
+"""
+Contact notes and their tags. Tags are shared, identified by their name
+(stripped and lower cased), and attached to a note in a fixed number of
+queries however many there are.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+import api.models as models
+
+
+def normalize_tag(name):
+    return name.strip().lower()
+
+
+def get_or_create_tags(names):
+    """Get the tags with the given names, creating the missing ones."""
+    names = {normalize_tag(name) for name in names} - {''}
+    if not names:
+        return []
+
+    # the unique name makes inserting existing tags a no-op
+    models.Tag.objects.bulk_create([models.Tag(name=name) for name in names],
+                                   ignore_conflicts=True)
+    return list(models.Tag.objects.filter(name__in=names))
+
+
+def add_note(contact, user, body, tag_names=()):
+    """Add a note for a contact, with tags."""
+    with transaction.atomic():
+        note = models.ContactNote.objects.create(
+            contact=contact,
+            created_by=user,
+            created=timezone.now(),
+            body=body
+        )
+        models.ContactNoteTag.objects.bulk_create(
+            models.ContactNoteTag(contactnote=note, tag=tag)
+            for tag in get_or_create_tags(tag_names)
+        )
+    return note
@@ -0,0 +1,44 @@
+"""
+Pagination for list endpoints. Pages are keyed on the (indexed, unique)
+primary key with an opaque cursor, so fetching a page is a single index range
+scan and pages don't shift when rows are inserted concurrently.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Newest first cursor pagination. The page size defaults to the PAGE_SIZE
+    setting and can be changed per request with ?page_size=.
+    """
+    ordering = '-pk'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class ActivityPagination(KeysetPagination):
+    """
+    Newest first by time, matching the (organization, created) index of
+    activity events. Events created together are ordered by primary key.
+    """
+    ordering = ('-created', '-pk')
+
+
+class TaskPagination(KeysetPagination):
+    """
+    Soonest due first, matching the (organization, due_date) index of tasks.
+    Tasks due at the same time are ordered by primary key.
+    """
+    ordering = ('due_date', 'pk')
+
+
+def paginate(view, request, queryset, serializer_class,
+             pagination_class=KeysetPagination, **kwargs):
+    """
+    Serialize one page of a queryset, returning the paginated response.
+    Keyword arguments are passed on to the serializer.
+    """
+    paginator = pagination_class()
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    data = serializer_class(page, many=True, **kwargs).data
+    return paginator.get_paginated_response(data)
@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from api.roles import get_organization_roles
 
 
 class IsOrganizationAdmin(permissions.BasePermission):
@@ -11,8 +12,7 @@ class IsOrganizationAdmin(permissions.BasePermission):
             return False
 
         orgId = obj['orgId']
-        user = request.user
-        is_admin = user.admin_of.filter(uuid=orgId).count() > 0
+        is_admin = get_organization_roles(request).is_admin(orgId)
         return is_admin
 
 
@@ -26,8 +26,7 @@ class IsOrganizationMember(permissions.BasePermission):
             return False
 
         orgId = obj['orgId']
-        user = request.user
-        is_member = user.member_of.filter(uuid=orgId).count() > 0
+        is_member = get_organization_roles(request).is_member(orgId)
         return is_member
 
 
@@ -43,9 +42,9 @@ class IsOrganizationAdminOrReadOnly(permissions.BasePermission):
             return False
 
         orgId = obj['orgId']
-        user = request.user
-        is_member = user.member_of.filter(uuid=orgId).count() > 0
-        is_admin = user.admin_of.filter(uuid=orgId).count() > 0
+        roles = get_organization_roles(request)
+        is_member = roles.is_member(orgId)
+        is_admin = roles.is_admin(orgId)
 
         if is_admin:
             return True
@@ -66,7 +65,7 @@ class IsOrganizationAdminOrPostOnly(permissions.BasePermission):
 
         orgId = obj['orgId']
         user = request.user
-        is_admin = user.admin_of.filter(uuid=orgId).count() > 0
+        is_admin = get_organization_roles(request).is_admin(orgId)
 
         userId = obj['userId']
         return is_admin or (request.method == 'POST' and userId == user.uuid)
@@ -84,12 +83,39 @@ class IsOrganizationAdminOrDeleteOnly(permissions.BasePermission):
 
         orgId = obj['orgId']
         user = request.user
-        is_admin = user.admin_of.filter(uuid=orgId).count() > 0
+        is_admin = get_organization_roles(request).is_admin(orgId)
 
         userId = obj['userId']
         return is_admin or (request.method == 'DELETE' and userId == user.uuid)
 
 
+class IsOrganizationAdminOrOwnerOrReadOnly(permissions.BasePermission):
+    """
+    A view with this permission can be read by members of the organization
+    and deleted by the member owning the resource, while an organization
+    admin can do anything with it.
+    """
+    SAFE_METHODS = ['GET', 'HEAD', 'OPTIONS']
+
+    def has_object_permission(self, request, view, obj):
+        if not (request.user and request.user.is_authenticated):
+            return False
+
+        orgId = obj['orgId']
+        user = request.user
+        roles = get_organization_roles(request)
+
+        if roles.is_admin(orgId):
+            return True
+        elif roles.is_member(orgId):
+            if request.method in self.SAFE_METHODS:
+                return True
+            userId = obj['userId']
+            return request.method == 'DELETE' and userId == user.uuid
+        else:
+            return False
+
+
 class OwnsAccount(permissions.BasePermission):
     """
     A view with this permission can be accessed by the owner of the account
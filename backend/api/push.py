@@ -0,0 +1,304 @@
+"""
+Push delivery of notifications as server-sent events, so clients don't have
+to poll NotificationsView. A client opens
+
+    GET /api/users/{userId}/notifications/stream/
+
+(authenticated with the usual bearer token, or ?token= since EventSource
+can't set headers) and gets a `notification` event for every notification
+created for the user from then on. Reconnecting with Last-Event-ID replays
+the ones missed in between.
+
+Streams are long lived, so they are served by notification_stream, a plain
+ASGI application mounted in backend/asgi.py, instead of a Django view tying up
+a worker thread each. New notifications reach the streams through a broker;
+LocalBroker fans them out within the process and can be replaced (see the
+NOTIFICATION_BROKER setting) by one backed by e.g. Redis pub/sub when running
+several processes.
+
+Every stream has a bounded queue. A client that can't keep up gets a `resync`
+event instead of an ever growing backlog, after which it should reload the
+notification list over REST.
+"""
+import asyncio
+from collections import defaultdict
+import re
+import threading
+from urllib.parse import parse_qs
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+import api.models as models
+import api.serializers as serializers
+
+STREAM_PATH = re.compile(
+    r'^/api/users/(?P<userId>[0-9a-fA-F-]{32,36})/notifications/stream/$'
+)
+
+# queued in place of messages when a subscriber falls behind
+RESYNC = None
+
+
+def queue_size():
+    return getattr(settings, 'NOTIFICATION_STREAM_QUEUE_SIZE', 100)
+
+
+def keepalive():
+    return getattr(settings, 'NOTIFICATION_STREAM_KEEPALIVE', 15)
+
+
+class Subscription:
+    """A stream's bounded queue of messages, consumed on its event loop."""
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+
+    def offer(self, message):
+        # runs on self.loop
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # drop the backlog and have the client catch up over REST
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class Broker:
+    """Delivers the messages published for a user to the user's streams."""
+    def subscribe(self, user_uuid):
+        """Get a Subscription for a stream, from its event loop."""
+        raise NotImplementedError
+
+    def unsubscribe(self, user_uuid, subscription):
+        raise NotImplementedError
+
+    def publish(self, user_uuid, message):
+        """Deliver a message; must not block, from any thread."""
+        raise NotImplementedError
+
+
+class LocalBroker(Broker):
+    """Fans messages out to the streams served by this process."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, user_uuid):
+        # called from a coroutine, so this is the running loop
+        subscription = Subscription(asyncio.get_event_loop(), queue_size())
+        with self.lock:
+            self.subscriptions[str(user_uuid)].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_uuid, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions[str(user_uuid)]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[str(user_uuid)]
+
+    def publish(self, user_uuid, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(str(user_uuid), ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer,
+                                                       message)
+            except RuntimeError:
+                # the loop has shut down, the stream is gone
+                pass
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        path = getattr(settings, 'NOTIFICATION_BROKER',
+                       'api.push.LocalBroker')
+        _broker = import_string(path)()
+    return _broker
+
+
+def message(notification):
+    """A notification as pushed to streams: its uuid and JSON."""
+    data = serializers.NotificationSerializer(notification).data
+    return str(notification.uuid), JSONRenderer().render(data).decode()
+
+
+def publish_notifications(notifications):
+    """Push new notifications to their users' streams once committed."""
+    messages = [(notification.user.uuid, message(notification))
+                for notification in notifications]
+
+    def publish():
+        broker = get_broker()
+        for user_uuid, m in messages:
+            broker.publish(user_uuid, m)
+
+    transaction.on_commit(publish)
+
+
+def event(name, data='', id=None):
+    lines = [f'event: {name}', f'data: {data}']
+    if id is not None:
+        lines.insert(0, f'id: {id}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def _authenticate(scope, user_uuid):
+    """Get the user owning the stream, or an error status."""
+    headers = dict(scope['headers'])
+    query = parse_qs(scope['query_string'].decode())
+    try:
+        raw = None
+        if b'authorization' in headers:
+            raw = JWTAuthentication().get_raw_token(headers[b'authorization'])
+        elif 'token' in query:
+            raw = query['token'][0].encode()
+        if raw is None:
+            return None, 401
+
+        auth = JWTAuthentication()
+        user = auth.get_user(auth.get_validated_token(raw))
+        if user.uuid != user_uuid:
+            return None, 403
+        return user, 200
+    except APIException as e:
+        return None, e.status_code
+    finally:
+        close_old_connections()
+
+
+def _replay(scope, user):
+    """
+    Get the notifications missed since Last-Event-ID: a list of messages,
+    or None if the client has to resync.
+    """
+    last_event_id = dict(scope['headers']).get(b'last-event-id')
+    if last_event_id is None:
+        return []
+    try:
+        return _missed(user, last_event_id.decode())
+    finally:
+        close_old_connections()
+
+
+def _missed(user, last_event_id):
+    limit = queue_size()
+    try:
+        last = models.Notification.objects.get(user=user, uuid=last_event_id)
+    except (models.Notification.DoesNotExist, ValidationError):
+        return None
+
+    missed = list(models.Notification.objects
+                        .filter(user=user, pk__gt=last.pk)
+                        .order_by('pk')[:limit + 1])
+    if len(missed) > limit:
+        return None
+    return [message(notification) for notification in missed]
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def notification_stream(scope, receive, send):
+    """ASGI application serving a user's notification stream."""
+    if scope['method'] != 'GET':
+        await _respond(send, 405)
+        return
+
+    try:
+        user_uuid = uuid.UUID(STREAM_PATH.match(scope['path'])['userId'])
+    except ValueError:
+        await _respond(send, 404)
+        return
+
+    user, status = await sync_to_async(_authenticate)(scope, user_uuid)
+    if user is None:
+        await _respond(send, status)
+        return
+
+    broker = get_broker()
+    # subscribe before looking up the missed notifications, so that one
+    # committed in between is at least in the live stream; notifications
+    # in both are only sent once
+    subscription = broker.subscribe(user.uuid)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    get = None
+    try:
+        missed = await sync_to_async(_replay)(scope, user)
+
+        headers = [(b'content-type', b'text/event-stream'),
+                   (b'cache-control', b'no-cache'),
+                   # keep proxies from buffering the stream
+                   (b'x-accel-buffering', b'no')]
+        if getattr(settings, 'CORS_ORIGIN_ALLOW_ALL', False):
+            headers.append((b'access-control-allow-origin', b'*'))
+        await send({'type': 'http.response.start',
+                    'status': 200,
+                    'headers': headers})
+
+        if missed is None:
+            chunk = event('resync')
+            replayed = set()
+        else:
+            chunk = b''.join(event('notification', data, id)
+                             for id, data in missed)
+            replayed = {id for id, _ in missed}
+        await send({'type': 'http.response.body',
+                    'body': chunk or b': connected\n\n',
+                    'more_body': True})
+
+        while True:
+            if get is None:
+                get = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait(
+                {get, disconnect},
+                timeout=keepalive(),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                break
+
+            if get in done:
+                m = get.result()
+                get = None
+                if m is RESYNC:
+                    chunk = event('resync')
+                elif m[0] in replayed:
+                    continue
+                else:
+                    chunk = event('notification', m[1], m[0])
+            else:
+                chunk = b': keepalive\n\n'
+
+            # waits while the client's connection is congested, during
+            # which new messages queue up to the subscription's limit
+            await send({'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True})
+    finally:
+        broker.unsubscribe(user.uuid, subscription)
+        disconnect.cancel()
+        if get is not None:
+            get.cancel()
+
+
+async def _respond(send, status):
+    await send({'type': 'http.response.start',
+                'status': status,
+                'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': b''})
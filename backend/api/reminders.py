@@ -0,0 +1,132 @@
+"""
+Due date reminders for task assignees. The send_task_reminders management
+command periodically looks for assignments whose task has come within one of
+the TASK_REMINDER_THRESHOLDS (hours before the due date) and sends each
+assignee a notification and, optionally, an email. Members leaving an
+organization are unassigned from its tasks, so they aren't reminded of them.
+
+Candidates are found with a range scan of the due_date index of tasks, going
+through the range in batches by (due date, assignment), so a run over tens of
+thousands of open tasks holds one batch in memory at a time. Every reminder
+sent is recorded as a TaskReminder in the batch's transaction, which is what
+keeps later runs (or a run retried after a crash) from sending it again.
+A task crossing several thresholds at once, e.g. one created an hour before
+it's due, gets only the most urgent reminder; the others are recorded as
+superseded.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.timesince import timeuntil
+
+import api.models as models
+from api.inbox import create_notifications
+from api.mail import queue_mass_mail
+
+FROM_EMAIL = 'donotreply@greekgeeks.com'
+
+
+def thresholds():
+    """Hours before due dates to remind assignees at, smallest first."""
+    return sorted(getattr(settings, 'TASK_REMINDER_THRESHOLDS', [72, 24, 1]))
+
+
+def default_batch_size():
+    return getattr(settings, 'TASK_REMINDER_BATCH_SIZE', 1000)
+
+
+def emails_enabled():
+    return getattr(settings, 'TASK_REMINDER_EMAIL', True)
+
+
+def due(threshold, now):
+    """
+    The assignments of tasks due within a threshold that haven't been
+    reminded of it.
+    """
+    reminded = models.TaskReminder.objects.filter(task=OuterRef('task'),
+                                                  user=OuterRef('user'),
+                                                  threshold=threshold)
+    until = now + timedelta(hours=threshold)
+    return models.TaskAssignee.objects \
+                 .filter(task__due_date__gt=now, task__due_date__lte=until) \
+                 .filter(~Exists(reminded))
+
+
+def remind(threshold, now, after=None, batch_size=None):
+    """
+    Remind the next batch of assignees of tasks due within a threshold,
+    continuing after the (due date, assignment pk) of the previous batch.
+    Returns the number of reminders sent and where to continue, or None
+    when done.
+    """
+    if batch_size is None:
+        batch_size = default_batch_size()
+    assignments = due(threshold, now)
+    if after is not None:
+        due_date, pk = after
+        assignments = assignments.filter(
+            Q(task__due_date__gt=due_date) |
+            Q(task__due_date=due_date, pk__gt=pk)
+        )
+
+    with transaction.atomic():
+        # skip_locked lets several workers remind at once
+        locked = assignments.select_for_update(skip_locked=True,
+                                               of=('self',)) \
+                            .select_related('task', 'user') \
+                            .only('task', 'user', 'task__title',
+                                  'task__due_date', 'user__uuid',
+                                  'user__email') \
+                            .order_by('task__due_date', 'pk')
+        batch = list(locked[:batch_size])
+        if not batch:
+            return 0, None
+
+        # reminders for the thresholds this one supersedes may have been
+        # sent already
+        models.TaskReminder.objects.bulk_create(
+            [models.TaskReminder(task_id=a.task_id, user_id=a.user_id,
+                                 threshold=t, sent=now)
+             for a in batch for t in thresholds() if t >= threshold],
+            ignore_conflicts=True
+        )
+
+        notifications = []
+        emails = []
+        email = emails_enabled()
+        for a in batch:
+            left = timeuntil(a.task.due_date, now)
+            body = f'{a.task.title} is due in {left}.'
+            notifications.append(
+                models.Notification(user=a.user, created=now, body=body)
+            )
+            if email and a.user.email:
+                emails.append((f'Reminder: {a.task.title}', body,
+                               FROM_EMAIL, [a.user.email]))
+
+        create_notifications(notifications)
+        queue_mass_mail(emails)
+
+    if len(batch) < batch_size:
+        return len(batch), None
+    last = batch[-1]
+    return len(batch), (last.task.due_date, last.pk)
+
+
+def send_reminders(batch_size=None):
+    """Send every reminder that is due now. Returns how many were sent."""
+    now = timezone.now()
+    total = 0
+    # most urgent first, superseding the others
+    for threshold in thresholds():
+        after = None
+        while True:
+            sent, after = remind(threshold, now, after, batch_size)
+            total += sent
+            if after is None:
+                break
+    return total
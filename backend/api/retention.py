@@ -0,0 +1,86 @@
+"""
+Retention of notifications. The prune_notifications management command
+deletes notifications older than NOTIFICATION_RETENTION_DAYS, optionally
+archiving them first. Deletes happen in chunks, each in a short transaction
+of its own, so the notifications table is never locked for long while users
+keep being notified.
+"""
+from collections import Counter
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+import api.models as models
+from api.inbox import adjust_unread
+import api.versions as versions
+
+
+def retention_days():
+    return getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+
+
+def default_chunk_size():
+    return getattr(settings, 'NOTIFICATION_RETENTION_CHUNK_SIZE', 1000)
+
+
+def expired(cutoff, user=None):
+    """Notifications created before the cutoff, of one user or everyone."""
+    notifications = models.Notification.objects.filter(created__lt=cutoff)
+    if user is not None:
+        notifications = notifications.filter(user=user)
+    return notifications
+
+
+def delete_chunk(notifications, chunk_size=None, archive=None):
+    """
+    Delete the oldest chunk of some notifications, writing them to the
+    archive file (as JSON lines) first if given. Returns the number deleted
+    and the pks of their users.
+    """
+    if chunk_size is None:
+        chunk_size = default_chunk_size()
+    with transaction.atomic():
+        # locked, so the read flags counted below stay put
+        chunk = list(notifications.select_for_update()
+                                  .order_by('created')
+                                  .values('pk', 'uuid', 'user_id', 'created',
+                                          'body', 'read')[:chunk_size])
+        if not chunk:
+            return 0, set()
+
+        users = dict(models.User.objects
+                           .filter(pk__in={n['user_id'] for n in chunk})
+                           .values_list('pk', 'uuid'))
+
+        if archive is not None:
+            for n in chunk:
+                archive.write(json.dumps({
+                    'uuid': n['uuid'],
+                    'user': users[n['user_id']],
+                    'created': n['created'],
+                    'body': n['body'],
+                    'read': n['read']
+                }, cls=DjangoJSONEncoder) + '\n')
+            # on disk before they're gone
+            archive.flush()
+
+        # a plain DELETE: deleting through the ORM would send post_delete
+        # for every row (bumping the version and unread count of a user
+        # once per notification), so the receivers' work is done for the
+        # whole chunk below instead. Nothing refers to notifications, so
+        # there's nothing to cascade to.
+        pks = [n['pk'] for n in chunk]
+        table = connection.ops.quote_name(models.Notification._meta.db_table)
+        placeholders = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ({placeholders})', pks
+            )
+
+        unread = Counter(n['user_id'] for n in chunk if not n['read'])
+        adjust_unread({pk: -count for pk, count in unread.items()})
+        versions.bump(versions.NOTIFICATIONS, users.values())
+
+    return len(chunk), set(users)
@@ -0,0 +1,102 @@
+"""
+Resolution of a user's organization roles. Permission checks ask whether the
+user is a member or admin of an organization; rather than running a COUNT
+query per check, the user's member and admin organization UUIDs are loaded
+once per request (with a single UNION query) and answered from memory.
+
+Optionally, the resolved roles are also kept in Django's cache for
+ORGANIZATION_ROLE_CACHE_TIMEOUT seconds. The cached entry is dropped whenever
+Organization.users or Organization.admin_users change (see api.signals), and
+again when the change commits.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Value, BooleanField
+import uuid
+
+import api.models as models
+
+REQUEST_ATTRIBUTE = '_organization_roles'
+CACHE_KEY = 'organization_roles:{}'
+
+
+def _as_uuid(value):
+    if isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
+
+
+class OrganizationRoles:
+    """The organizations a single user is a member or admin of."""
+    def __init__(self, member_of, admin_of):
+        self.member_of = frozenset(member_of)
+        self.admin_of = frozenset(admin_of)
+
+    def is_member(self, orgId):
+        return _as_uuid(orgId) in self.member_of
+
+    def is_admin(self, orgId):
+        return _as_uuid(orgId) in self.admin_of
+
+    @classmethod
+    def load(cls, user):
+        """Load the roles of a user from the database in one query."""
+        Members = models.Organization.users.through
+        Admins = models.Organization.admin_users.through
+
+        members = Members.objects.filter(user=user).values_list(
+            'organization__uuid',
+            Value(False, output_field=BooleanField())
+        )
+        admins = Admins.objects.filter(user=user).values_list(
+            'organization__uuid',
+            Value(True, output_field=BooleanField())
+        )
+
+        member_of, admin_of = [], []
+        for org_uuid, is_admin in members.union(admins, all=True):
+            if is_admin:
+                admin_of.append(_as_uuid(org_uuid))
+            else:
+                member_of.append(_as_uuid(org_uuid))
+
+        return cls(member_of, admin_of)
+
+
+def cache_timeout():
+    return getattr(settings, 'ORGANIZATION_ROLE_CACHE_TIMEOUT', 0)
+
+
+def get_organization_roles(request):
+    """
+    Get the roles of the authenticated user of a request. The roles are
+    resolved at most once per request.
+    """
+    roles = getattr(request, REQUEST_ATTRIBUTE, None)
+    if roles is not None:
+        return roles
+
+    user = request.user
+    timeout = cache_timeout()
+    key = CACHE_KEY.format(user.pk)
+
+    roles = cache.get(key) if timeout else None
+    if roles is None:
+        roles = OrganizationRoles.load(user)
+        if timeout:
+            cache.set(key, roles, timeout)
+
+    setattr(request, REQUEST_ATTRIBUTE, roles)
+    return roles
+
+
+def invalidate_organization_roles(user_pks):
+    """
+    Drop the cached roles of the users with the given primary keys, now and
+    again once the transaction changing them commits: a request in between
+    still reads the old roles, and would cache them for the whole timeout.
+    """
+    keys = [CACHE_KEY.format(pk) for pk in user_pks]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,245 @@
+"""
+Full text search over contacts. Each contact has a ContactSearchDocument
+holding its name, contact method values and note bodies; documents are
+rebuilt whenever one of those changes (see api.signals) and indexed by a
+database specific backend:
+
+* SQLite: an FTS5 table kept in sync with the documents by triggers,
+  ranked with bm25().
+* PostgreSQL: a GIN index over the documents' weighted tsvector, ranked with
+  ts_rank().
+* anything else: unindexed icontains matching.
+
+The backend is picked from the database vendor, or can be set with the
+CONTACT_SEARCH_BACKEND setting. Contacts from before search was deployed, or
+before a change of backend, are indexed with the rebuild_search_index
+management command.
+"""
+from collections import defaultdict
+import re
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+import api.models as models
+
+MAX_TERMS = 10
+
+
+def terms(query):
+    """Split a search query into lower case terms."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Indexes ContactSearchDocuments and searches them."""
+    def __init__(self, connection):
+        self.connection = connection
+        self.table = models.ContactSearchDocument._meta.db_table
+
+    def setup(self):
+        """Create whatever the backend needs, once the tables exist."""
+
+    def search(self, org, terms, limit):
+        """Get the pks of the contacts matching all terms, best first."""
+        raise NotImplementedError
+
+
+class SimpleSearchBackend(SearchBackend):
+    def search(self, org, terms, limit):
+        documents = models.ContactSearchDocument.objects \
+                          .filter(organization=org)
+        for term in terms:
+            documents = documents.filter(Q(name__icontains=term) |
+                                         Q(methods__icontains=term) |
+                                         Q(notes__icontains=term))
+        documents = documents.order_by('name')
+        return list(documents.values_list('contact_id', flat=True)[:limit])
+
+
+class SqliteSearchBackend(SearchBackend):
+    # the organization is indexed as a token, so matching within an
+    # organization is part of the full text query
+    SETUP = [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts}
+        USING fts5(org, name, methods, notes, content='')
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, org, name, methods, notes)
+            VALUES (new.contact_id, 'o' || new.organization_id,
+                    new.name, new.methods, new.notes);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, org, name, methods, notes)
+            VALUES ('delete', old.contact_id, 'o' || old.organization_id,
+                    old.name, old.methods, old.notes);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, org, name, methods, notes)
+            VALUES ('delete', old.contact_id, 'o' || old.organization_id,
+                    old.name, old.methods, old.notes);
+            INSERT INTO {fts}(rowid, org, name, methods, notes)
+            VALUES (new.contact_id, 'o' || new.organization_id,
+                    new.name, new.methods, new.notes);
+        END
+        """
+    ]
+    # bm25 weights of the org, name, methods and notes columns
+    SEARCH = """
+        SELECT rowid FROM {fts} WHERE {fts} MATCH %s
+        ORDER BY bm25({fts}, 0.0, 10.0, 5.0, 1.0)
+        LIMIT %s
+    """
+
+    @property
+    def fts(self):
+        return f'{self.table}_fts'
+
+    def setup(self):
+        with self.connection.cursor() as cursor:
+            for statement in SqliteSearchBackend.SETUP:
+                cursor.execute(statement.format(fts=self.fts,
+                                                table=self.table))
+
+    def search(self, org, terms, limit):
+        # every term is a quoted prefix query
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        match = f'org : "o{org.pk}" AND ({match})'
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(SqliteSearchBackend.SEARCH.format(fts=self.fts),
+                           [match, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(SearchBackend):
+    VECTOR = """(
+        setweight(to_tsvector('simple', name), 'A') ||
+        setweight(to_tsvector('simple', methods), 'B') ||
+        setweight(to_tsvector('simple', notes), 'C')
+    )"""
+    SETUP = """
+        CREATE INDEX IF NOT EXISTS {table}_gin ON {table}
+        USING GIN ({vector})
+    """
+    SEARCH = """
+        SELECT contact_id FROM {table}
+        WHERE organization_id = %s
+          AND {vector} @@ to_tsquery('simple', %s)
+        ORDER BY ts_rank({vector}, to_tsquery('simple', %s)) DESC
+        LIMIT %s
+    """
+
+    def setup(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(PostgresSearchBackend.SETUP.format(
+                table=self.table,
+                vector=PostgresSearchBackend.VECTOR
+            ))
+
+    def search(self, org, terms, limit):
+        # terms are \w+ and can't contain tsquery operators
+        query = ' & '.join(f'{term}:*' for term in terms)
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(PostgresSearchBackend.SEARCH.format(
+                table=self.table,
+                vector=PostgresSearchBackend.VECTOR
+            ), [org.pk, query, query, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend
+}
+
+
+def get_backend(using='default'):
+    connection = connections[using]
+    path = getattr(settings, 'CONTACT_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)(connection)
+    return BACKENDS.get(connection.vendor, SimpleSearchBackend)(connection)
+
+
+def setup_search_index(using='default', **kwargs):
+    """post_migrate receiver creating the backend's index."""
+    get_backend(using).setup()
+
+
+def search_contacts(org, query, limit=50):
+    """
+    Get the pks of an organization's contacts matching a search query, best
+    match first.
+    """
+    query_terms = terms(query)
+    if not query_terms:
+        return []
+    return get_backend().search(org, query_terms, limit)
+
+
+def index_contacts(pks):
+    """(Re)build the search documents of the contacts with the given pks."""
+    pks = list(pks)
+    contacts = models.Contact.objects.filter(pk__in=pks) \
+                     .values_list('pk', 'organization_id',
+                                  'first_name', 'last_name')
+
+    methods = defaultdict(list)
+    for contact_id, value in models.ContactMethod.objects \
+            .filter(contact_id__in=pks).values_list('contact_id', 'value'):
+        methods[contact_id].append(value)
+
+    notes = defaultdict(list)
+    for contact_id, body in models.ContactNote.objects \
+            .filter(contact_id__in=pks).values_list('contact_id', 'body'):
+        notes[contact_id].append(body)
+
+    with transaction.atomic():
+        models.ContactSearchDocument.objects \
+              .filter(contact_id__in=pks).delete()
+        models.ContactSearchDocument.objects.bulk_create(
+            models.ContactSearchDocument(
+                contact_id=pk,
+                organization_id=organization_id,
+                name=f'{first_name} {last_name}',
+                methods='\n'.join(methods[pk]),
+                notes='\n'.join(notes[pk])
+            ) for pk, organization_id, first_name, last_name in contacts
+        )
+
+
+def index_all_contacts(chunk_size=1000):
+    """
+    Rebuild the search documents of every contact, a chunk of contacts (by
+    pk) at a time, e.g. for contacts that existed before search, or after
+    switching backends. Returns the number of contacts indexed.
+    """
+    contacts = models.Contact.objects.order_by('pk') \
+                     .values_list('pk', flat=True)
+    indexed = last = 0
+    while True:
+        pks = list(contacts.filter(pk__gt=last)[:chunk_size])
+        if not pks:
+            return indexed
+        index_contacts(pks)
+        indexed += len(pks)
+        last = pks[-1]
+
+
+def reindex_contact_on_commit(contact_id):
+    """
+    Rebuild a contact's document once the current transaction commits, e.g.
+    after one of its notes changed. Deferring avoids recreating the document
+    of a contact that is being deleted along with its notes.
+    """
+    transaction.on_commit(lambda: index_contacts([contact_id]))
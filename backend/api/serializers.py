@@ -1,8 +1,147 @@
+from django.db.models import Prefetch
+from django.urls import reverse
 from rest_framework import serializers
 import api.models as models
+from api.images import MAX_SIZE
+
+
+def _loading(serializer, prefix=''):
+    """
+    The fields to load and relations to select that a model serializer's
+    fields need, the fields all being model fields or to-one relations.
+    """
+    only, related = [], []
+    for field in serializer.fields.values():
+        path = prefix + field.source
+        if isinstance(field, serializers.BaseSerializer):
+            # expanded
+            sub_only, sub_related = _loading(field, f'{path}__')
+            only += [path] + sub_only
+            related += [path] + sub_related
+        elif isinstance(field, serializers.SlugRelatedField):
+            only += [path, f'{path}__{field.slug_field}']
+            related.append(path)
+        else:
+            # including primary keys of related objects, which are columns
+            only.append(path)
+    return only, related
+
+
+class ExpandableFieldsMixin:
+    """
+    Lets clients choose what a model serializer outputs: fields, a list of
+    the fields to output (all if None), and expand, a list of the relations
+    in expandable to output as nested objects rather than uuids. Fields have
+    to be model fields or to-one relations, so that setup_eager_loading can
+    tell which columns and joins they need.
+    """
+    # relation: serializer of the related object
+    expandable = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+
+        for name in expand:
+            self.fields[name] = self.expandable[name](read_only=True)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, expand=()):
+        """
+        Fetch everything the serializer needs for the chosen fields, and
+        only that, in a single query.
+        """
+        only, related = _loading(cls(fields=fields, expand=expand))
+        queryset = queryset.only(*only)
+        if related:
+            # select_related() without fields would follow every relation
+            queryset = queryset.select_related(*related)
+        return queryset
+
+
+class FieldsetSerializer(serializers.Serializer):
+    """
+    The fields and expand query parameters, as comma separated lists, of a
+    view whose output is chosen with an ExpandableFieldsMixin serializer
+    given as the context's 'serializer'.
+    """
+    fields = serializers.CharField(required=False, default=None)
+    expand = serializers.CharField(required=False, default='')
+
+    def _names(self, value, allowed):
+        names = [name for name in value.split(',') if name]
+        unknown = set(names) - set(allowed)
+        if unknown:
+            raise serializers.ValidationError(
+                f'Unknown fields: {", ".join(sorted(unknown))}'
+            )
+        return names
+
+    def validate_fields(self, value):
+        if value is None:
+            return None
+        return self._names(value, self.context['serializer'].Meta.fields)
+
+    def validate_expand(self, value):
+        return self._names(value, self.context['serializer'].expandable)
+
+
+class ContactMethodSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.ContactMethod
+        lookup_field = 'uuid'
+        fields = [
+            'uuid',
+            'medium',
+            'value'
+        ]
+
+
+class ContactRankSerializer(serializers.ModelSerializer):
+    organization = serializers.SlugRelatedField(slug_field='uuid',
+                                                read_only=True)
+
+    class Meta:
+        model = models.ContactRank
+        lookup_field = 'uuid'
+        fields = [
+            'uuid',
+            'organization',
+            'name',
+            'description'
+        ]
 
 
-class ContactSerializer(serializers.ModelSerializer):
+class MemberSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.User
+        lookup_field = 'uuid'
+        fields = [
+            'uuid',
+            'first_name',
+            'last_name',
+            'email'
+        ]
+
+
+class ContactSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    # related objects are referred to by uuid, like everywhere else in the API
+    organization = serializers.SlugRelatedField(slug_field='uuid',
+                                                read_only=True)
+    created_by = serializers.SlugRelatedField(slug_field='uuid',
+                                              read_only=True)
+    primary_contact_method = serializers.SlugRelatedField(slug_field='uuid',
+                                                          read_only=True)
+    rank = serializers.SlugRelatedField(slug_field='uuid', read_only=True)
+
+    expandable = {
+        'created_by': MemberSerializer,
+        'primary_contact_method': ContactMethodSerializer,
+        'rank': ContactRankSerializer
+    }
+
     class Meta:
         model = models.Contact
         lookup_field = 'uuid'
@@ -19,43 +158,61 @@ class ContactSerializer(serializers.ModelSerializer):
 
 class ContactMethodAdditionSerializer(serializers.Serializer):
     contact_uuid = serializers.UUIDField(required=False)
-    medium = serializers.CharField()
-    value = serializers.CharField()
+    medium = serializers.CharField(max_length=100)
+    value = serializers.CharField(max_length=100)
 
 
 class ContactAdditionSerializer(serializers.Serializer):
-    first_name = serializers.CharField()
-    last_name = serializers.CharField()
+    first_name = serializers.CharField(max_length=100)
+    last_name = serializers.CharField(max_length=100)
     primary_contact_method = ContactMethodAdditionSerializer(required=False)
     rank_uuid = serializers.UUIDField(required=False)
     organization_uuid = serializers.UUIDField()
 
 
+class ContactImportSerializer(ContactAdditionSerializer):
+    # the organization is given by the import's url
+    organization_uuid = None
+
+
+class ContactSearchSerializer(serializers.Serializer):
+    q = serializers.CharField()
+    limit = serializers.IntegerField(required=False, default=50,
+                                     min_value=1, max_value=200)
+
+
 class ContactUpdateSerializer(serializers.Serializer):
-    first_name = serializers.CharField(required=False)
-    last_name = serializers.CharField(required=False)
+    first_name = serializers.CharField(required=False, max_length=100)
+    last_name = serializers.CharField(required=False, max_length=100)
     primary_contact_method_uuid = serializers.UUIDField(required=False)
     rank_uuid = serializers.UUIDField(required=False)
 
 
 class ContactNoteAdditionSerializer(serializers.Serializer):
-    body = serializers.CharField()
-    tags = serializers.ListSerializer(child=serializers.CharField())
+    body = serializers.CharField(max_length=1023)
+    tags = serializers.ListSerializer(
+        child=serializers.CharField(max_length=127)
+    )
 
 
-class ContactRankSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = models.ContactRank
-        lookup_field = 'uuid'
-        fields = [
-            'uuid',
-            'organization',
-            'name',
-            'description'
-        ]
+class ContactNoteFilterSerializer(serializers.Serializer):
+    tag = serializers.CharField(required=False, max_length=127)
 
 
 class ContactNoteSerializer(serializers.ModelSerializer):
+    contact = serializers.SlugRelatedField(slug_field='uuid', read_only=True)
+    created_by = serializers.SlugRelatedField(slug_field='uuid',
+                                              read_only=True)
+    tags = serializers.SlugRelatedField(slug_field='name',
+                                        many=True,
+                                        read_only=True)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Fetch everything the serializer needs in two queries."""
+        return queryset.select_related('contact', 'created_by') \
+                       .prefetch_related('tags')
+
     class Meta:
         model = models.ContactNote
         lookup_field = 'uuid'
@@ -79,7 +236,7 @@ class TagSerializer(serializers.ModelSerializer):
         ]
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = models.User
         lookup_field = 'uuid'
@@ -113,27 +270,45 @@ class UserUpdateSerializer(serializers.Serializer):
     password = serializers.CharField(required=False)
 
 
-class MemberSerializer(serializers.ModelSerializer):
+class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
-        model = models.User
+        model = models.Notification
         lookup_field = 'uuid'
         fields = [
             'uuid',
-            'first_name',
-            'last_name',
-            'email'
+            'user',
+            'created',
+            'body',
+            'read'
         ]
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationsReadSerializer(serializers.Serializer):
+    # all of the user's notifications if not given
+    notifications = serializers.ListField(child=serializers.UUIDField(),
+                                          required=False,
+                                          max_length=1000)
+
+
+class ActivityEventSerializer(serializers.ModelSerializer):
+    actor = serializers.SlugRelatedField(slug_field='uuid', read_only=True)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('actor').only(
+            'uuid', 'created', 'kind', 'subject', 'summary', 'actor__uuid'
+        )
+
     class Meta:
-        model = models.Notification
+        model = models.ActivityEvent
         lookup_field = 'uuid'
         fields = [
             'uuid',
-            'user',
             'created',
-            'body'
+            'actor',
+            'kind',
+            'subject',
+            'summary'
         ]
 
 
@@ -172,6 +347,17 @@ class RankAdditionSerializer(serializers.Serializer):
     description = serializers.CharField()
 
 
+class MemberOperationSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(['add', 'remove', 'promote', 'demote'])
+    user = serializers.UUIDField()
+
+
+class MembersBulkSerializer(serializers.Serializer):
+    operations = serializers.ListField(child=MemberOperationSerializer(),
+                                       min_length=1,
+                                       max_length=1000)
+
+
 class MembershipRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.MembershipRequest
@@ -187,7 +373,28 @@ class MembershipRequestAdditionSerializer(serializers.Serializer):
     user_uuid = serializers.UUIDField()
 
 
+class MembershipRequestApprovalSerializer(serializers.Serializer):
+    requests = serializers.ListField(child=serializers.UUIDField(),
+                                     min_length=1,
+                                     max_length=1000)
+
+
 class TaskSerializer(serializers.ModelSerializer):
+    organization = serializers.SlugRelatedField(slug_field='uuid',
+                                                read_only=True)
+    assigner = serializers.SlugRelatedField(slug_field='uuid',
+                                            read_only=True)
+    assignees = serializers.SlugRelatedField(slug_field='uuid',
+                                             many=True,
+                                             read_only=True)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Fetch everything the serializer needs in two queries."""
+        assignees = models.User.objects.only('uuid')
+        return queryset.select_related('organization', 'assigner') \
+                       .prefetch_related(Prefetch('assignees', assignees))
+
     class Meta:
         model = models.Task
         lookup_field = 'uuid'
@@ -202,7 +409,69 @@ class TaskSerializer(serializers.ModelSerializer):
         ]
 
 
+class TaskAdditionSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=100)
+    body = serializers.CharField(max_length=1023, allow_blank=True)
+    due_date = serializers.DateTimeField()
+    assignees = serializers.ListField(child=serializers.UUIDField(),
+                                      max_length=1000,
+                                      default=list)
+
+
+class TaskUpdateSerializer(serializers.Serializer):
+    title = serializers.CharField(required=False, max_length=100)
+    body = serializers.CharField(required=False, max_length=1023,
+                                 allow_blank=True)
+    due_date = serializers.DateTimeField(required=False)
+    assignees = serializers.ListField(child=serializers.UUIDField(),
+                                      required=False,
+                                      max_length=1000)
+
+
+class TaskFilterSerializer(serializers.Serializer):
+    due_after = serializers.DateTimeField(required=False)
+    due_before = serializers.DateTimeField(required=False)
+
+
+class DueTasksSerializer(serializers.Serializer):
+    days = serializers.IntegerField(required=False, default=7,
+                                    min_value=1, max_value=365)
+
+
 class OrganizationImageSerializer(serializers.ModelSerializer):
+    organization = serializers.SlugRelatedField(slug_field='uuid',
+                                                read_only=True)
+    created_by = serializers.SlugRelatedField(slug_field='uuid',
+                                              read_only=True)
+    width = serializers.IntegerField(source='blob.width', read_only=True)
+    height = serializers.IntegerField(source='blob.height', read_only=True)
+    image = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
+
+    def get_image(self, image):
+        return reverse('image', kwargs={'orgId': image.organization.uuid,
+                                        'imageId': image.uuid})
+
+    def get_thumbnails(self, image):
+        return [{
+            'size': thumbnail.size,
+            'format': thumbnail.format,
+            'width': thumbnail.width,
+            'height': thumbnail.height,
+            'url': reverse('image_thumbnail', kwargs={
+                'orgId': image.organization.uuid,
+                'imageId': image.uuid,
+                'size': thumbnail.size,
+                'image_format': thumbnail.format
+            })
+        } for thumbnail in image.blob.thumbnails.all()]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Fetch everything the serializer needs in two queries."""
+        return queryset.select_related('organization', 'created_by', 'blob') \
+                       .prefetch_related('blob__thumbnails')
+
     class Meta:
         model = models.OrganizationImage
         lookup_field = 'uuid'
@@ -211,5 +480,26 @@ class OrganizationImageSerializer(serializers.ModelSerializer):
             'organization',
             'created',
             'created_by',
-            'image'
+            'filename',
+            'width',
+            'height',
+            'image',
+            'thumbnails'
         ]
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.ImageUpload
+        lookup_field = 'uuid'
+        fields = [
+            'uuid',
+            'filename',
+            'size',
+            'received'
+        ]
+
+
+class ImageUploadAdditionSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1, max_value=MAX_SIZE)
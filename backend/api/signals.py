@@ -0,0 +1,222 @@
+"""
+Model signal receivers that keep derived state (caches etc.) in sync with the
+database. Connected when the app is ready, see api.apps.ApiConfig.
+"""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete
+)
+from django.dispatch import receiver
+
+import api.activity as activity
+import api.models as models
+from api.fanout import queue_fanout
+from api.images import delete_file_on_commit, release_blob
+from api.inbox import adjust_unread
+from api.push import publish_notifications
+from api.roles import invalidate_organization_roles
+from api.search import reindex_contact_on_commit
+from api.tasks import unassign_former_members
+import api.versions as versions
+
+
+def _affected_user_pks(instance, reverse, pk_set, field_name):
+    if reverse:
+        # instance is the user whose organizations changed
+        return [instance.pk]
+    if pk_set is not None:
+        return list(pk_set)
+    # clear(): pk_set isn't given, so look the users up before they're gone
+    return list(getattr(instance, field_name).values_list('pk', flat=True))
+
+
+def _affected_organization_uuids(instance, reverse, pk_set, related_name):
+    if not reverse:
+        return [instance.uuid]
+    if pk_set is not None:
+        return models.Organization.objects.filter(pk__in=pk_set) \
+                     .values_list('uuid', flat=True)
+    return getattr(instance, related_name).values_list('uuid', flat=True)
+
+
+@receiver(m2m_changed, sender=models.Organization.users.through)
+def organization_users_changed(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        pks = _affected_user_pks(instance, reverse, pk_set, 'users')
+        invalidate_organization_roles(pks)
+
+        uuids = _affected_organization_uuids(instance, reverse, pk_set,
+                                             'member_of')
+        versions.bump(versions.MEMBERS, uuids)
+
+    if action in ('post_remove', 'pre_clear'):
+        if reverse:
+            org_pks = pk_set
+            if org_pks is None:
+                org_pks = list(instance.member_of.values_list('pk',
+                                                              flat=True))
+            unassign_former_members(org_pks, [instance.pk])
+        else:
+            unassign_former_members([instance.pk], pks)
+
+
+@receiver(m2m_changed, sender=models.Organization.admin_users.through)
+def organization_admin_users_changed(sender, instance, action, reverse,
+                                     pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        pks = _affected_user_pks(instance, reverse, pk_set, 'admin_users')
+        invalidate_organization_roles(pks)
+
+        # drops cached member lists too, in case they ever show admins
+        uuids = _affected_organization_uuids(instance, reverse, pk_set,
+                                             'admin_of')
+        versions.bump(versions.MEMBERS, uuids)
+
+
+@receiver(pre_delete, sender=models.Organization)
+def organization_deleted(sender, instance, **kwargs):
+    pks = set(instance.users.values_list('pk', flat=True))
+    pks.update(instance.admin_users.values_list('pk', flat=True))
+    invalidate_organization_roles(pks)
+
+
+@receiver(post_save, sender=models.Contact)
+def contact_saved(sender, instance, **kwargs):
+    reindex_contact_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=models.Contact)
+@receiver(post_delete, sender=models.Contact)
+def contacts_changed(sender, instance, **kwargs):
+    versions.bump(versions.CONTACTS, [instance.organization.uuid])
+
+
+@receiver(post_save, sender=models.ContactRank)
+@receiver(post_delete, sender=models.ContactRank)
+def ranks_changed(sender, instance, **kwargs):
+    versions.bump(versions.RANKS, [instance.organization.uuid])
+    # contacts can be listed with their ranks expanded
+    versions.bump(versions.CONTACTS, [instance.organization.uuid])
+
+
+@receiver(post_save, sender=models.ContactMethod)
+@receiver(post_delete, sender=models.ContactMethod)
+def contact_methods_changed(sender, instance, **kwargs):
+    # contacts can be listed with their primary contact methods expanded
+    versions.bump(versions.CONTACTS,
+                  models.Organization.objects
+                        .filter(contact=instance.contact_id)
+                        .values_list('uuid', flat=True))
+
+
+def _contacts_created_by(user):
+    """The organizations with contacts created by a user."""
+    return models.Organization.objects.filter(contact__created_by=user) \
+                 .values_list('uuid', flat=True)
+
+
+@receiver(post_save, sender=models.Notification)
+@receiver(post_delete, sender=models.Notification)
+def notifications_changed(sender, instance, **kwargs):
+    versions.bump(versions.NOTIFICATIONS, [instance.user.uuid])
+
+
+@receiver(post_save, sender=models.Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    if created:
+        if not instance.read:
+            adjust_unread({instance.user_id: 1})
+        publish_notifications([instance])
+
+
+@receiver(post_delete, sender=models.Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.read:
+        adjust_unread({instance.user_id: -1})
+
+
+@receiver(post_save, sender=models.User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        models.NotificationCounter.objects.create(user=instance)
+    else:
+        # members are listed with their names and emails
+        versions.bump(versions.MEMBERS,
+                      instance.member_of.values_list('uuid', flat=True))
+
+        # and so are the creators of contacts, when expanded; logging in
+        # only saves last_login
+        shown = {'first_name', 'last_name', 'email'}
+        if update_fields is None or shown & set(update_fields):
+            versions.bump(versions.CONTACTS, _contacts_created_by(instance))
+
+
+@receiver(pre_delete, sender=models.User)
+def user_deleted(sender, instance, **kwargs):
+    # memberships are deleted without m2m_changed
+    versions.bump(versions.MEMBERS,
+                  instance.member_of.values_list('uuid', flat=True))
+    # contacts' created_by is cleared without post_save
+    versions.bump(versions.CONTACTS, _contacts_created_by(instance))
+
+
+@receiver(post_save, sender=models.ContactMethod)
+@receiver(post_delete, sender=models.ContactMethod)
+@receiver(post_save, sender=models.ContactNote)
+@receiver(post_delete, sender=models.ContactNote)
+def contact_text_changed(sender, instance, **kwargs):
+    reindex_contact_on_commit(instance.contact_id)
+
+
+@receiver(post_save, sender=models.Task)
+def task_saved(sender, instance, created, **kwargs):
+    if created:
+        queue_fanout(instance.organization, f'New task: {instance.title}',
+                     exclude=instance.assigner)
+
+
+@receiver(m2m_changed, sender=models.Task.assignees.through)
+def task_assignees_changed(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # instance is the user assigned to the tasks
+        tasks = models.Task.objects.filter(pk__in=pk_set) \
+                      .select_related('organization', 'assigner')
+        for task in tasks:
+            activity.task_assigned(task, [instance])
+    else:
+        users = list(models.User.objects.filter(pk__in=pk_set)
+                           .only('first_name', 'last_name')
+                           .order_by('pk'))
+        activity.task_assigned(instance, users)
+
+
+@receiver(post_delete, sender=models.OrganizationImage)
+def image_deleted(sender, instance, **kwargs):
+    release_blob(instance.blob_id)
+
+
+@receiver(post_delete, sender=models.ImageBlob)
+def blob_deleted(sender, instance, **kwargs):
+    delete_file_on_commit(instance.file)
+
+
+@receiver(post_delete, sender=models.ImageThumbnail)
+def thumbnail_deleted(sender, instance, **kwargs):
+    delete_file_on_commit(instance.file)
+
+
+@receiver(post_save, sender=models.OrganizationImage)
+def image_saved(sender, instance, created, **kwargs):
+    if created:
+        poster = instance.created_by
+        who = 'Someone'
+        if poster is not None:
+            who = f'{poster.first_name} {poster.last_name}'
+        queue_fanout(instance.organization, f'{who} posted an image.',
+                     exclude=poster)
@@ -0,0 +1,80 @@
+"""
+Tasks and their assignees. An organization's tasks are listed by due date
+from the (organization, due_date) index, and the tasks a user is assigned
+across all of their organizations from the (user, task) index of the
+assignees table, so a dashboard takes one query however many organizations
+the user is in. Members leaving an organization are unassigned from its
+tasks, see api.signals.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+import api.models as models
+
+
+class NotAMember(Exception):
+    """Tasks can only be assigned to members of their organization."""
+
+
+def _member_pks(org, uuids):
+    uuids = set(uuids)
+    pks = list(org.users.filter(uuid__in=uuids).values_list('pk', flat=True))
+    if len(pks) < len(uuids):
+        raise NotAMember()
+    return pks
+
+
+def create_task(org, assigner, title, body, due_date, assignees=()):
+    """
+    Create a task assigned to the members with the given uuids. Raises
+    NotAMember, creating nothing, if any of them isn't one.
+    """
+    with transaction.atomic():
+        pks = _member_pks(org, assignees)
+        task = models.Task.objects.create(organization=org,
+                                          assigner=assigner,
+                                          title=title,
+                                          body=body,
+                                          due_date=due_date)
+        task.assignees.add(*pks)
+    return task
+
+
+def update_task(task, assignees=None, **fields):
+    """
+    Change the given fields of a task and, unless None, replace its
+    assignees with the members with the given uuids. Raises NotAMember,
+    changing nothing, if any of them isn't one.
+    """
+    with transaction.atomic():
+        if fields.get('due_date', task.due_date) != task.due_date:
+            # remind the assignees again before the new due date
+            task.taskreminder_set.all().delete()
+        for name, value in fields.items():
+            setattr(task, name, value)
+        task.save()
+
+        if assignees is not None:
+            task.assignees.set(_member_pks(task.organization, assignees))
+
+
+def unassign_former_members(org_pks, user_pks):
+    """
+    Drop the assignments (and reminders) of users to the tasks of
+    organizations they've left, so former members aren't shown or reminded
+    of them.
+    """
+    models.TaskAssignee.objects.filter(task__organization__in=org_pks,
+                                       user__in=user_pks).delete()
+    models.TaskReminder.objects.filter(task__organization__in=org_pks,
+                                       user__in=user_pks).delete()
+
+
+def due_tasks(user, days):
+    """The tasks assigned to a user that are due in the next days."""
+    now = timezone.now()
+    return models.Task.objects.filter(assignees=user,
+                                      due_date__gte=now,
+                                      due_date__lt=now + timedelta(days=days))
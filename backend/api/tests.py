@@ -1,8 +1,56 @@
-from django.test import TestCase, TransactionTestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.cache import cache
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connection,
+    transaction
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
 from django.contrib.auth.hashers import check_password
 from rest_framework.test import APIClient
+from PIL import Image
 from rest_framework import status
 import api.models as models
+from api.roles import (
+    CACHE_KEY,
+    OrganizationRoles,
+    get_organization_roles
+)
+import api.fanout as fanout
+import api.images as images
+import api.imports as imports
+import api.inbox as inbox
+import api.mail as mail_module
+import api.membership as membership
+import api.notes as notes
+import api.push as push
+import api.reminders as reminders
+import api.retention as retention
+import api.tasks as tasks
+from backend.asgi import application
+from backend.db import close_if_unusable
+from api.tokens import email_verification_token_generator
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time
 import uuid
 
 
@@ -157,7 +205,7 @@ class ContactsTestCase(ApiBaseTestCase):
             f'/api/organizations/{self.org.uuid}/contacts/'
         )
         self.assertEquals(response.status_code, status.HTTP_200_OK)
-        self.assertEquals(len(response.data), 1)
+        self.assertEquals(len(response.data['results']), 1)
 
     def test_post_contacts(self):
         data = {
@@ -190,6 +238,829 @@ class ContactsTestCase(ApiBaseTestCase):
         )
 
 
+class ContactsQueryCountTestCase(ApiBaseTestCase):
+    # user lookup, role lookup, collection version and contacts
+    QUERIES = 4
+
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.rank = self.make_rank1(self.org)
+        self.rank.save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def make_contacts(self, n):
+        models.Contact.objects.bulk_create(
+            models.Contact(
+                organization=self.org,
+                created_by=self.user,
+                first_name=f'First {i}',
+                last_name=f'Last {i}',
+                rank=self.rank
+            ) for i in range(n)
+        )
+        contacts = list(self.org.contact_set.all())
+        models.ContactMethod.objects.bulk_create(
+            models.ContactMethod(
+                contact=contact,
+                medium='phone',
+                value=f'{i:010}'
+            ) for i, contact in enumerate(contacts)
+        )
+        by_pk = {contact.pk: contact for contact in contacts}
+        for cm in models.ContactMethod.objects.filter(
+                contact__organization=self.org):
+            by_pk[cm.contact_id].primary_contact_method = cm
+        models.Contact.objects.bulk_update(contacts,
+                                           ['primary_contact_method'],
+                                           batch_size=500)
+
+    def assert_contacts_bounded(self, n):
+        self.make_contacts(n)
+
+        with self.assertNumQueries(ContactsQueryCountTestCase.QUERIES):
+            response = self.client.get(
+                f'/api/organizations/{self.org.uuid}/contacts/'
+            )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(response.data['results']),
+                          min(n, settings.REST_FRAMEWORK['PAGE_SIZE']))
+
+        contact = response.data['results'][0]
+        self.assertEquals(contact['organization'], self.org.uuid)
+        self.assertEquals(contact['created_by'], self.user.uuid)
+        self.assertEquals(contact['rank'], self.rank.uuid)
+        self.assertIsNotNone(contact['primary_contact_method'])
+
+    def test_one_contact(self):
+        self.assert_contacts_bounded(1)
+
+    def test_hundred_contacts(self):
+        self.assert_contacts_bounded(100)
+
+    def test_ten_thousand_contacts(self):
+        self.assert_contacts_bounded(10000)
+
+    def test_sparse_fields(self):
+        self.make_contacts(10)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f'/api/organizations/{self.org.uuid}/contacts/'
+                '?fields=uuid,first_name'
+            )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        for contact in response.data['results']:
+            self.assertEquals(set(contact), {'uuid', 'first_name'})
+
+        # the contacts are read without the columns and joins left out
+        sql = queries.captured_queries[-1]['sql']
+        self.assertIn('first_name', sql)
+        self.assertNotIn('last_name', sql)
+        self.assertNotIn('api_contactrank', sql)
+        self.assertNotIn('api_contactmethod', sql)
+
+    def test_expand(self):
+        self.make_contacts(10)
+
+        with self.assertNumQueries(ContactsQueryCountTestCase.QUERIES):
+            response = self.client.get(
+                f'/api/organizations/{self.org.uuid}/contacts/'
+                '?expand=rank,primary_contact_method,created_by'
+            )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+        contact = response.data['results'][0]
+        self.assertEquals(contact['organization'], self.org.uuid)
+        self.assertEquals(contact['rank']['uuid'], str(self.rank.uuid))
+        self.assertEquals(contact['rank']['organization'], self.org.uuid)
+        self.assertEquals(contact['rank']['name'], self.rank.name)
+        self.assertEquals(contact['primary_contact_method']['medium'],
+                          'phone')
+        self.assertEquals(contact['created_by']['email'], self.user.email)
+
+    def test_expand_one_contact(self):
+        self.make_contacts(1)
+        contact = self.org.contact_set.get()
+
+        response = self.client.get(
+            f'/api/organizations/{self.org.uuid}/contacts/{contact.uuid}/'
+            '?fields=uuid,rank&expand=rank'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(set(response.data), {'uuid', 'rank'})
+        self.assertEquals(response.data['rank']['name'], self.rank.name)
+
+    def test_unknown_fields(self):
+        url = f'/api/organizations/{self.org.uuid}/contacts/'
+
+        response = self.client.get(f'{url}?fields=uuid,password')
+        self.assertEquals(response.status_code,
+                          status.HTTP_400_BAD_REQUEST)
+
+        # only relations can be expanded
+        response = self.client.get(f'{url}?expand=first_name')
+        self.assertEquals(response.status_code,
+                          status.HTTP_400_BAD_REQUEST)
+
+    def test_expanded_relations_change_etag(self):
+        self.make_contacts(1)
+        url = (f'/api/organizations/{self.org.uuid}/contacts/'
+               '?expand=rank,primary_contact_method,created_by')
+        method = models.ContactMethod.objects.get()
+
+        def changed(edit):
+            etag = self.client.get(url)['ETag']
+            edit()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            return response.status_code == status.HTTP_200_OK
+
+        self.rank.description = 'Renamed'
+        self.assertTrue(changed(self.rank.save))
+        method.value = '555-0100'
+        self.assertTrue(changed(method.save))
+        self.user.first_name = 'Renamed'
+        self.assertTrue(changed(self.user.save))
+
+        # logging in doesn't change what contacts show of their creators
+        self.assertFalse(changed(
+            lambda: self.user.save(update_fields=['last_login'])
+        ))
+
+
+class PaginationTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+
+        for i in range(5):
+            contact = self.make_contact1(self.org, self.user)
+            contact.first_name = f'Contact {i}'
+            contact.save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def test_pages_stable_under_inserts(self):
+        url = f'/api/organizations/{self.org.uuid}/contacts/?page_size=2'
+        seen = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(len(response.data['results']) <= 2)
+            seen += [c['first_name'] for c in response.data['results']]
+            url = response.data['next']
+
+            # newer contacts must not shift the pages being walked
+            self.make_contact2(self.org, self.user).save()
+
+        self.assertEquals(seen, [f'Contact {i}' for i in range(4, -1, -1)])
+
+    def test_members_paginated(self):
+        response = self.client.get(
+            f'/api/organizations/{self.org.uuid}/members/'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        # served from the response cache as rendered JSON
+        body = response.json()
+        self.assertEquals(body['next'], None)
+        self.assertEquals(body['results'][0]['uuid'], str(self.user.uuid))
+
+    def test_notifications_paginated(self):
+        for i in range(3):
+            models.Notification(
+                user=self.user,
+                created=timezone.now(),
+                body=f'Notification {i}'
+            ).save()
+
+        response = self.client.get(
+            f'/api/users/{self.user.uuid}/notifications/?page_size=2'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [n['body'] for n in response.data['results']],
+            ['Notification 2', 'Notification 1']
+        )
+        self.assertIsNotNone(response.data['next'])
+
+
+class ContactsBulkTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.rank = self.make_rank1(self.org)
+        self.rank.save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def upload(self, name, content):
+        if isinstance(content, str):
+            content = content.encode()
+        upload = io.BytesIO(content)
+        upload.name = name
+        return self.client.post(
+            f'/api/organizations/{self.org.uuid}/contacts/bulk/',
+            {'file': upload},
+            format='multipart'
+        )
+
+    def test_import_csv(self):
+        content = (
+            'first_name,last_name,rank_uuid,medium,value\r\n'
+            f'Joe,Schmoe,{self.rank.uuid},phone,(123)-456-7890\r\n'
+            'Caleb,Smith,,,\r\n'
+            f'Missing,,{self.rank.uuid},,\r\n'
+            f'Bad,Rank,{uuid.uuid4()},,\r\n'
+        )
+        response = self.upload('contacts.csv', content)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(response.data['created'], 2)
+        self.assertEquals(response.data['errorCount'], 2)
+        self.assertEquals([e['row'] for e in response.data['errors']],
+                          [3, 4])
+
+        joe = self.org.contact_set.get(first_name='Joe')
+        self.assertEquals(joe.rank, self.rank)
+        self.assertEquals(joe.created_by, self.user)
+        self.assertEquals(joe.primary_contact_method.value, '(123)-456-7890')
+        self.assertEquals(joe.primary_contact_method.contact, joe)
+
+        caleb = self.org.contact_set.get(first_name='Caleb')
+        self.assertIsNone(caleb.rank)
+        self.assertIsNone(caleb.primary_contact_method)
+
+    def test_import_too_long(self):
+        content = (
+            'first_name,last_name,rank_uuid,medium,value\r\n'
+            'Joe,Schmoe,,,\r\n'
+            f'{"x" * 101},Smith,,,\r\n'
+            f'Caleb,Smith,,phone,{"5" * 101}\r\n'
+        )
+        response = self.upload('contacts.csv', content)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(response.data['created'], 1)
+        self.assertEquals([e['row'] for e in response.data['errors']],
+                          [2, 3])
+
+    def test_import_invalid_encoding(self):
+        content = (
+            b'first_name,last_name\r\n'
+            b'Joe,Schmoe\r\n'
+            b'Caleb,Smith\r\n'
+            b'Bad,\xff\xfe\r\n'
+            b'Never,Read\r\n'
+        )
+        response = self.upload('contacts.csv', content)
+        self.assertEquals(response.status_code,
+                          status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(response.data['success'], False)
+        self.assertEquals(response.data['created'], 2)
+
+        # the rows before the bad one are imported, with their event
+        self.assertEquals(self.org.contact_set.count(), 2)
+        event = models.ActivityEvent.objects.get(organization=self.org)
+        self.assertEquals(event.kind, 'contacts_imported')
+
+    def test_import_jsonl(self):
+        content = '\n'.join([
+            json.dumps({
+                'first_name': 'Joe',
+                'last_name': 'Schmoe',
+                'primary_contact_method': {
+                    'medium': 'email',
+                    'value': 'joe@example.com'
+                }
+            }),
+            '{not json',
+            '[]',
+            json.dumps({'first_name': 'Caleb', 'last_name': 'Smith'})
+        ])
+        response = self.upload('contacts.jsonl', content)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(response.data['created'], 2)
+        self.assertEquals([e['row'] for e in response.data['errors']],
+                          [2, 3])
+        self.assertEquals(
+            self.org.contact_set.get(first_name='Joe')
+                .primary_contact_method.value,
+            'joe@example.com'
+        )
+
+    def test_import_ten_thousand(self):
+        rows = ['first_name,last_name,medium,value']
+        rows += [f'First {i},Last {i},phone,{i:010}' for i in range(10000)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload('contacts.csv', '\n'.join(rows))
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(response.data['created'], 10000)
+
+        # a handful of queries per chunk, not per contact
+        chunks = 10000 // imports.CHUNK_SIZE
+        self.assertTrue(len(queries) < 25 * chunks, len(queries))
+        self.assertEquals(
+            self.org.contact_set
+                .filter(primary_contact_method__isnull=False).count(),
+            10000
+        )
+
+
+class ContactsExportTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.rank = self.make_rank1(self.org)
+        self.rank.save()
+
+        self.contact = self.make_contact1(self.org, self.user)
+        self.contact.rank = self.rank
+        self.contact.save()
+        cm = models.ContactMethod(contact=self.contact,
+                                  medium='phone',
+                                  value='(123)-456-7890')
+        cm.save()
+        self.contact.primary_contact_method = cm
+        self.contact.save()
+        note = models.ContactNote(contact=self.contact,
+                                  created_by=self.user,
+                                  created=timezone.now(),
+                                  body='Came to the cookout')
+        note.save()
+        tag = models.Tag(name='bid')
+        tag.save()
+        note.tags.add(tag)
+
+        self.make_contact2(self.org, self.user).save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def export(self, filetype):
+        response = self.client.get(
+            f'/api/organizations/{self.org.uuid}/contacts/export/'
+            f'?type={filetype}'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_jsonl(self):
+        lines = self.export('jsonl').splitlines()
+        self.assertEquals(len(lines), 2)
+
+        joe = json.loads(lines[0])
+        self.assertEquals(joe['uuid'], str(self.contact.uuid))
+        self.assertEquals(joe['rank']['name'], 'A')
+        self.assertEquals(joe['primary_contact_method'],
+                          joe['contact_methods'][0]['uuid'])
+        self.assertEquals(joe['notes'][0]['body'], 'Came to the cookout')
+        self.assertEquals(joe['notes'][0]['tags'], ['bid'])
+
+    def test_export_csv_can_be_imported(self):
+        content = self.export('csv')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEquals(len(rows), 2)
+        self.assertEquals(rows[0]['value'], '(123)-456-7890')
+
+        org = self.make_org2()
+        org.save()
+        org.users.add(self.user)
+        rank = self.make_rank1(org)
+        rank.uuid = uuid.uuid4()
+        rank.save()
+        upload = io.BytesIO(content.replace(str(self.rank.uuid),
+                                            str(rank.uuid)).encode())
+        upload.name = 'contacts.csv'
+        response = self.client.post(
+            f'/api/organizations/{org.uuid}/contacts/bulk/',
+            {'file': upload},
+            format='multipart'
+        )
+        self.assertEquals(response.data['created'], 2)
+
+    def test_export_queries_per_chunk(self):
+        models.Contact.objects.bulk_create(
+            self.make_contact2(self.org, self.user) for i in range(2500)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEquals(len(self.export('jsonl').splitlines()), 2502)
+        # contacts, plus methods, notes and tags per chunk of 1000
+        self.assertTrue(len(queries) <= 3 + 3 * 3, len(queries))
+
+    def test_export_unknown_type(self):
+        response = self.client.get(
+            f'/api/organizations/{self.org.uuid}/contacts/export/?type=xls'
+        )
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ContactsSearchTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+
+        self.joe = self.make_contact1(self.org, self.user)
+        self.joe.save()
+        models.ContactMethod(contact=self.joe,
+                             medium='phone',
+                             value='(123)-456-7890').save()
+
+        self.caleb = self.make_contact2(self.org, self.user)
+        self.caleb.save()
+        self.note = models.ContactNote(contact=self.caleb,
+                                       created_by=self.user,
+                                       created=timezone.now(),
+                                       body='Knows Joe from the dorms')
+        self.note.save()
+
+        # same name, other organization
+        org2 = self.make_org2()
+        org2.save()
+        self.make_contact1(org2, self.user).save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def search(self, q):
+        response = self.client.get(
+            f'/api/organizations/{self.org.uuid}/contacts/search/',
+            {'q': q}
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return [c['uuid'] for c in response.data]
+
+    def test_search_ranks_names_first(self):
+        self.assertEquals(self.search('joe'),
+                          [str(self.joe.uuid), str(self.caleb.uuid)])
+
+    def test_search_prefixes_and_methods(self):
+        self.assertEquals(self.search('Schm'), [str(self.joe.uuid)])
+        self.assertEquals(self.search('456-789'), [str(self.joe.uuid)])
+        self.assertEquals(self.search('dorms smith'), [str(self.caleb.uuid)])
+        self.assertEquals(self.search('dorms schmoe'), [])
+
+    def test_search_follows_changes(self):
+        self.note.delete()
+        self.assertEquals(self.search('dorms'), [])
+
+        self.joe.last_name = 'Dormsworth'
+        self.joe.save()
+        self.assertEquals(self.search('dorms'), [str(self.joe.uuid)])
+
+        self.caleb.delete()
+        self.assertEquals(self.search('smith'), [])
+
+    def test_search_imported_contacts(self):
+        upload = io.BytesIO(b'first_name,last_name\nMarcus,Aurelius\n')
+        upload.name = 'contacts.csv'
+        self.client.post(
+            f'/api/organizations/{self.org.uuid}/contacts/bulk/',
+            {'file': upload},
+            format='multipart'
+        )
+        self.assertEquals(len(self.search('aurel')), 1)
+
+    def test_rebuild_index(self):
+        # as if the contacts were there before search
+        models.ContactSearchDocument.objects.all().delete()
+        self.assertEquals(self.search('joe'), [])
+
+        out = io.StringIO()
+        call_command('rebuild_search_index', '--chunk-size', '2',
+                     stdout=out)
+        self.assertTrue('Indexed 3 contacts' in out.getvalue())
+        self.assertEquals(self.search('joe'),
+                          [str(self.joe.uuid), str(self.caleb.uuid)])
+
+    def test_search_requires_query(self):
+        response = self.client.get(
+            f'/api/organizations/{self.org.uuid}/contacts/search/'
+        )
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConditionalGetTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.make_contact1(self.org, self.user).save()
+        self.make_rank1(self.org).save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def assert_revalidates(self, url, change, queries=3):
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        # nothing changed: 304 after authorizing and the version lookup
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # pages have their own tags
+        response = self.client.get(url + '?page_size=1',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertNotEquals(response['ETag'], etag)
+
+    def test_contacts_last_modified(self):
+        url = f'/api/organizations/{self.org.uuid}/contacts/'
+        response = self.client.get(url)
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_contacts(self):
+        self.assert_revalidates(
+            f'/api/organizations/{self.org.uuid}/contacts/',
+            lambda: self.make_contact2(self.org, self.user).save()
+        )
+
+    def test_members(self):
+        def rename():
+            self.user.first_name = 'Timothy'
+            self.user.save()
+
+        self.assert_revalidates(
+            f'/api/organizations/{self.org.uuid}/members/',
+            rename
+        )
+
+    def test_ranks(self):
+        def add_rank():
+            rank = self.make_rank1(self.org)
+            rank.name = 'B'
+            rank.save()
+
+        self.assert_revalidates(
+            f'/api/organizations/{self.org.uuid}/ranks/',
+            add_rank
+        )
+
+    def test_notifications(self):
+        self.assert_revalidates(
+            f'/api/users/{self.user.uuid}/notifications/',
+            lambda: models.Notification(user=self.user,
+                                        created=timezone.now(),
+                                        body='Hello').save(),
+            queries=2
+        )
+
+
+class ResponseCacheTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.make_rank1(self.org).save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def assert_cached(self, url, change, queries=3):
+        first = self.client.get(url)
+        self.assertEquals(first.status_code, status.HTTP_200_OK)
+
+        # a hit only authenticates, authorizes and looks up the version
+        with self.assertNumQueries(queries):
+            second = self.client.get(url)
+        self.assertEquals(second.status_code, status.HTTP_200_OK)
+        self.assertEquals(second.content, first.content)
+        self.assertEquals(second['ETag'], first['ETag'])
+
+        change()
+        third = self.client.get(url)
+        self.assertNotEquals(third.content, first.content)
+        return third
+
+    def test_ranks(self):
+        def add_rank():
+            rank = self.make_rank1(self.org)
+            rank.name = 'B'
+            rank.save()
+
+        response = self.assert_cached(
+            f'/api/organizations/{self.org.uuid}/ranks/',
+            add_rank
+        )
+        self.assertEquals(len(response.json()), 2)
+
+    def test_members(self):
+        def join():
+            user = self.make_user2()
+            user.save()
+            self.org.users.add(user)
+
+        response = self.assert_cached(
+            f'/api/organizations/{self.org.uuid}/members/',
+            join
+        )
+        self.assertEquals(len(response.json()['results']), 2)
+
+    def test_member_pages(self):
+        user = self.make_user2()
+        user.save()
+        self.org.users.add(user)
+
+        url = f'/api/organizations/{self.org.uuid}/members/'
+        full = self.client.get(url).json()
+        page = self.client.get(url + '?page_size=1').json()
+        self.assertEquals(len(full['results']), 2)
+        self.assertEquals(len(page['results']), 1)
+
+    @override_settings(ALLOWED_HOSTS=['one.example.com', 'two.example.com'])
+    def test_member_pages_per_host(self):
+        user = self.make_user2()
+        user.save()
+        self.org.users.add(user)
+
+        url = f'/api/organizations/{self.org.uuid}/members/?page_size=1'
+        for host in ['one.example.com', 'two.example.com']:
+            page = self.client.get(url, HTTP_HOST=host).json()
+            self.assertTrue(page['next'].startswith(f'http://{host}/'))
+
+    def test_stats(self):
+        url = f'/api/organizations/{self.org.uuid}/ranks/'
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get(url)
+
+        response = self.client.get('/api/stats/cache/')
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/stats/cache/')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data, {'hits': 2, 'misses': 1})
+
+
+class NotificationStreamTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.user = self.make_user1()
+        self.user.save()
+        self.other = self.make_user2()
+        self.other.save()
+
+        response = self.client.post('/api/token/', {
+            'email': self.user.email,
+            'password': ApiBaseTestCase.PASS
+        })
+        self.token = response.data['access']
+
+    def connect(self, user=None, headers=()):
+        user = user or self.user
+        return ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': f'/api/users/{user.uuid}/notifications/stream/',
+            'query_string': f'token={self.token}'.encode(),
+            'headers': list(headers)
+        })
+
+    def notify(self, body):
+        notification = models.Notification(user=self.user,
+                                           created=timezone.now(),
+                                           body=body)
+        notification.save()
+        return notification
+
+    async def read_events(self, stream, n):
+        events = []
+        while len(events) < n:
+            message = await stream.receive_output(5)
+            body = message['body'].decode()
+            events += [e for e in body.split('\n\n')
+                       if e and not e.startswith(':')]
+        return events
+
+    @async_to_sync
+    async def test_stream(self):
+        stream = self.connect()
+        await stream.send_input({'type': 'http.request'})
+        start = await stream.receive_output(5)
+        self.assertEquals(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'),
+                      start['headers'])
+        await stream.receive_output(5)
+
+        notification = await sync_to_async(self.notify)('Hello')
+        event, = await self.read_events(stream, 1)
+        self.assertIn(f'id: {notification.uuid}', event)
+        self.assertIn('event: notification', event)
+        self.assertIn('"body":"Hello"', event)
+
+        # other users' notifications aren't pushed
+        await sync_to_async(models.Notification(user=self.other,
+                                                created=timezone.now(),
+                                                body='Psst').save)()
+        self.assertTrue(await stream.receive_nothing(0.2))
+
+        await stream.send_input({'type': 'http.disconnect'})
+        await stream.wait(5)
+        self.assertEquals(push.get_broker().subscriptions, {})
+
+    @async_to_sync
+    async def test_replay(self):
+        first = await sync_to_async(self.notify)('First')
+        await sync_to_async(self.notify)('Second')
+        await sync_to_async(self.notify)('Third')
+
+        stream = self.connect(headers=[(b'last-event-id',
+                                        str(first.uuid).encode())])
+        await stream.send_input({'type': 'http.request'})
+        await stream.receive_output(5)
+        events = await self.read_events(stream, 2)
+        self.assertIn('Second', events[0])
+        self.assertIn('Third', events[1])
+
+        await stream.send_input({'type': 'http.disconnect'})
+        await stream.wait(5)
+
+    @async_to_sync
+    async def test_unknown_last_event_id(self):
+        stream = self.connect(headers=[(b'last-event-id', b'nonsense')])
+        await stream.send_input({'type': 'http.request'})
+        await stream.receive_output(5)
+        event, = await self.read_events(stream, 1)
+        self.assertIn('event: resync', event)
+
+        await stream.send_input({'type': 'http.disconnect'})
+        await stream.wait(5)
+
+    @async_to_sync
+    async def test_forbidden(self):
+        stream = self.connect(user=self.other)
+        await stream.send_input({'type': 'http.request'})
+        start = await stream.receive_output(5)
+        self.assertEquals(start['status'], 403)
+
+        self.token = 'garbage'
+        stream = self.connect()
+        await stream.send_input({'type': 'http.request'})
+        start = await stream.receive_output(5)
+        self.assertEquals(start['status'], 401)
+
+    @override_settings(NOTIFICATION_STREAM_QUEUE_SIZE=2)
+    @async_to_sync
+    async def test_backpressure(self):
+        broker = push.LocalBroker()
+        subscription = broker.subscribe(self.user.uuid)
+
+        # a stream that isn't read never holds more than its queue size
+        for i in range(5):
+            broker.publish(self.user.uuid, (str(i), '{}'))
+        await asyncio.sleep(0)
+        self.assertEquals(subscription.queue.qsize(), 1)
+        self.assertIs(await subscription.queue.get(), push.RESYNC)
+
+        broker.publish(self.user.uuid, ('5', '{}'))
+        self.assertEquals(await subscription.queue.get(), ('5', '{}'))
+
+        broker.unsubscribe(self.user.uuid, subscription)
+        self.assertEquals(broker.subscriptions, {})
+
+
 class ContactTestCase(ApiBaseTestCase):
     def setUp(self):
         super().setUp()
@@ -261,6 +1132,113 @@ class ContactTestCase(ApiBaseTestCase):
         )
 
 
+class ContactNotesTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.contact = self.make_contact1(self.org, self.user)
+        self.contact.save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def test_post_note(self):
+        data = {
+            'body': 'Came to the cookout',
+            'tags': []
+        }
+        response = self.client.post(
+            f'/api/organizations/{self.org.uuid}/contacts/'
+            f'{self.contact.uuid}/notes/',
+            data,
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(response.data['success'], True)
+
+        note = self.contact.contactnote_set.get(uuid=response.data['uuid'])
+        self.assertEquals(note.body, 'Came to the cookout')
+        self.assertEquals(note.created_by, self.user)
+
+    def notes_url(self, contact=None):
+        contact = contact or self.contact
+        return f'/api/organizations/{self.org.uuid}/contacts/' \
+               f'{contact.uuid}/notes/'
+
+    def post_note(self, body, tags, contact=None):
+        response = self.client.post(self.notes_url(contact),
+                                    {'body': body, 'tags': tags},
+                                    format='json')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        return response
+
+    def test_tags(self):
+        models.Tag(name='bid').save()
+
+        # tags are created in bulk: the same queries however many there are
+        with CaptureQueriesContext(connection) as few:
+            self.post_note('Met at rush', ['bid'])
+        with CaptureQueriesContext(connection) as many:
+            self.post_note('Came to dinner',
+                           ['Bid', ' dinner ', 'legacy', 'athlete', 'bid'])
+        self.assertEquals(len(few), len(many))
+
+        self.assertEquals(
+            sorted(models.Tag.objects.values_list('name', flat=True)),
+            ['athlete', 'bid', 'dinner', 'legacy']
+        )
+        note = models.ContactNote.objects.get(body='Came to dinner')
+        self.assertEquals(note.tags.count(), 4)
+
+    def test_list(self):
+        for i in range(5):
+            self.post_note(f'Note {i}', ['bid'] if i % 2 else [])
+
+        response = self.client.get(self.notes_url() + '?page_size=2')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals([n['body'] for n in response.data['results']],
+                          ['Note 4', 'Note 3'])
+        self.assertEquals(response.data['results'][1]['tags'], ['bid'])
+        self.assertEquals(response.data['results'][1]['contact'],
+                          self.contact.uuid)
+
+        response = self.client.get(response.data['next'])
+        self.assertEquals([n['body'] for n in response.data['results']],
+                          ['Note 2', 'Note 1'])
+
+        response = self.client.get(self.notes_url() + '?tag=BID')
+        self.assertEquals([n['body'] for n in response.data['results']],
+                          ['Note 3', 'Note 1'])
+
+    def test_tag_across_contacts(self):
+        other = self.make_contact2(self.org, self.user)
+        other.save()
+        self.post_note('Wants a bid', ['bid'])
+        self.post_note('Also wants one', ['bid'], contact=other)
+        self.post_note('Not sure', ['maybe'], contact=other)
+
+        # another organization's notes stay out
+        org2 = self.make_org2()
+        org2.save()
+        contact2 = self.make_contact1(org2, self.user)
+        contact2.save()
+        notes.add_note(contact2, self.user, 'Theirs', ['bid'])
+
+        url = f'/api/organizations/{self.org.uuid}/notes/?tag=bid'
+        # authenticating, roles, the page and the tags
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            sorted(n['body'] for n in response.data['results']),
+            ['Also wants one', 'Wants a bid']
+        )
+
+
 class CreateUserTestCase(ApiBaseTestCase):
     def setUp(self):
         self.client = APIClient()
@@ -340,22 +1318,1370 @@ class CreateUserTestCase(ApiBaseTestCase):
                           0)
 
 
-class ExistingUserTestCase(ApiBaseTestCase):
-    def setUp(self):
-        super().setUp()        
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
 
-        self.user = models.User.objects.create_user(
-            first_name='Tim',
-            last_name='Clough',
-            email='tim@example.com',
-            password='hunter2'
+
+class ClaimCheckingEmailBackend(BaseEmailBackend):
+    """Records whether emails are sent outside a transaction, once claimed."""
+    checks = []
+
+    def send_messages(self, email_messages):
+        claimed = models.OutgoingEmail.objects.filter(
+            next_attempt__gt=timezone.now()
+        ).exists()
+        ClaimCheckingEmailBackend.checks.append(
+            (connection.in_atomic_block, claimed)
         )
-        self.user.is_active = True
-        self.user.save()
+        return len(email_messages)
 
-        self.authorize(self.user.email, ApiBaseTestCase.PASS)
 
-    def test_update_password(self):
+class EmailQueueTestCase(ApiBaseTestCase):
+    def signup(self):
+        data = {
+            'first_name': 'Bilbo',
+            'last_name': 'Baggins',
+            'email': 'baggins@shire.com',
+            'password': ApiBaseTestCase.PASS
+        }
+        response = self.client.post('/api/users/', data)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+
+    def test_signup_queues_email(self):
+        self.signup()
+
+        # nothing is sent on the request path
+        self.assertEquals(len(mail.outbox), 0)
+        self.assertEquals(models.OutgoingEmail.objects.count(), 1)
+
+        call_command('send_queued_mail', '--once', stdout=io.StringIO())
+
+        self.assertEquals(len(mail.outbox), 1)
+        self.assertEquals(mail.outbox[0].to, ['baggins@shire.com'])
+        self.assertTrue('/verify?uidb64=' in mail.outbox[0].body)
+        self.assertEquals(
+            models.OutgoingEmail.objects.filter(sent__isnull=True).count(),
+            0
+        )
+
+    def test_failed_email_retried_with_backoff(self):
+        self.signup()
+
+        with override_settings(
+                EMAIL_BACKEND='api.tests.FailingEmailBackend'):
+            call_command('send_queued_mail', '--once', stdout=io.StringIO())
+
+        email = models.OutgoingEmail.objects.get()
+        self.assertIsNone(email.sent)
+        self.assertEquals(email.attempts, 1)
+        self.assertTrue(email.next_attempt > timezone.now())
+        self.assertTrue('closed' in email.last_error)
+
+        # not due yet
+        call_command('send_queued_mail', '--once', stdout=io.StringIO())
+        self.assertEquals(len(mail.outbox), 0)
+
+        email.next_attempt = timezone.now()
+        email.save()
+        call_command('send_queued_mail', '--once', stdout=io.StringIO())
+        self.assertEquals(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND='api.tests.ClaimCheckingEmailBackend')
+    def test_sent_outside_transaction(self):
+        self.signup()
+        ClaimCheckingEmailBackend.checks = []
+
+        call_command('send_queued_mail', '--once', stdout=io.StringIO())
+
+        # no rows are locked while talking to the SMTP server, and the
+        # claim keeps other workers off the email meanwhile
+        self.assertEquals(ClaimCheckingEmailBackend.checks, [(False, True)])
+        self.assertIsNotNone(models.OutgoingEmail.objects.get().sent)
+
+    @override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=1,
+                       EMAIL_BACKEND='api.tests.FailingEmailBackend')
+    def test_max_attempts_setting(self):
+        self.signup()
+        call_command('send_queued_mail', '--once', stdout=io.StringIO())
+
+        email = models.OutgoingEmail.objects.get()
+        email.next_attempt = timezone.now()
+        email.save()
+
+        # given up after the first attempt
+        self.assertEquals(mail_module.send_queued_mail(), (0, 0))
+        self.assertEquals(models.OutgoingEmail.objects.get().attempts, 1)
+
+
+class NotificationFanoutTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.org.admin_users.add(self.user)
+
+    def add_members(self, n):
+        models.User.objects.bulk_create(
+            models.User(email=f'member{i}@example.com',
+                        first_name='Member',
+                        last_name=str(i))
+            for i in range(n)
+        )
+        members = models.User.objects.filter(email__startswith='member')
+        self.org.users.add(*members)
+
+    def test_batches(self):
+        self.add_members(2500)
+        fanout.queue_fanout(self.org, 'Hello', exclude=self.user)
+
+        # batches take a bounded number of queries, however big the chapter
+        # (SQLite inserts 250 rows per statement)
+        for written in [999, 1000, 501]:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEquals(fanout.fan_out(1000), written)
+            self.assertTrue(len(queries) <= 20)
+        self.assertIsNone(fanout.fan_out(1000))
+
+        self.assertEquals(models.Notification.objects.count(), 2500)
+        self.assertFalse(
+            models.Notification.objects.filter(user=self.user).exists()
+        )
+        # the notification lists changed
+        self.assertEquals(
+            models.CollectionVersion.objects.filter(
+                collection='notifications'
+            ).count(),
+            2500
+        )
+
+    def test_resumes(self):
+        self.add_members(3)
+        job = fanout.queue_fanout(self.org, 'Hello')
+        self.assertEquals(fanout.fan_out(2), 2)
+
+        # a worker picking the job up again continues after the last batch
+        job.refresh_from_db()
+        self.assertIsNone(job.done)
+        self.assertEquals(fanout.fan_out(2), 2)
+        job.refresh_from_db()
+        self.assertIsNotNone(job.done)
+        self.assertEquals(models.Notification.objects.count(), 4)
+
+    def test_approval(self):
+        self.add_members(5)
+        applicant = self.make_user2()
+        applicant.save()
+        mr = models.MembershipRequest(organization=self.org, user=applicant)
+        mr.save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+        response = self.client.post(
+            f'/api/organizations/{self.org.uuid}/requests/{mr.uuid}/'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+        # queued, not written on the request path
+        self.assertEquals(models.Notification.objects.count(), 0)
+        call_command('fan_out_notifications', '--once',
+                     stdout=io.StringIO())
+        self.assertEquals(
+            models.Notification.objects.filter(
+                body='Bilbo Baggins joined Organization 1.'
+            ).count(),
+            7
+        )
+
+    def test_task(self):
+        self.add_members(2)
+        models.Task(organization=self.org,
+                    assigner=self.user,
+                    title='Rush week',
+                    body='Set up tables',
+                    due_date=timezone.now()).save()
+
+        call_command('fan_out_notifications', '--once',
+                     stdout=io.StringIO())
+        self.assertEquals(
+            sorted(models.Notification.objects.values_list('user__last_name',
+                                                           'body')),
+            [('0', 'New task: Rush week'), ('1', 'New task: Rush week')]
+        )
+
+
+class NotificationInboxTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.user = self.make_user1()
+        self.user.save()
+        self.other = self.make_user2()
+        self.other.save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def notify(self, user, body='Hello'):
+        notification = models.Notification(user=user,
+                                           created=timezone.now(),
+                                           body=body)
+        notification.save()
+        return notification
+
+    def count(self):
+        response = self.client.get(
+            f'/api/users/{self.user.uuid}/notifications/count/'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response.data['unread']
+
+    def test_count(self):
+        self.assertEquals(self.count(), 0)
+        first = self.notify(self.user)
+        self.notify(self.user)
+        self.notify(self.other)
+        self.assertEquals(self.count(), 2)
+
+        # served from the counter: authenticating and one lookup
+        with self.assertNumQueries(2):
+            self.count()
+
+        first.delete()
+        self.assertEquals(self.count(), 1)
+
+    def test_mark_read(self):
+        notifications = [self.notify(self.user, f'Hello {i}')
+                         for i in range(3)]
+        self.notify(self.other)
+
+        url = f'/api/users/{self.user.uuid}/notifications/read/'
+        response = self.client.post(
+            url,
+            {'notifications': [str(notifications[0].uuid),
+                               str(notifications[1].uuid)]},
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data['marked'], 2)
+        self.assertEquals(response.data['unread'], 1)
+
+        # marking again changes nothing
+        response = self.client.post(
+            url,
+            {'notifications': [str(notifications[0].uuid)]},
+            format='json'
+        )
+        self.assertEquals(response.data['marked'], 0)
+
+        response = self.client.post(url, {}, format='json')
+        self.assertEquals(response.data['marked'], 1)
+        self.assertEquals(self.count(), 0)
+        self.assertEquals(inbox.unread_count(self.other), 1)
+
+        response = self.client.get(
+            f'/api/users/{self.user.uuid}/notifications/'
+        )
+        self.assertTrue(all(n['read'] for n in response.data['results']))
+
+    def test_others_count(self):
+        response = self.client.get(
+            f'/api/users/{self.other.uuid}/notifications/count/'
+        )
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_missing_counter(self):
+        self.notify(self.user)
+        self.notify(self.user)
+        models.NotificationCounter.objects.filter(user=self.user).delete()
+
+        self.assertEquals(self.count(), 2)
+
+    def test_fanout(self):
+        org = self.make_org1()
+        org.save()
+        org.users.add(self.user, self.other)
+        fanout.queue_fanout(org, 'Hello')
+        call_command('fan_out_notifications', '--once',
+                     stdout=io.StringIO())
+
+        self.assertEquals(self.count(), 1)
+        self.assertEquals(inbox.unread_count(self.other), 1)
+
+    def test_concurrent_inserts_and_marks(self):
+        def retry(f):
+            # SQLite may refuse a transaction while another one writes
+            while True:
+                try:
+                    return f()
+                except OperationalError:
+                    time.sleep(0.001)
+
+        def insert():
+            try:
+                for i in range(20):
+                    retry(lambda: self.notify(self.user))
+            finally:
+                connection.close()
+
+        def mark():
+            try:
+                for i in range(10):
+                    retry(lambda: inbox.mark_read(self.user))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=insert) for _ in range(4)]
+        threads += [threading.Thread(target=mark) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(models.Notification.objects.count(), 80)
+        self.assertEquals(
+            inbox.unread_count(self.user),
+            models.Notification.objects.filter(user=self.user,
+                                               read=False).count()
+        )
+
+
+class NotificationRetentionTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.user = self.make_user1()
+        self.user.save()
+        self.other = self.make_user2()
+        self.other.save()
+
+        now = timezone.now()
+        for user in [self.user, self.other]:
+            models.Notification.objects.bulk_create(
+                models.Notification(user=user,
+                                    created=now - timedelta(days=days),
+                                    body=f'{days} days old',
+                                    read=days // 10 % 2 == 0)
+                for days in range(0, 200, 10)
+            )
+        # counted from the notifications above
+        models.NotificationCounter.objects.all().delete()
+
+    def prune(self, *args):
+        out = io.StringIO()
+        call_command('prune_notifications', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        out = self.prune('--days', '90', '--dry-run')
+        self.assertTrue('Would delete 22 notifications of 2 users' in out)
+        self.assertEquals(models.Notification.objects.count(), 40)
+
+    def test_prune(self):
+        before = inbox.unread_count(self.user)
+        out = self.prune('--days', '90', '--chunk-size', '5')
+        self.assertTrue('Deleted 22 notifications of 2 users in 5 chunks'
+                        in out)
+
+        self.assertEquals(models.Notification.objects.count(), 18)
+        self.assertFalse(models.Notification.objects.filter(
+            created__lt=timezone.now() - timedelta(days=90)
+        ).exists())
+
+        # the counters kept up with the unread notifications deleted
+        for user in [self.user, self.other]:
+            self.assertEquals(
+                inbox.unread_count(user),
+                models.Notification.objects.filter(user=user,
+                                                   read=False).count()
+            )
+        self.assertTrue(inbox.unread_count(self.user) < before)
+
+    def test_chunks_bounded(self):
+        notifications = retention.expired(timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            deleted, users = retention.delete_chunk(notifications, 30)
+        self.assertEquals(deleted, 30)
+        self.assertEquals(users, {self.user.pk, self.other.pk})
+        # no per row work
+        self.assertTrue(len(queries) <= 10)
+
+    def test_user_and_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'archive.jsonl')
+            self.prune('--days', '90', '--user', str(self.user.uuid),
+                       '--archive', path)
+
+            with open(path) as archive:
+                archived = [json.loads(line) for line in archive]
+
+        self.assertEquals(len(archived), 11)
+        self.assertTrue(all(n['user'] == str(self.user.uuid)
+                            for n in archived))
+        self.assertEquals(
+            models.Notification.objects.filter(user=self.other).count(),
+            20
+        )
+
+
+class MembershipApprovalTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.org.admin_users.add(self.user)
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def make_requests(self, n):
+        models.User.objects.bulk_create(
+            models.User(email=f'applicant{i}@example.com',
+                        first_name='Applicant',
+                        last_name=str(i))
+            for i in range(n)
+        )
+        applicants = models.User.objects \
+                           .filter(email__startswith='applicant') \
+                           .order_by('pk')
+        requests = [models.MembershipRequest(organization=self.org, user=user)
+                    for user in applicants]
+        models.MembershipRequest.objects.bulk_create(requests)
+        return requests
+
+    def approve(self, mr):
+        return self.client.post(
+            f'/api/organizations/{self.org.uuid}/requests/{mr.uuid}/'
+        )
+
+    def test_approve_idempotent(self):
+        mr, = self.make_requests(1)
+
+        response = self.approve(mr)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.org.users.filter(pk=mr.user_id).exists())
+
+        # a retry succeeds without approving again
+        response = self.approve(mr)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(self.org.users.count(), 2)
+        self.assertEquals(models.NotificationFanout.objects.count(), 1)
+
+        # no longer pending
+        response = self.client.get(
+            f'/api/organizations/{self.org.uuid}/requests/'
+        )
+        self.assertEquals(response.data['results'], [])
+
+        response = self.approve(models.MembershipRequest(uuid=uuid.uuid4()))
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_approve(self):
+        requests = self.make_requests(5)
+        membership.approve_requests(self.org, [requests[0].uuid])
+        unknown = uuid.uuid4()
+
+        uuids = [str(mr.uuid) for mr in requests] + [str(unknown)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'/api/organizations/{self.org.uuid}/requests/approve/',
+                {'requests': uuids},
+                format='json'
+            )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [r['result'] for r in response.data['results']],
+            ['already approved'] + ['approved'] * 4 + ['not found']
+        )
+        self.assertEquals(self.org.users.count(), 6)
+
+        # the same queries however many requests are approved
+        self.assertTrue(len(queries) <= 15)
+
+        # one notification for the batch
+        fanout = models.NotificationFanout.objects.order_by('pk').last()
+        self.assertEquals(
+            fanout.body,
+            'Applicant 1, Applicant 2 and 2 others joined Organization 1.'
+        )
+
+    def test_bulk_approve_admins_only(self):
+        requests = self.make_requests(1)
+        self.org.admin_users.remove(self.user)
+
+        response = self.client.post(
+            f'/api/organizations/{self.org.uuid}/requests/approve/',
+            {'requests': [str(requests[0].uuid)]},
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEquals(self.org.users.count(), 1)
+
+    def test_concurrent_approvals(self):
+        mr, = self.make_requests(1)
+        results = []
+
+        def approve():
+            try:
+                while True:
+                    try:
+                        results.append(
+                            membership.approve_requests(self.org, [mr.uuid])
+                        )
+                        return
+                    except OperationalError:
+                        # SQLite refused the transaction, retry it
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=approve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(
+            sorted(r[mr.uuid] for r in results),
+            ['already approved'] * 3 + ['approved']
+        )
+        self.assertEquals(models.NotificationFanout.objects.count(), 1)
+        self.assertEquals(self.org.users.count(), 2)
+
+
+class MembersBulkTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.org.admin_users.add(self.user)
+
+        models.User.objects.bulk_create(
+            models.User(email=f'pledge{i}@example.com')
+            for i in range(500)
+        )
+        self.pledges = list(models.User.objects
+                                  .filter(email__startswith='pledge'))
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def bulk(self, operations):
+        return self.client.post(
+            f'/api/organizations/{self.org.uuid}/members/bulk/',
+            {'operations': [{'action': action, 'user': str(user)}
+                            for action, user in operations]},
+            format='json'
+        )
+
+    def test_add_and_remove(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk([('add', user.uuid)
+                                  for user in self.pledges])
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(self.org.users.count(), 501)
+        self.assertTrue(all(r['result'] == 'added'
+                            for r in response.data['results']))
+        # bulk operations, not a round trip per member
+        self.assertTrue(len(queries) <= 20)
+
+        # the member list changed
+        response = self.client.get(
+            f'/api/organizations/{self.org.uuid}/members/?page_size=1000'
+        )
+        self.assertEquals(len(response.json()['results']), 501)
+
+        response = self.bulk([('remove', user.uuid)
+                              for user in self.pledges[:300]])
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(self.org.users.count(), 201)
+
+    def test_results(self):
+        a, b, c = self.pledges[:3]
+        self.org.users.add(b)
+        unknown = uuid.uuid4()
+
+        response = self.bulk([
+            ('add', a.uuid),
+            ('promote', a.uuid),
+            ('add', b.uuid),
+            ('promote', c.uuid),
+            ('demote', b.uuid),
+            ('remove', unknown)
+        ])
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [r['result'] for r in response.data['results']],
+            ['added', 'promoted', 'unchanged', 'not a member', 'unchanged',
+             'user not found']
+        )
+        self.assertTrue(self.org.admin_users.filter(pk=a.pk).exists())
+        # roles are current at once
+        self.assertTrue(OrganizationRoles.load(a).is_admin(self.org.uuid))
+
+        response = self.bulk([('remove', a.uuid)])
+        self.assertEquals(response.data['results'][0]['result'], 'removed')
+        self.assertFalse(self.org.admin_users.filter(pk=a.pk).exists())
+
+    def test_last_admin(self):
+        a = self.pledges[0]
+        response = self.bulk([('add', a.uuid), ('demote', self.user.uuid)])
+        self.assertEquals(response.status_code,
+                          status.HTTP_400_BAD_REQUEST)
+
+        # all or nothing
+        self.assertFalse(self.org.users.filter(pk=a.pk).exists())
+        self.assertTrue(self.org.admin_users.filter(pk=self.user.pk)
+                            .exists())
+
+    def test_admins_only(self):
+        self.org.admin_users.remove(self.user)
+        response = self.bulk([('add', self.pledges[0].uuid)])
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ActivityFeedTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.org.admin_users.add(self.user)
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def feed(self, query=''):
+        response = self.client.get(
+            f'/api/organizations/{self.org.uuid}/activity/{query}'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_feed(self):
+        response = self.client.post(
+            f'/api/organizations/{self.org.uuid}/contacts/',
+            {'organization_uuid': str(self.org.uuid), 'first_name': 'Joe',
+             'last_name': 'Schmoe'},
+            format='json'
+        )
+        contact = response.data['uuid']
+        response = self.client.post(
+            f'/api/organizations/{self.org.uuid}/contacts/{contact}/notes/',
+            {'body': 'Came to the cookout', 'tags': []},
+            format='json'
+        )
+        note = response.data['uuid']
+
+        other = self.make_user2()
+        other.save()
+        mr = models.MembershipRequest.objects.create(organization=self.org,
+                                                     user=other)
+        self.client.post(
+            f'/api/organizations/{self.org.uuid}/requests/approve/',
+            {'requests': [str(mr.uuid)]},
+            format='json'
+        )
+
+        task = models.Task.objects.create(organization=self.org,
+                                          assigner=self.user,
+                                          title='Rush flyers',
+                                          body='Print 200',
+                                          due_date=timezone.now())
+        task.assignees.add(self.user, other)
+
+        events = self.feed()['results']
+        self.assertEquals(
+            [(e['kind'], e['subject']) for e in events],
+            [('task_assigned', str(task.uuid)),
+             ('member_joined', str(other.uuid)),
+             ('note_added', str(note)),
+             ('contact_created', str(contact))]
+        )
+        self.assertTrue(all(e['actor'] == str(self.user.uuid)
+                            for e in events))
+        self.assertEquals(events[0]['summary'],
+                          'Tim Clough assigned Rush flyers to Tim Clough '
+                          'and Bilbo Baggins.')
+        self.assertEquals(events[1]['summary'],
+                          'Bilbo Baggins joined Organization 1.')
+
+    def test_bulk_members_joined(self):
+        models.User.objects.bulk_create(
+            models.User(email=f'pledge{i}@example.com')
+            for i in range(3)
+        )
+        response = self.client.post(
+            f'/api/organizations/{self.org.uuid}/members/bulk/',
+            {'operations': [{'action': 'add', 'user': str(user.uuid)}
+                            for user in models.User.objects
+                                              .exclude(pk=self.user.pk)]},
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+        events = self.feed()['results']
+        self.assertEquals([e['kind'] for e in events],
+                          ['member_joined'] * 3)
+
+    def test_pages(self):
+        # events recorded together share their created time
+        models.ActivityEvent.objects.bulk_create(
+            models.ActivityEvent(organization=self.org,
+                                 created=timezone.now(),
+                                 kind='contact_created',
+                                 summary=f'Event {i}')
+            for i in range(250)
+        )
+
+        seen = []
+        query = '?page_size=100'
+        while query is not None:
+            # the user, their roles and the page of events
+            with self.assertNumQueries(3):
+                page = self.feed(query)
+            seen.extend(e['uuid'] for e in page['results'])
+            query = page['next'] and page['next'][page['next'].index('?'):]
+        self.assertEquals(len(seen), 250)
+        self.assertEquals(len(set(seen)), 250)
+
+    def test_members_only(self):
+        other = self.make_org2()
+        other.save()
+        response = self.client.get(
+            f'/api/organizations/{other.uuid}/activity/'
+        )
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TasksTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.org.admin_users.add(self.user)
+        self.member = self.make_user2()
+        self.member.save()
+        self.org.users.add(self.member)
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def tasks_url(self, task=None):
+        url = f'/api/organizations/{self.org.uuid}/tasks/'
+        if task is not None:
+            url += f'{task}/'
+        return url
+
+    def make_task(self, title, days, assignees=(), org=None):
+        task = models.Task.objects.create(
+            organization=org or self.org,
+            assigner=self.user,
+            title=title,
+            body='',
+            due_date=timezone.now() + timedelta(days=days)
+        )
+        task.assignees.add(*assignees)
+        return task
+
+    def test_create(self):
+        due = timezone.now() + timedelta(days=3)
+        response = self.client.post(
+            self.tasks_url(),
+            {'title': 'Rush flyers', 'body': 'Print 200',
+             'due_date': due.isoformat(),
+             'assignees': [str(self.member.uuid)]},
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(self.tasks_url(response.data['uuid']))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data['title'], 'Rush flyers')
+        self.assertEquals(response.data['assigner'], self.user.uuid)
+        self.assertEquals(response.data['assignees'], [self.member.uuid])
+
+    def test_assignees_must_be_members(self):
+        outsider = models.User.objects.create(email='out@example.com')
+        response = self.client.post(
+            self.tasks_url(),
+            {'title': 'Rush flyers', 'body': '',
+             'due_date': timezone.now().isoformat(),
+             'assignees': [str(self.member.uuid), str(outsider.uuid)]},
+            format='json'
+        )
+        self.assertEquals(response.status_code,
+                          status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(models.Task.objects.exists())
+
+    def test_list_by_due_date(self):
+        later = self.make_task('Later', 10)
+        sooner = self.make_task('Sooner', 1)
+        past = self.make_task('Past', -1)
+
+        response = self.client.get(self.tasks_url())
+        self.assertEquals([t['uuid'] for t in response.json()['results']],
+                          [str(past.uuid), str(sooner.uuid),
+                           str(later.uuid)])
+
+        after = timezone.now().isoformat()
+        response = self.client.get(self.tasks_url(),
+                                   {'due_after': after})
+        self.assertEquals([t['uuid'] for t in response.json()['results']],
+                          [str(sooner.uuid), str(later.uuid)])
+
+    def test_update_and_delete(self):
+        task = self.make_task('Rush flyers', 1, [self.user])
+
+        response = self.client.post(
+            self.tasks_url(task.uuid),
+            {'title': 'Rush posters', 'assignees': [str(self.member.uuid)]},
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        task.refresh_from_db()
+        self.assertEquals(task.title, 'Rush posters')
+        self.assertEquals(list(task.assignees.all()), [self.member])
+
+        response = self.client.delete(self.tasks_url(task.uuid))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(models.Task.objects.exists())
+
+        response = self.client.delete(self.tasks_url(task.uuid))
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_members_read_only(self):
+        task = self.make_task('Rush flyers', 1)
+        self.user = self.member
+        self.authorize(self.member.email, ApiBaseTestCase.PASS)
+
+        response = self.client.get(self.tasks_url(task.uuid))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        response = self.client.delete(self.tasks_url(task.uuid))
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_due_across_organizations(self):
+        orgs = [self.org]
+        for i in range(3):
+            org = models.Organization.objects.create(
+                institution='School', organization_name=f'Org {i}',
+                chapter_name='Chapter'
+            )
+            org.users.add(self.user)
+            orgs.append(org)
+
+        due = [self.make_task(f'Task {i}', i + 0.5, [self.user], org=org)
+               for i, org in enumerate(orgs)]
+        self.make_task('Overdue', -1, [self.user])
+        self.make_task('Not mine', 1, [self.member])
+
+        # the user, the tasks and their assignees
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/users/{self.user.uuid}/tasks/',
+                                       {'days': 3})
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals([t['uuid'] for t in response.json()['results']],
+                          [str(task.uuid) for task in due[:3]])
+
+        response = self.client.get(f'/api/users/{self.member.uuid}/tasks/')
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_former_members_unassigned(self):
+        task = self.make_task('Rush flyers', 1, [self.user, self.member])
+        other = models.Organization.objects.create(
+            institution='School', organization_name='Other',
+            chapter_name='Chapter'
+        )
+        other.users.add(self.member)
+        kept = self.make_task('Elsewhere', 1, [self.member], org=other)
+
+        membership.change_members(self.org,
+                                  [('remove', self.member.uuid)])
+
+        # tasks of the organization left are gone from their dashboard
+        self.assertEquals(list(tasks.due_tasks(self.member, 7)), [kept])
+        self.assertEquals(list(task.assignees.all()), [self.user])
+
+        self.member.member_of.clear()
+        self.assertEquals(list(tasks.due_tasks(self.member, 7)), [])
+
+
+class TaskRemindersTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+        self.now = timezone.now()
+
+    def make_task(self, title, hours, assignees):
+        task = models.Task.objects.create(
+            organization=self.org,
+            assigner=self.user,
+            title=title,
+            body='',
+            due_date=self.now + timedelta(hours=hours)
+        )
+        task.assignees.add(*assignees)
+        return task
+
+    def test_thresholds(self):
+        soon = self.make_task('Soon', 48, [self.user])
+        self.make_task('Sudden', 0.5, [self.user])
+        self.make_task('Later', 100, [self.user])
+        self.make_task('Overdue', -1, [self.user])
+
+        self.assertEquals(reminders.send_reminders(), 2)
+        self.assertEquals(
+            sorted(self.user.notification_set.values_list('body', flat=True)),
+            ['Soon is due in 1\xa0day, 23\xa0hours.',
+             'Sudden is due in 29\xa0minutes.']
+        )
+        self.assertEquals(inbox.unread_count(self.user), 2)
+        self.assertEquals(models.OutgoingEmail.objects.count(), 2)
+
+        # nothing is sent twice, including the thresholds Sudden skipped
+        self.assertEquals(reminders.send_reminders(), 0)
+
+        # a day later Soon crosses the next threshold
+        tomorrow = self.now + timedelta(hours=25)
+        self.assertEquals(reminders.remind(24, tomorrow), (1, None))
+        self.assertEquals(reminders.remind(24, tomorrow), (0, None))
+        self.assertEquals(
+            models.TaskReminder.objects.filter(task=soon).count(), 2
+        )
+
+    def test_former_members_not_reminded(self):
+        member = self.make_user2()
+        member.save()
+        self.org.users.add(member)
+        self.make_task('Soon', 2, [self.user, member])
+
+        self.org.users.remove(member)
+
+        self.assertEquals(reminders.send_reminders(), 1)
+        self.assertFalse(member.notification_set.exists())
+        self.assertEquals(models.OutgoingEmail.objects.get().recipients,
+                          self.user.email)
+
+    def test_postponed(self):
+        task = self.make_task('Soon', 2, [self.user])
+        self.assertEquals(reminders.send_reminders(), 1)
+
+        tasks.update_task(task, due_date=task.due_date + timedelta(hours=1))
+        self.assertEquals(reminders.send_reminders(), 1)
+
+    @override_settings(TASK_REMINDER_THRESHOLDS=[1],
+                       TASK_REMINDER_EMAIL=False)
+    def test_settings(self):
+        self.make_task('Soon', 2, [self.user])
+        self.make_task('Sudden', 0.5, [self.user])
+
+        self.assertEquals(reminders.send_reminders(), 1)
+        self.assertEquals(inbox.unread_count(self.user), 1)
+        self.assertFalse(models.OutgoingEmail.objects.exists())
+
+    def test_batches(self):
+        models.User.objects.bulk_create(
+            models.User(email=f'pledge{i}@example.com') for i in range(250)
+        )
+        pledges = list(models.User.objects
+                             .filter(email__startswith='pledge'))
+        for i in range(10):
+            self.make_task(f'Task {i}', 10 + i % 3, pledges)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('send_task_reminders', '--once', '--batch-size',
+                         '1000', stdout=io.StringIO())
+        self.assertEquals(models.Notification.objects.count(), 2500)
+        self.assertEquals(models.OutgoingEmail.objects.count(), 2500)
+        # a few bulk statements per batch, not a round trip per reminder
+        self.assertTrue(len(queries) <= 100, len(queries))
+
+        self.assertEquals(reminders.send_reminders(), 0)
+
+
+class OrganizationImagesTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.media = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings.enable()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.user = self.make_user1()
+        self.user.save()
+        self.org.users.add(self.user)
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media.cleanup()
+
+    def url(self, path=''):
+        return f'/api/organizations/{self.org.uuid}/images/{path}'
+
+    def make_jpeg(self, width=2000, height=1500):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), 'navy').save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+    def start(self, data, filename='rush.jpg'):
+        response = self.client.post(self.url('uploads/'),
+                                    {'filename': filename,
+                                     'size': len(data)},
+                                    format='json')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        return response.data['uuid']
+
+    def put(self, upload, data, start):
+        end = start + len(data) - 1
+        return self.client.generic(
+            'PUT', self.url(f'uploads/{upload}/'), data,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{self.size}'
+        )
+
+    def upload(self, data, chunks=3, filename='rush.jpg'):
+        self.size = len(data)
+        upload = self.start(data, filename)
+        step = -(-len(data) // chunks)
+        for start in range(0, len(data), step):
+            response = self.put(upload, data[start:start + step], start)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        return models.OrganizationImage.objects.get(uuid=response.data['uuid'])
+
+    def test_chunked_upload(self):
+        data = self.make_jpeg()
+        self.size = len(data)
+        upload = self.start(data, '../../rush.jpg')
+
+        response = self.put(upload, data[:1000], 0)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data['received'], 1000)
+
+        # a chunk that doesn't continue the upload
+        response = self.put(upload, data[2000:3000], 2000)
+        self.assertEquals(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEquals(response.data['received'], 1000)
+
+        response = self.client.get(self.url(f'uploads/{upload}/'))
+        self.assertEquals(response.data['received'], 1000)
+
+        response = self.put(upload, data[1000:], 1000)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+
+        image = models.OrganizationImage.objects.get(
+            uuid=response.data['uuid']
+        )
+        self.assertEquals(image.filename, 'rush.jpg')
+        blob = image.blob
+        self.assertEquals((blob.width, blob.height), (2000, 1500))
+        self.assertEquals(blob.sha256, hashlib.sha256(data).hexdigest())
+        with blob.file.open('rb') as f:
+            self.assertEquals(f.read(), data)
+        self.assertFalse(models.ImageUpload.objects.exists())
+
+    def test_upload_gone(self):
+        data = self.make_jpeg()
+        self.size = len(data)
+        upload = models.ImageUpload.objects.get(uuid=self.start(data))
+        stale = models.ImageUpload.objects.get(pk=upload.pk)
+
+        # deleted by another request after this one looked it up
+        self.client.delete(self.url(f'uploads/{upload.uuid}/'))
+        with self.assertRaises(models.ImageUpload.DoesNotExist):
+            images.write_chunk(stale, 0, len(data), io.BytesIO(data))
+
+        # and a chunk that comes after that
+        response = self.put(upload.uuid, data, 0)
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_chunk_read_outside_transaction(self):
+        data = self.make_jpeg()
+        upload = models.ImageUpload.objects.get(uuid=self.start(data))
+        stream = io.BytesIO(data)
+        read = stream.read
+
+        def checked_read(size):
+            self.assertFalse(connection.in_atomic_block)
+            return read(size)
+        stream.read = checked_read
+
+        images.write_chunk(upload, 0, 1000, stream)
+        self.assertEquals(upload.received, 1000)
+
+    def test_chunk_length_mismatch(self):
+        data = self.make_jpeg()
+        self.size = len(data)
+        upload = self.start(data)
+
+        # an empty body
+        response = self.client.generic(
+            'PUT', self.url(f'uploads/{upload}/'), b'',
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-999/{self.size}'
+        )
+        self.assertEquals(response.status_code,
+                          status.HTTP_400_BAD_REQUEST)
+
+        # a body shorter than the range
+        response = self.client.generic(
+            'PUT', self.url(f'uploads/{upload}/'), data[:500],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-999/{self.size}'
+        )
+        self.assertEquals(response.status_code,
+                          status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self.url(f'uploads/{upload}/'))
+        self.assertEquals(response.data['received'], 0)
+
+    def test_failed_image_keeps_no_file(self):
+        data = self.make_jpeg()
+        # can't be saved as an image, as it has no filename
+        upload = models.ImageUpload.objects.create(organization=self.org,
+                                                   created_by=self.user,
+                                                   filename='rush.jpg',
+                                                   size=len(data),
+                                                   received=len(data))
+        upload.filename = None
+        with open(images.part_path(upload), 'wb') as f:
+            f.write(data)
+
+        with self.assertRaises(IntegrityError):
+            images._complete(upload)
+
+        self.assertFalse(models.ImageBlob.objects.exists())
+        stored = [files for _, _, files in os.walk(self.media.name)]
+        self.assertEquals(sum(stored, []), [])
+
+    def test_not_an_image(self):
+        self.size = 100
+        upload = self.start(b'x' * 100)
+        response = self.put(upload, b'x' * 100, 0)
+        self.assertEquals(response.status_code,
+                          status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(models.ImageUpload.objects.exists())
+        self.assertFalse(models.OrganizationImage.objects.exists())
+
+    def test_thumbnails(self):
+        image = self.upload(self.make_jpeg())
+        self.assertEquals(list(image.blob.thumbnails.all()), [])
+
+        call_command('process_images', '--once', stdout=io.StringIO())
+        self.assertEquals(
+            sorted(image.blob.thumbnails.values_list('size', 'format',
+                                                     'width', 'height')),
+            [(320, 'jpeg', 320, 240), (320, 'webp', 320, 240),
+             (1280, 'jpeg', 1280, 960), (1280, 'webp', 1280, 960)]
+        )
+
+        # the images, their thumbnails, the user and their roles
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url())
+        gallery = response.json()['results']
+        self.assertEquals(gallery[0]['uuid'], str(image.uuid))
+        self.assertEquals(gallery[0]['image'], self.url(f'{image.uuid}/'))
+
+        url = next(t['url'] for t in gallery[0]['thumbnails']
+                   if t['size'] == 320 and t['format'] == 'webp')
+        self.assertEquals(url, self.url(f'{image.uuid}/thumbnails/320.webp'))
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response['Content-Type'], 'image/webp')
+        self.assertTrue('immutable' in response['Cache-Control'])
+        body = b''.join(response.streaming_content)
+        self.assertEquals(Image.open(io.BytesIO(body)).size, (320, 240))
+
+    def test_thumbnail_claims(self):
+        image = self.upload(self.make_jpeg(200, 100))
+        blob = image.blob
+
+        # claimed by another worker
+        blob.thumbnailing_until = timezone.now() + timedelta(minutes=1)
+        blob.save()
+        self.assertIsNone(images.make_thumbnails())
+
+        # which died
+        blob.thumbnailing_until = timezone.now() - timedelta(minutes=1)
+        blob.save()
+        self.assertEquals(images.make_thumbnails(), 4)
+        self.assertEquals(blob.thumbnails.count(), 4)
+        self.assertIsNone(images.make_thumbnails())
+
+    def test_thumbnail_claim_lost(self):
+        image = self.upload(self.make_jpeg(200, 100))
+        thumbnails = images._thumbnails
+
+        def slow_thumbnails(blob):
+            made = thumbnails(blob)
+            # another worker took over and finished first
+            models.ImageBlob.objects.filter(pk=blob.pk) \
+                  .update(thumbnailed=timezone.now())
+            return made
+        images._thumbnails = slow_thumbnails
+        try:
+            self.assertEquals(images.make_thumbnails(), 0)
+        finally:
+            images._thumbnails = thumbnails
+
+        self.assertFalse(image.blob.thumbnails.exists())
+        stored = [files for _, _, files in os.walk(self.media.name)]
+        self.assertEquals(len(sum(stored, [])), 1)
+
+    def test_delete(self):
+        image = self.upload(self.make_jpeg(200, 100), chunks=1)
+        call_command('process_images', '--once', stdout=io.StringIO())
+        names = [image.blob.file.name] + \
+            [t.file.name for t in image.blob.thumbnails.all()]
+
+        response = self.client.delete(self.url(f'{image.uuid}/'))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        for name in names:
+            self.assertFalse(os.path.exists(
+                os.path.join(self.media.name, name)
+            ))
+
+    def test_duplicates_share_blob(self):
+        data = self.make_jpeg(200, 100)
+        first = self.upload(data)
+        call_command('process_images', '--once', stdout=io.StringIO())
+
+        # the known content isn't stored or thumbnailed again
+        second = self.upload(data, filename='copy.jpg')
+        self.assertEquals(second.blob, first.blob)
+        self.assertEquals(models.ImageBlob.objects.get().refcount, 2)
+        self.assertEquals(second.blob.thumbnails.count(), 4)
+        blobs = os.path.join(self.media.name, 'images', 'blobs',
+                             first.blob.sha256[:2])
+        self.assertEquals(len(os.listdir(blobs)), 5)
+
+        # the blob goes with the last image using it
+        path = first.blob.file.path
+        self.client.delete(self.url(f'{first.uuid}/'))
+        self.assertEquals(models.ImageBlob.objects.get().refcount, 1)
+        self.assertTrue(os.path.exists(path))
+
+        response = self.client.get(self.url(f'{second.uuid}/'))
+        self.assertEquals(b''.join(response.streaming_content), data)
+        self.assertTrue('copy.jpg' in response['Content-Disposition'])
+
+        self.client.delete(self.url(f'{second.uuid}/'))
+        self.assertFalse(models.ImageBlob.objects.exists())
+        self.assertFalse(models.ImageThumbnail.objects.exists())
+        self.assertEquals(os.listdir(blobs), [])
+
+    def test_organization_deleted(self):
+        data = self.make_jpeg(200, 100)
+        self.upload(data)
+        self.upload(data)
+
+        self.org.delete()
+        self.assertFalse(models.ImageBlob.objects.exists())
+
+    def test_abandoned_uploads(self):
+        data = self.make_jpeg(200, 100)
+        self.size = len(data)
+        upload = self.start(data)
+        self.put(upload, data[:100], 0)
+
+        models.ImageUpload.objects.update(
+            created=timezone.now() - timedelta(days=2)
+        )
+        call_command('process_images', '--once', stdout=io.StringIO())
+        self.assertFalse(models.ImageUpload.objects.exists())
+
+
+class EmailVerificationTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user2()
+        self.user.is_active = False
+        self.user.save()
+
+        self.uidb64 = urlsafe_base64_encode(force_bytes(self.user.uuid))
+        self.token = email_verification_token_generator.make_token(self.user)
+
+    def test_activate_link(self):
+        # in process: look up the user, then a single update
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                f'/verify/?uidb64={self.uidb64}&token={self.token}'
+            )
+        self.assertEquals(response.status_code, status.HTTP_302_FOUND)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+    def test_verify_email(self):
+        data = {
+            'uidb64': self.uidb64,
+            'token': self.token
+        }
+        response = self.client.post('/api/users/email/', data)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data['success'], True)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+    def test_verify_email_bad_token(self):
+        data = {
+            'uidb64': self.uidb64,
+            'token': 'abc-123'
+        }
+        response = self.client.post('/api/users/email/', data)
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+    def test_verify_email_not_a_uuid(self):
+        uidb64 = urlsafe_base64_encode(b'not-a-uuid')
+        response = self.client.get(f'/verify/?uidb64={uidb64}&token=x')
+        self.assertEquals(response.status_code, status.HTTP_302_FOUND)
+
+        response = self.client.post('/api/users/email/',
+                                    {'uidb64': uidb64, 'token': 'x'})
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExistingUserTestCase(ApiBaseTestCase):
+    def setUp(self):
+        super().setUp()        
+
+        self.user = models.User.objects.create_user(
+            first_name='Tim',
+            last_name='Clough',
+            email='tim@example.com',
+            password='hunter2'
+        )
+        self.user.is_active = True
+        self.user.save()
+
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+    def test_update_password(self):
         uuid = self.user.uuid
 
         data = {
@@ -375,3 +2701,213 @@ class ExistingUserTestCase(ApiBaseTestCase):
         user = models.User.objects.get(email='tim@example.com')
 
         self.assertTrue(check_password('hunter3', user.password))
+
+    def test_get_user_fields(self):
+        response = self.client.get(
+            f'/api/users/{self.user.uuid}/?fields=uuid,email'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data, {'uuid': str(self.user.uuid),
+                                          'email': self.user.email})
+
+
+class OrganizationRolesTestCase(ApiBaseTestCase):
+    class FakeRequest:
+        def __init__(self, user):
+            self.user = user
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+        self.user = self.make_user1()
+        self.user.save()
+
+        self.org = self.make_org1()
+        self.org.save()
+        self.org.users.add(self.user)
+
+        self.org2 = self.make_org2()
+        self.org2.save()
+        self.org2.users.add(self.user)
+        self.org2.admin_users.add(self.user)
+
+    def test_roles_single_query(self):
+        request = OrganizationRolesTestCase.FakeRequest(self.user)
+        with self.assertNumQueries(1):
+            roles = get_organization_roles(request)
+            self.assertTrue(roles.is_member(self.org.uuid))
+            self.assertFalse(roles.is_admin(self.org.uuid))
+            self.assertTrue(roles.is_member(str(self.org2.uuid)))
+            self.assertTrue(roles.is_admin(self.org2.uuid))
+
+            # resolved once per request
+            get_organization_roles(request)
+
+    def test_permission_check_single_query(self):
+        self.authorize(self.user.email, ApiBaseTestCase.PASS)
+
+        # user lookup, role lookup, collection version and contacts
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                f'/api/organizations/{self.org.uuid}/contacts/'
+            )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(ORGANIZATION_ROLE_CACHE_TIMEOUT=60)
+    def test_cached_roles_invalidated(self):
+        roles = get_organization_roles(
+            OrganizationRolesTestCase.FakeRequest(self.user)
+        )
+        self.assertFalse(roles.is_admin(self.org.uuid))
+
+        with self.assertNumQueries(0):
+            get_organization_roles(
+                OrganizationRolesTestCase.FakeRequest(self.user)
+            )
+
+        self.org.admin_users.add(self.user)
+        roles = get_organization_roles(
+            OrganizationRolesTestCase.FakeRequest(self.user)
+        )
+        self.assertTrue(roles.is_admin(self.org.uuid))
+
+        self.user.member_of.clear()
+        roles = get_organization_roles(
+            OrganizationRolesTestCase.FakeRequest(self.user)
+        )
+        self.assertFalse(roles.is_member(self.org.uuid))
+        self.assertFalse(roles.is_member(self.org2.uuid))
+
+    @override_settings(ORGANIZATION_ROLE_CACHE_TIMEOUT=60)
+    def test_cached_roles_invalidated_on_commit(self):
+        key = CACHE_KEY.format(self.user.pk)
+        with transaction.atomic():
+            self.org2.admin_users.remove(self.user)
+            # a request before the commit caches the admin rights again
+            cache.set(key, OrganizationRoles([self.org2.uuid],
+                                             [self.org2.uuid]))
+
+        roles = get_organization_roles(
+            OrganizationRolesTestCase.FakeRequest(self.user)
+        )
+        self.assertFalse(roles.is_admin(self.org2.uuid))
+
+
+class UuidIndexTestCase(ApiBaseTestCase):
+    def assert_uses_index(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            self.assertTrue('USING INDEX' in plan or
+                            'USING COVERING INDEX' in plan, plan)
+        elif connection.vendor == 'postgresql':
+            self.assertTrue('Index' in plan, plan)
+
+    def test_uuid_lookups_use_index(self):
+        lookup = uuid.uuid4()
+        for model in [models.Contact, models.ContactRank,
+                      models.ContactMethod, models.ContactNote, models.Tag,
+                      models.User, models.Notification, models.Organization,
+                      models.MembershipRequest, models.Task,
+                      models.OrganizationImage]:
+            self.assert_uses_index(model.objects.filter(uuid=lookup))
+
+    def test_tag_lookups_use_index(self):
+        org = self.make_org1()
+        org.save()
+        notes = models.ContactNote.objects.filter(
+            contact__organization=org,
+            tags__name='bid'
+        )
+        self.assert_uses_index(notes)
+
+        if connection.vendor == 'sqlite':
+            index = models.ContactNoteTag._meta.indexes[0].name
+            self.assertTrue(index in notes.explain())
+
+    def test_activity_feed_uses_index(self):
+        org = self.make_org1()
+        org.save()
+        events = models.ActivityEvent.objects \
+                       .filter(organization=org) \
+                       .order_by('-created', '-pk')
+        self.assert_uses_index(events)
+
+        if connection.vendor == 'sqlite':
+            plan = events.explain()
+            index = models.ActivityEvent._meta.indexes[0].name
+            self.assertTrue(index in plan, plan)
+            # read in index order, not sorted afterwards
+            self.assertFalse('TEMP B-TREE' in plan, plan)
+
+    def test_task_lookups_use_index(self):
+        org = self.make_org1()
+        org.save()
+        user = self.make_user1()
+        user.save()
+        now = timezone.now()
+
+        due = models.Task.objects \
+                    .filter(organization=org, due_date__gte=now) \
+                    .order_by('due_date', 'pk')
+        self.assert_uses_index(due)
+        mine = tasks.due_tasks(user, 7).order_by('due_date', 'pk')
+        self.assert_uses_index(mine)
+
+        if connection.vendor == 'sqlite':
+            plan = due.explain()
+            index = models.Task._meta.indexes[1].name
+            self.assertTrue(index in plan, plan)
+            self.assertFalse('TEMP B-TREE' in plan, plan)
+
+            index = models.TaskAssignee._meta.indexes[0].name
+            self.assertTrue(index in mine.explain())
+
+    def test_reminder_lookups_use_index(self):
+        plan = reminders.due(24, timezone.now()).explain()
+        if connection.vendor == 'sqlite':
+            index = models.Task._meta.indexes[2].name
+            self.assertTrue(index in plan, plan)
+
+    def test_organization_lookups_use_index(self):
+        org = self.make_org1()
+        org.save()
+        self.assert_uses_index(
+            org.contact_set.filter(uuid=uuid.uuid4())
+        )
+        self.assert_uses_index(
+            org.membershiprequest_set.filter(uuid=uuid.uuid4())
+        )
+
+
+class ConnectionHealthCheckTestCase(TestCase):
+    class StubConnection:
+        def __init__(self, usable, health_checks=True):
+            self.connection = object()
+            self.in_atomic_block = False
+            self.settings_dict = {'CONN_HEALTH_CHECKS': health_checks}
+            self.usable = usable
+            self.closed = False
+
+        def is_usable(self):
+            return self.usable
+
+        def close(self):
+            self.closed = True
+
+    def test_unusable_closed(self):
+        stub = ConnectionHealthCheckTestCase.StubConnection(usable=False)
+        close_if_unusable(stub)
+        self.assertTrue(stub.closed)
+
+    def test_usable_kept(self):
+        stub = ConnectionHealthCheckTestCase.StubConnection(usable=True)
+        close_if_unusable(stub)
+        self.assertFalse(stub.closed)
+
+    def test_only_when_configured(self):
+        stub = ConnectionHealthCheckTestCase.StubConnection(
+            usable=False, health_checks=False
+        )
+        close_if_unusable(stub)
+        self.assertFalse(stub.closed)
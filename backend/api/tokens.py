@@ -1,6 +1,11 @@
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.exceptions import ValidationError
+from django.utils.encoding import force_text
+from django.utils.http import urlsafe_base64_decode
 import six
 
+import api.models as models
+
 
 class EmailVerificationTokenGenerator(PasswordResetTokenGenerator):
     def _make_hash_value(self, user, timestamp):
@@ -8,3 +13,23 @@ class EmailVerificationTokenGenerator(PasswordResetTokenGenerator):
 
 
 email_verification_token_generator = EmailVerificationTokenGenerator()
+
+
+def verify_email(uidb64, token):
+    """
+    Activate the account a verification link was sent for. Returns whether
+    the link was valid.
+    """
+    try:
+        uuid = force_text(urlsafe_base64_decode(uidb64))
+        user = models.User.objects.get(uuid=uuid)
+    except (TypeError, ValueError, OverflowError, ValidationError,
+            models.User.DoesNotExist):
+        return False
+
+    if not email_verification_token_generator.check_token(user, token):
+        return False
+
+    if not user.is_active:
+        models.User.objects.filter(pk=user.pk).update(is_active=True)
+    return True
@@ -15,30 +15,70 @@ urlpatterns = [
          TokenRefreshView.as_view(), name='token_refresh'),
     path('organizations/<uuid:orgId>/contacts/',
          views.ContactsView.as_view(), name='contacts'),
+    path('organizations/<uuid:orgId>/contacts/bulk/',
+         views.ContactsBulkView.as_view(), name='contacts_bulk'),
+    path('organizations/<uuid:orgId>/contacts/export/',
+         views.ContactsExportView.as_view(), name='contacts_export'),
+    path('organizations/<uuid:orgId>/contacts/search/',
+         views.ContactsSearchView.as_view(), name='contacts_search'),
     path('organizations/<uuid:orgId>/contacts/<uuid:contactId>/',
          views.ContactView.as_view(), name='contact'),
     path('organizations/<uuid:orgId>/contacts/<uuid:contactId>/notes/',
-         views.ContactNoteView.as_view(), name='contact_notes'),
+         views.ContactNotesView.as_view(), name='contact_notes'),
+    path('organizations/<uuid:orgId>/contacts/<uuid:contactId>/notes/'
+         '<uuid:noteId>/',
+         views.ContactNoteView.as_view(), name='contact_note'),
+    path('organizations/<uuid:orgId>/notes/',
+         views.NotesView.as_view(), name='notes'),
     path('organizations/<uuid:orgId>/members/',
          views.MembersView.as_view(), name='members'),
+    path('organizations/<uuid:orgId>/members/bulk/',
+         views.MembersBulkView.as_view(), name='members_bulk'),
     path('organizations/<uuid:orgId>/members/<uuid:memberId>/',
          views.MemberView.as_view(), name='member'),
+    path('organizations/<uuid:orgId>/activity/',
+         views.ActivityView.as_view(), name='activity'),
     path('organizations/<uuid:orgId>/ranks/',
          views.RanksView.as_view(), name='ranks'),
     path('organizations/<uuid:orgId>/ranks/<uuid:rankId>/',
-         views.RanksView.as_view(), name='rank'),
+         views.RankView.as_view(), name='rank'),
     path('organizations/<uuid:orgId>/requests/',
          views.RequestsView.as_view(), name='requests'),
+    path('organizations/<uuid:orgId>/requests/approve/',
+         views.RequestsApprovalView.as_view(), name='requests_approve'),
     path('organizations/<uuid:orgId>/requests/<uuid:requestId>/',
          views.RequestView.as_view(), name='request'),
+    path('organizations/<uuid:orgId>/tasks/',
+         views.TasksView.as_view(), name='tasks'),
+    path('organizations/<uuid:orgId>/tasks/<uuid:taskId>/',
+         views.TaskView.as_view(), name='task'),
+    path('organizations/<uuid:orgId>/images/',
+         views.ImagesView.as_view(), name='images'),
+    path('organizations/<uuid:orgId>/images/uploads/',
+         views.ImageUploadsView.as_view(), name='image_uploads'),
+    path('organizations/<uuid:orgId>/images/uploads/<uuid:uploadId>/',
+         views.ImageUploadView.as_view(), name='image_upload'),
+    path('organizations/<uuid:orgId>/images/<uuid:imageId>/',
+         views.ImageView.as_view(), name='image'),
+    path('organizations/<uuid:orgId>/images/<uuid:imageId>/thumbnails/'
+         '<int:size>.<str:image_format>',
+         views.ImageThumbnailView.as_view(), name='image_thumbnail'),
     path('users/',
          views.UsersView.as_view(), name='users'),
     path('users/email/',
          views.EmailVerificationView.as_view(), name='user_emails'),
     path('users/<uuid:userId>/',
          views.UserView.as_view(), name='user'),
+    path('users/<uuid:userId>/tasks/',
+         views.UserTasksView.as_view(), name='user_tasks'),
     path('users/<uuid:userId>/notifications/',
          views.NotificationsView.as_view(), name='notifications'),
+    path('users/<uuid:userId>/notifications/read/',
+         views.NotificationsReadView.as_view(), name='notifications_read'),
+    path('users/<uuid:userId>/notifications/count/',
+         views.NotificationsCountView.as_view(), name='notifications_count'),
     path('users/<uuid:userId>/notifications/<uuid:notificationId>/',
-         views.NotificationView.as_view(), name='notification')
+         views.NotificationView.as_view(), name='notification'),
+    path('stats/cache/',
+         views.CacheStatsView.as_view(), name='cache_stats')
 ]
@@ -0,0 +1,90 @@
+"""
+Conditional GET support. Collections served by list endpoints have a
+CollectionVersion, bumped by signal receivers whenever the collection
+changes (see api.signals). Responses carry an ETag and Last-Modified derived
+from the version, and requests whose If-None-Match/If-Modified-Since still
+match get a 304 without touching the collection itself.
+"""
+from hashlib import sha1
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+import api.models as models
+
+# collections, owned by an organization...
+CONTACTS = 'contacts'
+MEMBERS = 'members'
+RANKS = 'ranks'
+# ...or a user
+NOTIFICATIONS = 'notifications'
+
+
+def bump(collection, owners):
+    """Mark the collections of the owners with the given uuids as changed."""
+    owners = set(owners)
+    if not owners:
+        return
+
+    now = timezone.now()
+    versions = models.CollectionVersion.objects \
+                     .filter(collection=collection, owner__in=owners)
+    updated = versions.update(version=F('version') + 1, modified=now)
+
+    if updated < len(owners):
+        missing = owners - set(versions.values_list('owner', flat=True))
+        models.CollectionVersion.objects.bulk_create(
+            [models.CollectionVersion(collection=collection,
+                                      owner=owner,
+                                      modified=now)
+             for owner in missing],
+            ignore_conflicts=True
+        )
+
+
+def current(collection, owner):
+    """
+    Get the version of the collection of the owner with the given uuid. A
+    collection that hasn't changed since versions were introduced is at
+    version 0, with an unknown modification time.
+    """
+    try:
+        return models.CollectionVersion.objects.get(collection=collection,
+                                                    owner=owner)
+    except models.CollectionVersion.DoesNotExist:
+        return models.CollectionVersion(collection=collection,
+                                        owner=owner,
+                                        version=0)
+
+
+def _etag(request, version):
+    # a page of a collection depends on the query string too
+    key = f'{version.collection}:{version.owner}:{version.version}:' \
+          f'{request.get_full_path()}'
+    return f'"{sha1(key.encode()).hexdigest()}"'
+
+
+def not_modified(request, version):
+    """
+    Get a 304 (or 412) response if the client's copy is current, or None if
+    the view has to respond in full.
+    """
+    last_modified = None
+    if version.modified is not None:
+        last_modified = int(version.modified.timestamp())
+
+    return get_conditional_response(
+        request,
+        etag=_etag(request, version),
+        last_modified=last_modified
+    )
+
+
+def add_validators(request, response, version):
+    """Set the ETag and Last-Modified headers of a full response."""
+    response['ETag'] = _etag(request, version)
+    if version.modified is not None:
+        response['Last-Modified'] = http_date(version.modified.timestamp())
+    return response
@@ -2,22 +2,41 @@
 REST API for GreekGeeks. Refer to the OpenAPI spec for details about request
 and response bodies.
 """
+import re
+
+from django.db import transaction
 from django.db.utils import IntegrityError
-from django.core.mail import send_mail
+from django.http import StreamingHttpResponse
 from rest_framework import authentication, status
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import (
+    AllowAny,
+    IsAdminUser,
+    IsAuthenticated
+)
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 import api.models as models
 import api.serializers as serializers
 import api.permissions as permissions
-from api.tokens import email_verification_token_generator
-from django.utils.encoding import force_bytes, force_text
-from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+import api.imports as imports
+import api.exports as exports
+import api.search as search
+import api.activity as activity
+import api.versions as versions
+import api.cache as cache
+from api.pagination import ActivityPagination, TaskPagination, paginate
+from api.inbox import mark_read, unread_count
+import api.membership as membership
+import api.images as images
+import api.tasks as tasks
+from api.mail import queue_mail
+from api.notes import add_note, normalize_tag
+from api.tokens import email_verification_token_generator, verify_email
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 # TODO input validation
 # TODO database failure responses (e.g. actually handle instead of 500'ing)
-# TODO notifications
 
 
 class ContactsView(APIView):
@@ -31,12 +50,28 @@ class ContactsView(APIView):
         obj = {'orgId': orgId}
         self.check_object_permissions(request, obj)
 
+        fieldset = serializers.FieldsetSerializer(
+            data=request.query_params,
+            context={'serializer': serializers.ContactSerializer}
+        )
+        if not fieldset.is_valid():
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        version = versions.current(versions.CONTACTS, orgId)
+        response = versions.not_modified(request, version)
+        if response is not None:
+            return response
+
         # get the contacts and serialize
-        contacts = models.Organization.objects.get(uuid=orgId) \
-                         .contact_set.all()
-        contacts = serializers.ContactSerializer(contacts, many=True)
+        contacts = models.Contact.objects.filter(organization__uuid=orgId)
+        contacts = serializers.ContactSerializer \
+                              .setup_eager_loading(contacts,
+                                                   **fieldset.validated_data)
 
-        return Response(contacts.data, status.HTTP_200_OK)
+        response = paginate(self, request, contacts,
+                            serializers.ContactSerializer,
+                            **fieldset.validated_data)
+        return versions.add_validators(request, response, version)
 
     def post(self, request, orgId):
         obj = {'orgId': orgId}
@@ -72,7 +107,9 @@ class ContactsView(APIView):
 
                 contact.rank = rank
 
-            contact.save()
+            with transaction.atomic():
+                contact.save()
+                activity.contact_created(contact, request.user)
 
             response = {
                 'success': True,
@@ -83,6 +120,111 @@ class ContactsView(APIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+class ContactsBulkView(APIView):
+    """
+    /organizations/{orgId}/contacts/bulk/
+    """
+    permission_classes = [permissions.IsOrganizationMember]
+    allowed_methods = ['POST']
+
+    def post(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        org = models.Organization.objects.get(uuid=orgId)
+        try:
+            created, error_count, errors = imports.import_contacts(
+                org,
+                request.user,
+                imports.read_rows(upload)
+            )
+        except imports.UnreadableFile as e:
+            response = {
+                'success': False,
+                'errorMessage': f'The file could not be read: {e}',
+                'created': e.created,
+                'errorCount': e.error_count,
+                'errors': e.errors
+            }
+            return Response(response, status.HTTP_400_BAD_REQUEST)
+
+        response = {
+            'success': error_count == 0,
+            'created': created,
+            'errorCount': error_count,
+            'errors': errors
+        }
+        return Response(response, status.HTTP_201_CREATED)
+
+
+class ContactsExportView(APIView):
+    """
+    /organizations/{orgId}/contacts/export/
+    """
+    permission_classes = [permissions.IsOrganizationMember]
+    allowed_methods = ['GET']
+
+    def get(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        # ?format= is taken by DRF's renderer selection
+        filetype = request.query_params.get('type', 'csv')
+        if filetype not in exports.EXPORTS:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        export, content_type = exports.EXPORTS[filetype]
+
+        org = models.Organization.objects.get(uuid=orgId)
+        response = StreamingHttpResponse(export(org),
+                                         content_type=content_type)
+        filename = f'contacts_{org.uuid}.{filetype}'
+        response['Content-Disposition'] = \
+            f'attachment; filename="{filename}"'
+        return response
+
+
+class ContactsSearchView(APIView):
+    """
+    /organizations/{orgId}/contacts/search/
+    """
+    permission_classes = [permissions.IsOrganizationMember]
+    allowed_methods = ['GET']
+
+    def get(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        data = serializers.ContactSearchSerializer(data=request.query_params)
+        fieldset = serializers.FieldsetSerializer(
+            data=request.query_params,
+            context={'serializer': serializers.ContactSerializer}
+        )
+        if data.is_valid() and fieldset.is_valid():
+            org = models.Organization.objects.get(uuid=orgId)
+            pks = search.search_contacts(org,
+                                         data.validated_data['q'],
+                                         data.validated_data['limit'])
+
+            # keep the search's ranking
+            contacts = models.Contact.objects.filter(pk__in=pks)
+            contacts = serializers.ContactSerializer \
+                                  .setup_eager_loading(
+                                      contacts, **fieldset.validated_data
+                                  )
+            contacts = sorted(contacts, key=lambda c: pks.index(c.pk))
+            contacts = serializers.ContactSerializer(
+                contacts, many=True, **fieldset.validated_data
+            )
+
+            return Response(contacts.data, status.HTTP_200_OK)
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
 class ContactView(APIView):
     """
     /organizations/{orgId}/contacts/{contactId}/
@@ -94,10 +236,21 @@ class ContactView(APIView):
         obj = {'orgId': orgId}
         self.check_object_permissions(request, obj)
 
+        fieldset = serializers.FieldsetSerializer(
+            data=request.query_params,
+            context={'serializer': serializers.ContactSerializer}
+        )
+        if not fieldset.is_valid():
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
         # get the contact and serialize
-        contact = models.Organization.objects.get(uuid=orgId) \
-                        .contact_set.get(uuid=contactId)
-        contact = serializers.ContactSerializer(contact)
+        contact = models.Contact.objects.filter(organization__uuid=orgId)
+        contact = serializers.ContactSerializer \
+                             .setup_eager_loading(contact,
+                                                  **fieldset.validated_data) \
+                             .get(uuid=contactId)
+        contact = serializers.ContactSerializer(contact,
+                                                **fieldset.validated_data)
 
         return Response(contact.data, status.HTTP_200_OK)
 
@@ -148,12 +301,52 @@ class ContactView(APIView):
         return Response(response, status.HTTP_200_OK)
 
 
+def list_notes(view, request, notes):
+    """Respond with a page of notes, optionally only those with ?tag=."""
+    data = serializers.ContactNoteFilterSerializer(data=request.query_params)
+    if data.is_valid():
+        if 'tag' in data.validated_data:
+            tag = normalize_tag(data.validated_data['tag'])
+            notes = notes.filter(tags__name=tag)
+        notes = serializers.ContactNoteSerializer.setup_eager_loading(notes)
+
+        return paginate(view, request, notes,
+                        serializers.ContactNoteSerializer)
+    else:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+class NotesView(APIView):
+    """
+    /organizations/{orgId}/notes/
+    """
+    permission_classes = [permissions.IsOrganizationMember]
+    allowed_methods = ['GET']
+
+    def get(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        notes = models.ContactNote.objects \
+                      .filter(contact__organization__uuid=orgId)
+        return list_notes(self, request, notes)
+
+
 class ContactNotesView(APIView):
     """
     /organizations/{orgId}/contacts/{contactId}/notes/
     """
     permission_classes = [permissions.IsOrganizationMember]
-    allowed_methods = ['POST']
+    allowed_methods = ['GET', 'POST']
+
+    def get(self, request, orgId, contactId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        notes = models.ContactNote.objects \
+                      .filter(contact__organization__uuid=orgId,
+                              contact__uuid=contactId)
+        return list_notes(self, request, notes)
 
     def post(self, request, orgId, contactId):
         obj = {'orgId': orgId}
@@ -162,19 +355,18 @@ class ContactNotesView(APIView):
         data = serializers.ContactNoteAdditionSerializer(data=request.data)
         if data.is_valid():
             # get contact, and create a note corresponding to it
-            contact = models.Organization.get(uuid=orgId) \
-                        .contacts_set.get(uuid=contactId)
-            body = data.data['body']
-            # TODO tag support
-            note = models.ContactNote(
-                contact=contact,
-                created_by=request.user,
-                body=body
-            )
-            note.save()
+            contact = models.Organization.objects.get(uuid=orgId) \
+                        .contact_set.get(uuid=contactId)
+            with transaction.atomic():
+                note = add_note(contact,
+                                request.user,
+                                data.validated_data['body'],
+                                data.validated_data['tags'])
+                activity.note_added(note, request.user)
 
             response = {
-                'success': True
+                'success': True,
+                'uuid': note.uuid
             }
             return Response(response, status.HTTP_201_CREATED)
         else:
@@ -214,12 +406,56 @@ class MembersView(APIView):
         obj = {'orgId': orgId}
         self.check_object_permissions(request, obj)
 
-        org = models.Organization.objects.get(uuid=orgId)
+        version = versions.current(versions.MEMBERS, orgId)
+        response = versions.not_modified(request, version)
+        if response is not None:
+            return response
+
+        def build():
+            users = models.User.objects.filter(member_of__uuid=orgId)
+            return paginate(self, request, users,
+                            serializers.MemberSerializer).data
+
+        response = cache.cached_response(request, version, build)
+        return versions.add_validators(request, response, version)
+
+
+class MembersBulkView(APIView):
+    """
+    /organizations/{orgId}/members/bulk/
+    """
+    permission_classes = [permissions.IsOrganizationAdmin]
+    allowed_methods = ['POST']
 
-        users = org.users.all()
+    def post(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
 
-        users = serializers.MemberSerializer(users, many=True)
-        return Response(users.data, status.HTTP_200_OK)
+        data = serializers.MembersBulkSerializer(data=request.data)
+        if data.is_valid():
+            org = models.Organization.objects.get(uuid=orgId)
+            operations = [(op['action'], op['user'])
+                          for op in data.validated_data['operations']]
+            try:
+                results = membership.change_members(org, operations,
+                                                    by=request.user)
+            except membership.NoAdminsLeft:
+                response = {
+                    'success': False,
+                    'errorMessage': 'The organization would have no admins'
+                }
+                return Response(response, status.HTTP_400_BAD_REQUEST)
+
+            response = {
+                'success': True,
+                'results': [
+                    {'action': action, 'user': user, 'result': result}
+                    for (action, user), result in zip(operations, results)
+                ]
+            }
+            return Response(response, status.HTTP_200_OK)
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
 class MemberView(APIView):
@@ -254,6 +490,27 @@ class MemberView(APIView):
         return Response(response, status.HTTP_200_OK)
 
 
+class ActivityView(APIView):
+    """
+    /organizations/{orgId}/activity/
+    """
+    permission_classes = [permissions.IsOrganizationMember]
+    allowed_methods = ['GET']
+
+    def get(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        events = models.ActivityEvent.objects \
+                       .filter(organization__uuid=orgId)
+        events = serializers.ActivityEventSerializer \
+                            .setup_eager_loading(events)
+
+        return paginate(self, request, events,
+                        serializers.ActivityEventSerializer,
+                        ActivityPagination)
+
+
 class RanksView(APIView):
     """
     /organizations/{orgId}/ranks/
@@ -265,12 +522,18 @@ class RanksView(APIView):
         obj = {'orgId': orgId, 'userId': None}
         self.check_object_permissions(request, obj)
 
-        ranks = models.Organization.objects.get(uuid=orgId) \
-                      .contactrank_set.all()
+        version = versions.current(versions.RANKS, orgId)
+        response = versions.not_modified(request, version)
+        if response is not None:
+            return response
 
-        ranks = serializers.RankSerializer(data=ranks, many=True)
+        def build():
+            ranks = models.ContactRank.objects \
+                          .filter(organization__uuid=orgId)
+            return serializers.RankSerializer(ranks, many=True).data
 
-        return Response(ranks.data, status.HTTP_200_OK)
+        response = cache.cached_response(request, version, build)
+        return versions.add_validators(request, response, version)
 
     def post(self, request, orgId):
         obj = {'orgId': orgId, 'userId': None}
@@ -338,11 +601,11 @@ class RequestsView(APIView):
         obj = {'orgId': orgId, 'userId': None}
         self.check_object_permissions(request, obj)
 
-        org = models.Organization.objects.get(uuid=orgId)
-        reqs = org.membershiprequest_set.all()
-        reqs = serializers.MembershipRequestSerializer(reqs, many=True)
+        reqs = models.MembershipRequest.objects \
+                     .filter(organization__uuid=orgId, approved__isnull=True)
 
-        return Response(reqs.data, status.HTTP_200_OK)
+        return paginate(self, request, reqs,
+                        serializers.MembershipRequestSerializer)
 
     def post(self, request, orgId):
         data = serializers.MembershipRequestAdditionSerializer(
@@ -373,6 +636,36 @@ class RequestsView(APIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+class RequestsApprovalView(APIView):
+    """
+    /organizations/{orgId}/requests/approve/
+    """
+    permission_classes = [permissions.IsOrganizationAdmin]
+    allowed_methods = ['POST']
+
+    def post(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        data = serializers.MembershipRequestApprovalSerializer(
+            data=request.data
+        )
+        if data.is_valid():
+            org = models.Organization.objects.get(uuid=orgId)
+            uuids = data.validated_data['requests']
+            results = membership.approve_requests(org, uuids,
+                                                  by=request.user)
+
+            response = {
+                'success': True,
+                'results': [{'uuid': uuid, 'result': results[uuid]}
+                            for uuid in uuids]
+            }
+            return Response(response, status.HTTP_200_OK)
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
 class RequestView(APIView):
     """
     /organizations/{orgId}/requests/{requestId}/
@@ -395,16 +688,10 @@ class RequestView(APIView):
         self.check_object_permissions(request, obj)
 
         org = models.Organization.objects.get(uuid=orgId)
-        mr = org.membershiprequest_set.get(uuid=requestId)
-
-        user = mr.user
-
-        # TODO should probably be executed as transaction or something
-        # add user
-        org.users.add(user)
-
-        # delete request
-        org.membershiprequest_set.remove(mr)
+        result = membership.approve_requests(org, [requestId],
+                                             by=request.user)[requestId]
+        if result == membership.NOT_FOUND:
+            return Response(status=status.HTTP_404_NOT_FOUND)
 
         response = {
             'success': True
@@ -427,6 +714,334 @@ class RequestView(APIView):
         return Response(response, status.HTTP_200_OK)
 
 
+class TasksView(APIView):
+    """
+    /organizations/{orgId}/tasks/
+    """
+    permission_classes = [permissions.IsOrganizationAdminOrReadOnly]
+    allowed_methods = ['GET', 'POST']
+
+    def get(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        data = serializers.TaskFilterSerializer(data=request.query_params)
+        if data.is_valid():
+            task_set = models.Task.objects.filter(organization__uuid=orgId)
+            if 'due_after' in data.validated_data:
+                task_set = task_set.filter(
+                    due_date__gte=data.validated_data['due_after']
+                )
+            if 'due_before' in data.validated_data:
+                task_set = task_set.filter(
+                    due_date__lt=data.validated_data['due_before']
+                )
+            task_set = serializers.TaskSerializer \
+                                  .setup_eager_loading(task_set)
+
+            return paginate(self, request, task_set,
+                            serializers.TaskSerializer, TaskPagination)
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    def post(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        data = serializers.TaskAdditionSerializer(data=request.data)
+        if data.is_valid():
+            org = models.Organization.objects.get(uuid=orgId)
+            try:
+                task = tasks.create_task(org, request.user,
+                                         **data.validated_data)
+            except tasks.NotAMember:
+                response = {
+                    'success': False,
+                    'errorMessage': 'Assignees must be members'
+                }
+                return Response(response, status.HTTP_400_BAD_REQUEST)
+
+            response = {
+                'success': True,
+                'uuid': task.uuid
+            }
+            return Response(response, status.HTTP_201_CREATED)
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+class TaskView(APIView):
+    """
+    /organizations/{orgId}/tasks/{taskId}/
+    """
+    permission_classes = [permissions.IsOrganizationAdminOrReadOnly]
+    allowed_methods = ['GET', 'POST', 'DELETE']
+
+    def get(self, request, orgId, taskId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        task_set = models.Task.objects.filter(organization__uuid=orgId,
+                                              uuid=taskId)
+        task = serializers.TaskSerializer \
+                          .setup_eager_loading(task_set).first()
+        if task is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        task = serializers.TaskSerializer(task)
+        return Response(task.data, status.HTTP_200_OK)
+
+    def post(self, request, orgId, taskId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        data = serializers.TaskUpdateSerializer(data=request.data)
+        if data.is_valid():
+            task = models.Task.objects \
+                         .select_related('organization') \
+                         .filter(organization__uuid=orgId, uuid=taskId) \
+                         .first()
+            if task is None:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+
+            try:
+                tasks.update_task(task, **data.validated_data)
+            except tasks.NotAMember:
+                response = {
+                    'success': False,
+                    'errorMessage': 'Assignees must be members'
+                }
+                return Response(response, status.HTTP_400_BAD_REQUEST)
+
+            response = {
+                'success': True
+            }
+            return Response(response, status.HTTP_200_OK)
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request, orgId, taskId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        deleted, _ = models.Task.objects \
+                           .filter(organization__uuid=orgId, uuid=taskId) \
+                           .delete()
+        if not deleted:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        response = {
+            'success': True
+        }
+        return Response(response, status.HTTP_200_OK)
+
+
+class ImagesView(APIView):
+    """
+    /organizations/{orgId}/images/
+    """
+    permission_classes = [permissions.IsOrganizationMember]
+    allowed_methods = ['GET']
+
+    def get(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        image_set = models.OrganizationImage.objects \
+                          .filter(organization__uuid=orgId)
+        image_set = serializers.OrganizationImageSerializer \
+                               .setup_eager_loading(image_set)
+
+        return paginate(self, request, image_set,
+                        serializers.OrganizationImageSerializer)
+
+
+class ImageUploadsView(APIView):
+    """
+    /organizations/{orgId}/images/uploads/
+    """
+    permission_classes = [permissions.IsOrganizationMember]
+    allowed_methods = ['POST']
+
+    def post(self, request, orgId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        data = serializers.ImageUploadAdditionSerializer(data=request.data)
+        if data.is_valid():
+            org = models.Organization.objects.get(uuid=orgId)
+            upload = images.start_upload(org, request.user,
+                                         data.validated_data['filename'],
+                                         data.validated_data['size'])
+
+            response = {
+                'success': True,
+                'uuid': upload.uuid
+            }
+            return Response(response, status.HTTP_201_CREATED)
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+class ImageUploadView(APIView):
+    """
+    /organizations/{orgId}/images/uploads/{uploadId}/
+    """
+    permission_classes = [permissions.IsOrganizationMember]
+    allowed_methods = ['GET', 'PUT', 'DELETE']
+
+    CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+    def get_upload(self, request, orgId, uploadId):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        # uploads are only visible to their uploader
+        return models.ImageUpload.objects \
+                     .filter(organization__uuid=orgId,
+                             uuid=uploadId,
+                             created_by=request.user) \
+                     .first()
+
+    def get(self, request, orgId, uploadId):
+        upload = self.get_upload(request, orgId, uploadId)
+        if upload is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        upload = serializers.ImageUploadSerializer(upload)
+        return Response(upload.data, status.HTTP_200_OK)
+
+    def put(self, request, orgId, uploadId):
+        upload = self.get_upload(request, orgId, uploadId)
+        if upload is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        match = self.CONTENT_RANGE.match(
+            request.META.get('HTTP_CONTENT_RANGE', '')
+        )
+        if match is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        start, end, size = (int(n) for n in match.groups())
+        if end < start or size != upload.size:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        length = end - start + 1
+        # there's no stream when the body is empty
+        if request.stream is None or \
+                request.META.get('CONTENT_LENGTH') != str(length):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # the body is read straight from the connection, never parsed
+            image = images.write_chunk(upload, start, length, request.stream)
+        except models.ImageUpload.DoesNotExist:
+            # cancelled, expired or completed by another request
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        except images.WrongOffset:
+            response = {
+                'success': False,
+                'received': upload.received
+            }
+            return Response(response, status.HTTP_409_CONFLICT)
+        except images.InvalidImage:
+            response = {
+                'success': False,
+                'errorMessage': 'The file is not a supported image'
+            }
+            return Response(response, status.HTTP_400_BAD_REQUEST)
+
+        if image is None:
+            response = {
+                'success': True,
+                'received': upload.received
+            }
+            return Response(response, status.HTTP_200_OK)
+
+        response = {
+            'success': True,
+            'uuid': image.uuid
+        }
+        return Response(response, status.HTTP_201_CREATED)
+
+    def delete(self, request, orgId, uploadId):
+        upload = self.get_upload(request, orgId, uploadId)
+        if upload is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        images.cancel_upload(upload)
+
+        response = {
+            'success': True
+        }
+        return Response(response, status.HTTP_200_OK)
+
+
+class ImageView(APIView):
+    """
+    /organizations/{orgId}/images/{imageId}/
+    """
+    permission_classes = [permissions.IsOrganizationAdminOrOwnerOrReadOnly]
+    allowed_methods = ['GET', 'DELETE']
+
+    def get(self, request, orgId, imageId):
+        obj = {'orgId': orgId, 'userId': None}
+        self.check_object_permissions(request, obj)
+
+        image = models.OrganizationImage.objects \
+                      .select_related('blob') \
+                      .filter(organization__uuid=orgId, uuid=imageId) \
+                      .first()
+        if image is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        return images.serve(image.blob.file, filename=image.filename)
+
+    def delete(self, request, orgId, imageId):
+        image = models.OrganizationImage.objects \
+                      .select_related('created_by') \
+                      .filter(organization__uuid=orgId, uuid=imageId) \
+                      .first()
+        creator = image.created_by if image is not None else None
+        obj = {
+            'orgId': orgId,
+            'userId': creator.uuid if creator is not None else None
+        }
+        self.check_object_permissions(request, obj)
+
+        if image is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        image.delete()
+
+        response = {
+            'success': True
+        }
+        return Response(response, status.HTTP_200_OK)
+
+
+class ImageThumbnailView(APIView):
+    """
+    /organizations/{orgId}/images/{imageId}/thumbnails/{size}.{format}
+    """
+    # not `format`, which REST framework takes for a format suffix
+    permission_classes = [permissions.IsOrganizationMember]
+    allowed_methods = ['GET']
+
+    def get(self, request, orgId, imageId, size, image_format):
+        obj = {'orgId': orgId}
+        self.check_object_permissions(request, obj)
+
+        thumbnail = models.ImageThumbnail.objects \
+                          .filter(blob__images__organization__uuid=orgId,
+                                  blob__images__uuid=imageId,
+                                  size=size,
+                                  format=image_format) \
+                          .first()
+        if thumbnail is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        _, content_type, _ = images.FORMATS[image_format]
+        return images.serve(thumbnail.file, content_type)
+
+
 class UsersView(APIView):
     """
     /users/
@@ -462,16 +1077,17 @@ class UsersView(APIView):
                 }
                 code = status.HTTP_201_CREATED
 
-            # send email
-            token = email_verification_token_generator.make_token(user)
-            uid = urlsafe_base64_encode(force_bytes(user.uuid))
-            url = f'{request.get_host()}/verify?uidb64={uid}&token={token}'
-            send_mail(
-                'Verify your GreekGeeks Account',
-                url,
-                'donotreply@greekgeeks.com',
-                [email]
-            )
+                # queue verification email, see api/mail.py
+                token = email_verification_token_generator.make_token(user)
+                uid = urlsafe_base64_encode(force_bytes(user.uuid))
+                url = f'{request.get_host()}/verify?' \
+                      f'uidb64={uid}&token={token}'
+                queue_mail(
+                    'Verify your GreekGeeks Account',
+                    url,
+                    'donotreply@greekgeeks.com',
+                    [email]
+                )
             return Response(response, code)
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
@@ -490,18 +1106,7 @@ class EmailVerificationView(APIView):
             uidb64 = data.data['uidb64']
             token = data.data['token']
 
-            try:
-                uuid = force_text(urlsafe_base64_decode(uidb64))
-                user = models.User.objects.get(uuid=uuid)
-            except (TypeError, ValueError, OverflowError,
-                    models.User.DoesNotExist):
-                user = None
-
-            if user is not None and \
-               email_verification_token_generator.check_token(user, token):
-                user.is_active = True
-                user.save()
-
+            if verify_email(uidb64, token):
                 response = {
                     'success': True
                 }
@@ -528,8 +1133,19 @@ class UserView(APIView):
         obj = {'userId': userId}
         self.check_object_permissions(request, obj)
 
-        user = models.Users.objects.get(uuid=userId)
-        user = serializers.UserSerializer(user)
+        fieldset = serializers.FieldsetSerializer(
+            data=request.query_params,
+            context={'serializer': serializers.UserSerializer}
+        )
+        if not fieldset.is_valid():
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        user = models.User.objects.filter(uuid=userId)
+        user = serializers.UserSerializer \
+                          .setup_eager_loading(user,
+                                               **fieldset.validated_data) \
+                          .get()
+        user = serializers.UserSerializer(user, **fieldset.validated_data)
 
         return Response(user.data, status.HTTP_200_OK)
 
@@ -574,6 +1190,30 @@ class UserView(APIView):
         return Response(response, status.HTTP_200_OK)
 
 
+class UserTasksView(APIView):
+    """
+    /users/{userId}/tasks/
+    """
+    permission_classes = [permissions.OwnsAccount]
+    allowed_methods = ['GET']
+
+    def get(self, request, userId):
+        obj = {'userId': userId}
+        self.check_object_permissions(request, obj)
+
+        data = serializers.DueTasksSerializer(data=request.query_params)
+        if data.is_valid():
+            task_set = tasks.due_tasks(request.user,
+                                       data.validated_data['days'])
+            task_set = serializers.TaskSerializer \
+                                  .setup_eager_loading(task_set)
+
+            return paginate(self, request, task_set,
+                            serializers.TaskSerializer, TaskPagination)
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
 class NotificationsView(APIView):
     """
     /users/{userId}/notifications/
@@ -585,14 +1225,59 @@ class NotificationsView(APIView):
         obj = {'userId': userId}
         self.check_object_permissions(request, obj)
 
-        notifications = models.User.objects.get(uuid=userId) \
-                              .notification_set.all()
+        version = versions.current(versions.NOTIFICATIONS, userId)
+        response = versions.not_modified(request, version)
+        if response is not None:
+            return response
 
-        notifications = serializers.NotificationSerializer(
-            notifications.data,
-            many=True
-        )
-        return Response(notifications.data, status.HTTP_200_OK)
+        notifications = models.Notification.objects.filter(user__uuid=userId)
+
+        response = paginate(self, request, notifications,
+                            serializers.NotificationSerializer)
+        return versions.add_validators(request, response, version)
+
+
+class NotificationsReadView(APIView):
+    """
+    /users/{userId}/notifications/read/
+    """
+    permission_classes = [permissions.OwnsAccount]
+    allowed_methods = ['POST']
+
+    def post(self, request, userId):
+        obj = {'userId': userId}
+        self.check_object_permissions(request, obj)
+
+        data = serializers.NotificationsReadSerializer(data=request.data)
+        if data.is_valid():
+            marked = mark_read(request.user,
+                               data.validated_data.get('notifications'))
+
+            response = {
+                'success': True,
+                'marked': marked,
+                'unread': unread_count(request.user)
+            }
+            return Response(response, status.HTTP_200_OK)
+        else:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+class NotificationsCountView(APIView):
+    """
+    /users/{userId}/notifications/count/
+    """
+    permission_classes = [permissions.OwnsAccount]
+    allowed_methods = ['GET']
+
+    def get(self, request, userId):
+        obj = {'userId': userId}
+        self.check_object_permissions(request, obj)
+
+        response = {
+            'unread': unread_count(request.user)
+        }
+        return Response(response, status.HTTP_200_OK)
 
 
 class NotificationView(APIView):
@@ -625,3 +1310,14 @@ class NotificationView(APIView):
             'success': True
         }
         return Response(response, status.HTTP_200_OK)
+
+
+class CacheStatsView(APIView):
+    """
+    /stats/cache/
+    """
+    permission_classes = [IsAdminUser]
+    allowed_methods = ['GET']
+
+    def get(self, request):
+        return Response(cache.stats(), status.HTTP_200_OK)
@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# needs Django to be set up
+from api.push import STREAM_PATH, notification_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # notification streams are long lived, so they're served without Django's
+    # request handling (see api/push.py)
+    if scope['type'] == 'http' and STREAM_PATH.match(scope['path']):
+        await notification_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
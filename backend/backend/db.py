@@ -0,0 +1,25 @@
+"""
+Health checks of persistent database connections. Django only has them from
+4.1 (CONN_HEALTH_CHECKS); on this version a connection kept open between
+requests (CONN_MAX_AGE) that the database dropped, e.g. after a restart,
+fails the first query of the next request. A request_started receiver, see
+api.apps, does the check instead for databases with CONN_HEALTH_CHECKS set.
+"""
+from django.db import connections
+
+
+def close_if_unusable(connection):
+    """Close a reused connection the database doesn't answer on anymore."""
+    if connection.connection is None or connection.in_atomic_block:
+        return
+    if not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+        return
+    if not connection.is_usable():
+        # the next query reconnects
+        connection.close()
+
+
+def check_connections(**kwargs):
+    """request_started receiver checking every open connection."""
+    for connection in connections.all():
+        close_if_unusable(connection)
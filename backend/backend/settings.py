@@ -17,22 +17,40 @@ import os
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+# Settings profile, either 'development' (the default) or 'production'. The
+# production profile reads secrets and database settings from the
+# environment, see the Database section below.
+PROFILE = os.environ.get('GREEKGEEKS_PROFILE', 'development')
+PRODUCTION = PROFILE == 'production'
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'z98rz%vake=e7-&+3zn1-15whe%$6z9hn%(gtokg=g6df83ea%'
+if PRODUCTION:
+    SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+else:
+    SECRET_KEY = 'z98rz%vake=e7-&+3zn1-15whe%$6z9hn%(gtokg=g6df83ea%'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = not PRODUCTION
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') \
+    if PRODUCTION else []
 
 # when running locally use these settings
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # EMAIL_HOST = 'localhost'
 # EMAIL_PORT = '1025'
 
+# mail is queued and sent by `python manage.py send_queued_mail`, which retries
+# failures up to EMAIL_QUEUE_MAX_ATTEMPTS times, backing off exponentially
+# starting at EMAIL_QUEUE_BACKOFF seconds. Emails a worker claimed but didn't
+# get to send are due again after EMAIL_QUEUE_CLAIM_TIMEOUT seconds
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_BACKOFF = 30
+EMAIL_QUEUE_CLAIM_TIMEOUT = 600
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -43,7 +61,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'api',
+    'api.apps.ApiConfig',
     'rest_framework',
     'corsheaders',
 ]
@@ -84,6 +102,12 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
+#
+# Development uses SQLite with Django's defaults. Production keeps
+# connections open between requests and either uses SQLite in WAL mode
+# (GREEKGEEKS_DATABASE=sqlite, fine for a small deployment on one machine) or
+# PostgreSQL (GREEKGEEKS_DATABASE=postgresql) configured by the DB_NAME,
+# DB_USER, DB_PASSWORD, DB_HOST and DB_PORT environment variables.
 
 DATABASES = {
     'default': {
@@ -92,6 +116,33 @@ DATABASES = {
     }
 }
 
+if PRODUCTION:
+    DATABASE = os.environ.get('GREEKGEEKS_DATABASE', 'sqlite')
+
+    if DATABASE == 'postgresql':
+        DATABASES['default'] = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'greekgeeks'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+        }
+    else:
+        DATABASES['default'] = {
+            # SQLite in WAL mode, see backend/sqlite3/base.py
+            'ENGINE': 'backend.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # seconds a writer waits on the database lock before failing
+            'OPTIONS': {'timeout': 20},
+        }
+
+    # reuse connections for a minute instead of reconnecting per request,
+    # checking they're still usable first (see backend/db.py)
+    DATABASES['default']['CONN_MAX_AGE'] = \
+        int(os.environ.get('DB_CONN_MAX_AGE', 60))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -135,14 +186,75 @@ STATIC_URL = '/static/'
 STATICFILES_STORAGE = 'spa.storage.SPAStaticFilesStorage'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# uploaded organization images (see api/images.py)
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    # list endpoints, see api/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 100
 }
 
+# seconds a user's resolved organization roles may be reused across requests,
+# 0 resolves them once per request only (see api/roles.py)
+ORGANIZATION_ROLE_CACHE_TIMEOUT = 0
+
+# per process by default; point at e.g. memcached or redis to share cached
+# responses between workers
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'DJANGO_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'greekgeeks')
+    }
+}
+
+# seconds rendered rank and member lists are cached for; writes invalidate
+# them earlier (see api/cache.py)
+RESPONSE_CACHE_TIMEOUT = 300
+
+# pushing notifications to clients (see api/push.py): the broker relaying
+# them to streams, how many a stream may queue before the client is told to
+# resync, and seconds between keepalives
+NOTIFICATION_BROKER = 'api.push.LocalBroker'
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+NOTIFICATION_STREAM_KEEPALIVE = 15
+
+# notifications inserted per transaction when notifying a whole organization
+# (see api/fanout.py)
+NOTIFICATION_FANOUT_BATCH_SIZE = 1000
+
+# age in days after which prune_notifications deletes notifications, and how
+# many it deletes per transaction (see api/retention.py)
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_RETENTION_CHUNK_SIZE = 1000
+
+# hours before a task's due date at which its assignees are reminded by
+# `python manage.py send_task_reminders`, reminders sent per transaction, and
+# whether they're emailed as well as notified (see api/reminders.py)
+TASK_REMINDER_THRESHOLDS = [72, 24, 1]
+TASK_REMINDER_BATCH_SIZE = 1000
+TASK_REMINDER_EMAIL = True
+
+# largest image upload in bytes, hours after which incomplete uploads are
+# discarded, and the thumbnails `python manage.py process_images` makes of
+# every image: fitted in each size in pixels, in each format. Images a worker
+# claimed but didn't finish are claimed again after
+# IMAGE_THUMBNAIL_CLAIM_TIMEOUT seconds
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+IMAGE_UPLOAD_EXPIRY_HOURS = 24
+IMAGE_THUMBNAIL_SIZES = [320, 1280]
+IMAGE_THUMBNAIL_FORMATS = ['webp', 'jpeg']
+IMAGE_THUMBNAIL_QUALITY = 80
+IMAGE_THUMBNAIL_CLAIM_TIMEOUT = 600
+
 # should really do this properly later
 CORS_ORIGIN_ALLOW_ALL = True
@@ -1,19 +1,15 @@
 from django.views.decorators.http import require_http_methods
 from django.shortcuts import redirect
-import requests
+from api.tokens import verify_email
 
 
 @require_http_methods(["GET"])
 def activate(request):
-    """Placeholder for email verification."""
+    """Verify an account's email from the link sent on signup."""
     uidb64 = request.GET.get('uidb64')
     token = request.GET.get('token')
 
-    url = f'{request.scheme}://{request.get_host()}/api/users/email/'
-    body = {
-        'uidb64': uidb64,
-        'token': token
-    }
-    response = requests.post(url, json=body)
+    if uidb64 is not None and token is not None:
+        verify_email(uidb64, token)
 
     return redirect('/')